@@ -7,9 +7,11 @@ import urllib
 import os
 from capabilities.stateaware import StateAware
 from capabilities.stateaware_non_llm import StateAwareNonLlm
+from utils.deployment_router import balanced_llm_config
 
 config_list = autogen.config_list_from_json(env_or_file="AOAI_CONFIG_LIST")
-llm_config = {"config_list": config_list}
+# Spreads the agents' completions over every deployment of the config list
+llm_config = balanced_llm_config(config_list)
 
 SEQUENTIAL_STEP = "SequentialStep"
 PARALLEL_STEP = "ParallelStep"
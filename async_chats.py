@@ -1,8 +1,10 @@
 import autogen
 import asyncio
+from utils.deployment_router import balanced_llm_config
 
 config_list = autogen.config_list_from_json(env_or_file="AOAI_CONFIG_LIST")
-llm_config = {"config_list": config_list}
+# Spreads the agents' completions over every deployment of the config list
+llm_config = balanced_llm_config(config_list)
 
 financial_tasks = [
     """What are the current stock prices of NVDA and TESLA, and how is the performance over the past month in terms of percentage change?""",
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import time
+
+from termcolor import colored
+
+from datastore.inmemory_backend import InMemoryBackend
+from datastore.storage_backend import create_backend
+from models.agent_memory import Event, Memory
+from models.agent_tasks import Tasks
+
+# Runs N simulated group chats on one event loop. Every turn saves a memory event and updates a task status, the
+# two writes StateAwareNonLlm makes per message. The blocking run calls the synchronous Memory/Tasks APIs from
+# the coroutines, the way the plan runners do today; the async run awaits the a_* variants instead.
+# Run from the repository root: python -m benchmarks.bench_async_storage
+
+
+class LatencyBackend(InMemoryBackend):
+    """In-memory backend that sleeps on every call to stand in for a network round-trip to the database."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def save_events(self, records):
+        time.sleep(self.latency)
+        super().save_events(records)
+
+    def update_task(self, *args):
+        time.sleep(self.latency)
+        super().update_task(*args)
+
+    def update_tasks(self, *args):
+        time.sleep(self.latency)
+        super().update_tasks(*args)
+
+    def upsert_task(self, *args):
+        time.sleep(self.latency)
+        return super().upsert_task(*args)
+
+    def fetch_tasks(self, *args):
+        time.sleep(self.latency)
+        return super().fetch_tasks(*args)
+
+
+async def blocking_chat(chat_id: int, turns: int, backend):
+    memory = Memory(f"bench-{chat_id}", "Analyst", "1", backend=backend)
+    tasks = Tasks(f"bench-{chat_id}", "Analyst", "1", backend=backend)
+    tasks.add_task("1", "Analyst-subtask", "Get name of company")
+    for turn in range(turns):
+        memory.save_to_memory(Event("assistant", f"turn {turn}", "MESSAGE"))
+        tasks.update_task("Analyst-subtask", "Get name of company", "detail", "IN_PROGRESS", f"turn {turn}")
+        # Yield to the loop the way an LLM call would
+        await asyncio.sleep(0)
+
+
+async def async_chat(chat_id: int, turns: int, backend):
+    memory = Memory(f"bench-{chat_id}", "Analyst", "1", backend=backend)
+    tasks = Tasks(f"bench-{chat_id}", "Analyst", "1", backend=backend)
+    await tasks.a_add_task("1", "Analyst-subtask", "Get name of company")
+    for turn in range(turns):
+        await memory.a_save_to_memory(Event("assistant", f"turn {turn}", "MESSAGE"))
+        await tasks.a_update_task("Analyst-subtask", "Get name of company", "detail", "IN_PROGRESS", f"turn {turn}")
+
+
+async def run(chat, chats: int, turns: int, backend) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[chat(chat_id, turns, backend) for chat_id in range(chats)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N concurrent chats on one event loop: blocking vs. async storage calls")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated seconds per database round-trip")
+    parser.add_argument("--backend", default=None, help="use a real backend (sqlite, sqlserver) instead of the simulated one")
+    args = parser.parse_args()
+
+    backend = create_backend(args.backend) if args.backend else LatencyBackend(args.latency)
+
+    blocking = asyncio.run(run(blocking_chat, args.chats, args.turns, backend))
+    concurrent = asyncio.run(run(async_chat, args.chats, args.turns, backend))
+
+    print(colored(f"{args.chats} chats x {args.turns} turns on one event loop", "light_green"))
+    print(f"  blocking storage calls: {blocking:.3f}s")
+    print(f"  async storage calls:    {concurrent:.3f}s ({blocking / concurrent:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
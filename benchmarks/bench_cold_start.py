@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold start of the domain-knowledge module, each sample in a fresh interpreter: importing direct_aoai (which no longer
+# reads the config list or builds a client), then the first client from the registry, against what the module used to
+# do on import (import openai and build an AzureOpenAI client). No request is sent, so no endpoint is needed.
+# Run from the repository root: python -m benchmarks.bench_cold_start
+
+IMPORT_ONLY = "import domain_knowledge.direct_aoai"
+
+FIRST_CLIENT = """
+import domain_knowledge.direct_aoai
+from domain_knowledge.client_registry import get_client_registry
+get_client_registry().get_client()
+"""
+
+EAGER = """
+import json
+from openai import AzureOpenAI
+config = json.load(open("AOAI_CONFIG_LIST"))
+client = AzureOpenAI(api_key=config[0]["api_key"], api_version=config[0]["api_version"], azure_endpoint=config[0]["base_url"])
+"""
+
+TIMED = """
+import time
+start = time.perf_counter()
+exec(compile({code!r}, "<bench>", "exec"))
+print(time.perf_counter() - start)
+"""
+
+
+def sample(code: str, env: dict, cwd: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", TIMED.format(code=code)], env=env, cwd=cwd, capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip()))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start of direct_aoai: lazy registry vs. eager client on import")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    config = [{"model": "bench", "api_key": "bench", "api_version": "2024-02-01", "base_url": "https://bench.openai.azure.com"}]
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, "AOAI_CONFIG_LIST")
+        with open(config_path, "w") as file:
+            json.dump(config, file)
+
+        env = dict(os.environ, AOAI_CONFIG_LIST=config_path, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        import_only = sample(IMPORT_ONLY, env, directory, args.runs)
+        first_client = sample(FIRST_CLIENT, env, directory, args.runs)
+        eager = sample(EAGER, env, directory, args.runs)
+
+    print(f"import direct_aoai (lazy):        {import_only * 1000:8.1f} ms")
+    print(f"import + first client (lazy):     {first_client * 1000:8.1f} ms")
+    print(f"import openai + client (eager):   {eager * 1000:8.1f} ms")
+    print(f"import speedup:                   {eager / import_only:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from openai import AzureOpenAI
+from termcolor import colored
+
+from utils.deployment_router import DeploymentRouter
+
+# Sends chat completions to local fake Azure OpenAI deployments of the same model: a slow one listed first, the way
+# a plain config list uses it, plus fast ones, one of which throttles (429) every few requests. The plain client
+# always calls the first deployment; the routed client goes through DeploymentRouter. No Azure resource is needed.
+# Run from the repository root: python -m benchmarks.bench_deployment_router
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_deployment(name: str, latency: float, throttle_every: int = 0):
+    state = {"requests": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                state["requests"] += 1
+                throttle = throttle_every and state["requests"] % throttle_every == 0
+                if throttle:
+                    state["throttled"] += 1
+
+            if throttle:
+                self._send(429, {"error": {"code": "429", "message": "Rate limit exceeded"}}, {"retry-after": "1"})
+                return
+
+            time.sleep(latency)
+            self._send(200, {
+                "id": "bench", "object": "chat.completion", "created": 0, "model": "gpt-4",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"{name}: {body['messages'][-1]['content']}"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }, {"x-ratelimit-remaining-tokens": "10000"})
+
+        def _send(self, status, payload, headers):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = FakeServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {"model": "gpt-4", "api_key": name, "api_type": "azure", "api_version": "2024-02-01", "base_url": f"http://127.0.0.1:{server.server_port}/"}
+    return config, state
+
+
+def run(client, requests: int, concurrency: int) -> float:
+    def complete(i):
+        return client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": f"question {i}"}])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(complete, range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat completions: first deployment only vs. DeploymentRouter")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    deployments = [
+        start_deployment("slow", latency=0.2),
+        start_deployment("fast", latency=0.05),
+        start_deployment("throttled", latency=0.05, throttle_every=5),
+    ]
+    config_list = [config for config, _ in deployments]
+    first = config_list[0]
+
+    plain = AzureOpenAI(api_key=first["api_key"], api_version=first["api_version"], azure_endpoint=first["base_url"])
+    plain_time = run(plain, args.requests, args.concurrency)
+    served_plain = [state["requests"] for _, state in deployments]
+
+    router = DeploymentRouter(config_list)
+    routed = AzureOpenAI(api_key=first["api_key"], api_version=first["api_version"], azure_endpoint=first["base_url"], http_client=router.http_client, max_retries=5)
+    routed_time = run(routed, args.requests, args.concurrency)
+    served_routed = [state["requests"] - before for (_, state), before in zip(deployments, served_plain)]
+
+    print(colored(f"first deployment only: {plain_time:.2f}s, requests per deployment {served_plain}", "yellow"))
+    print(colored(f"routed:                {routed_time:.2f}s, requests per deployment {served_routed}", "green"))
+    print(colored(f"speedup:               {plain_time / routed_time:.1f}x", "green"))
+    for name, stats in router.stats().items():
+        print(f"  {name}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+from termcolor import colored
+from autogen import ConversableAgent, GroupChat
+
+from capabilities.stateaware_non_llm import StateAwareNonLlm
+from custom_agents.group_chat_manager import ResumableGroupChatManager
+from datastore.inmemory_backend import InMemoryBackend
+from datastore.storage_backend import set_backend
+from models.agent_context import AgentContext, PlanContext
+
+# Restores a group chat history into a ResumableGroupChatManager with StateAwareNonLlm on the manager, the way the
+# resume runners set it up: once by replaying every message to every agent through send (replay_history) and
+# once through the bulk path (restore_from_history). Storage is in-memory so only the restore itself is measured.
+# Run from the repository root: python -m benchmarks.bench_group_chat_restore
+
+
+def build_manager(agents: int, deliverable: PlanContext) -> ResumableGroupChatManager:
+    group = [ConversableAgent(f"Agent{i}", llm_config=False, human_input_mode="NEVER") for i in range(agents)]
+    manager = ResumableGroupChatManager(GroupChat(group, messages=[]), context=None, name="Manager", llm_config=False)
+
+    state_aware_ability = StateAwareNonLlm(context=AgentContext(deliverable, "0", "Manager", parentAgentName="User1"), is_group_manager=True)
+    state_aware_ability.add_to_agent(manager)
+    return manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group chat restore: per-message send replay vs. bulk hydration")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--agents", type=int, default=20)
+    args = parser.parse_args()
+
+    set_backend(InMemoryBackend())
+    deliverable = PlanContext(planId="bench", planName="bench", deliverableName="bench")
+    history = [{"content": f"message {i}", "role": "user", "name": f"Agent{i % args.agents}"} for i in range(args.messages)]
+
+    manager = build_manager(args.agents, deliverable)
+    start = time.perf_counter()
+    manager.replay_history(history)
+    replay = time.perf_counter() - start
+
+    manager = build_manager(args.agents, deliverable)
+    start = time.perf_counter()
+    manager.restore_from_history(history)
+    bulk = time.perf_counter() - start
+
+    print(colored(f"{args.messages} messages x {args.agents} agents", "light_green"))
+    print(f"  send replay:     {replay:.3f}s ({args.messages * args.agents} sends through the hook pipeline)")
+    print(f"  bulk hydration:  {bulk:.3f}s ({replay / bulk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
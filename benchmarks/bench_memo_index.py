@@ -0,0 +1,93 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+from termcolor import colored
+
+from capabilities.memo_index import NumpyMemoIndex
+
+# Compares MemoStore recall on a Chroma collection with the NumPy memo index, at the store sizes a single agent
+# reaches. Random unit vectors with the dimension of Chroma's default embeddings stand in for memo embeddings,
+# so no model is loaded and only the index cost is measured: top-k with the distance threshold applied, for one
+# query at a time and for a batch of queries.
+# Run from the repository root: python -m benchmarks.bench_memo_index
+
+DIM = 384
+
+
+def unit_vectors(rng, count):
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def chroma_query(collection, queries, n_results, threshold):
+    results = collection.query(query_embeddings=queries.tolist(), n_results=n_results)
+    # The filter MemoStore applied to Chroma results
+    return [[uid for uid, distance in zip(ids, distances) if distance < threshold]
+            for ids, distances in zip(results["ids"], results["distances"])]
+
+
+def numpy_query(index, queries, n_results, threshold):
+    return index.query(queries, n_results=n_results, max_distance=threshold)["ids"]
+
+
+def time_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs. the NumPy memo index for small memo stores")
+    parser.add_argument("--sizes", default="100,1000,5000", help="comma separated memo counts to measure at")
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--batch", type=int, default=32, help="queries per batch")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    client = chromadb.Client(Settings(anonymized_telemetry=False, allow_reset=True, is_persistent=False))
+
+    print(colored(f"{'memos':>8} {'chroma 1 (ms)':>14} {'numpy 1 (ms)':>13} {'chroma batch (ms)':>18} {'numpy batch (ms)':>17} {'chroma recall':>14}", "light_green"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        vectors = unit_vectors(rng, size)
+        ids = [str(i) for i in range(size)]
+        documents = [f"memo {i}" for i in range(size)]
+
+        client.reset()
+        collection = client.create_collection("memos")
+        for start in range(0, size, 1000):
+            collection.add(ids=ids[start:start + 1000], documents=documents[start:start + 1000], embeddings=vectors[start:start + 1000].tolist())
+
+        with tempfile.TemporaryDirectory() as directory:
+            index = NumpyMemoIndex(f"{directory}/memos_index")
+            index.add(ids, documents, vectors)
+            index.save()
+            # Measured as MemoStore opens it: memory-mapped from disk
+            index = NumpyMemoIndex(f"{directory}/memos_index")
+
+            one = unit_vectors(rng, 1)
+            batch = unit_vectors(rng, args.batch)
+            # Chroma's HNSW search is approximate; the NumPy index is exact
+            exact = numpy_query(index, batch, args.n_results, 4.0)
+            approximate = chroma_query(collection, batch, args.n_results, 4.0)
+            recall = statistics.mean(len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact))
+
+            chroma_one = time_ms(lambda: chroma_query(collection, one, args.n_results, args.threshold), args.repeats)
+            numpy_one = time_ms(lambda: numpy_query(index, one, args.n_results, args.threshold), args.repeats)
+            chroma_batch = time_ms(lambda: chroma_query(collection, batch, args.n_results, args.threshold), args.repeats)
+            numpy_batch = time_ms(lambda: numpy_query(index, batch, args.n_results, args.threshold), args.repeats)
+            print(f"{size:>8} {chroma_one:>14.3f} {numpy_one:>13.3f} {chroma_batch:>18.3f} {numpy_batch:>17.3f} {recall:>14.2f}")
+            del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import os
+import statistics
+import time
+
+from termcolor import colored
+
+from datastore.connection_pool import get_pool
+
+# Benchmarks the MemoryTable/TaskTracker lookups with the V001/V002 indexes (seek) against the same queries
+# forced onto a full scan with INDEX(0), as MemoryTable grows. Rows are written under a dedicated plan id
+# and removed at the end. Run against a database that has had `python -m datastore.migrations` applied.
+# Run from the repository root: python -m benchmarks.bench_memory_index
+
+BENCH_PLAN_ID = "bench-memory-index"
+AGENTS = 200
+TASKS_PER_AGENT = 10
+
+FILL_MEMORY_SQL = """
+WITH n AS (
+    SELECT TOP (?) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b CROSS JOIN sys.all_objects c
+)
+INSERT INTO dbo.MemoryTable (PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent)
+SELECT ?, CONCAT('agent-', (i + ?) % ?), (i + ?) % ?, 'assistant', REPLICATE(N'x', 400), 'MESSAGE', NULL
+FROM n
+"""
+
+LAST_EVENTS_SQL = """
+SELECT TOP (50) * FROM dbo.MemoryTable {hint}
+WHERE PlanId = ? AND AgentName = ? AND TaskId = ?
+ORDER BY MemoryId DESC
+"""
+
+FILL_TASKS_SQL = """
+WITH n AS (
+    SELECT TOP (?) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b
+)
+INSERT INTO dbo.TaskTracker (PlanId, TaskId, AgentName, Task, insert_timestamp, Status, Detail)
+SELECT ?, CAST(i % ? AS NVARCHAR(50)), CONCAT('agent-', i % ?, '-subtask'), CONCAT(N'Step number ', i, N' of the plan'), getdate(), 'NOT DONE', 'Not started'
+FROM n
+"""
+
+TASK_LOOKUP_SQL = """
+SELECT Task FROM dbo.TaskTracker {hint}
+WHERE TaskId = ? AND AgentName = ? AND TaskHash = CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(CAST(? AS NVARCHAR(500))))) AS BINARY(32)) AND Task = ?
+"""
+
+
+def time_query(cursor, sql, params, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def fill_memory(cursor, rows, offset):
+    cursor.execute(FILL_MEMORY_SQL, rows, BENCH_PLAN_ID, offset, AGENTS, offset, TASKS_PER_AGENT)
+
+
+def cleanup(cursor, conn):
+    for table in ("dbo.MemoryTable", "dbo.TaskTracker"):
+        while True:
+            cursor.execute(f"DELETE TOP (100000) FROM {table} WHERE PlanId = ?", BENCH_PLAN_ID)
+            deleted = cursor.rowcount
+            conn.commit()
+            if deleted < 100000:
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seek vs. scan cost for MemoryTable and TaskTracker lookups")
+    parser.add_argument("--sizes", default="10000,100000,1000000,3000000", help="comma separated MemoryTable row counts to measure at")
+    parser.add_argument("--tasks", type=int, default=50000, help="TaskTracker rows to create for the task lookup")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    pool = get_pool(os.environ.get("SQL_CONNECTIONSTRING"))
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cleanup(cursor, conn)
+
+        try:
+            print(colored(f"{'rows':>10} {'last 50 seek (ms)':>18} {'last 50 scan (ms)':>18}", "light_green"))
+            total = 0
+            for size in sizes:
+                fill_memory(cursor, size - total, total)
+                conn.commit()
+                total = size
+
+                params = (BENCH_PLAN_ID, "agent-7", 7)
+                seek = time_query(cursor, LAST_EVENTS_SQL.format(hint=""), params, args.repeats)
+                scan = time_query(cursor, LAST_EVENTS_SQL.format(hint="WITH (INDEX(0))"), params, args.repeats)
+                print(f"{size:>10} {seek:>18.2f} {scan:>18.2f}")
+
+            cursor.execute(FILL_TASKS_SQL, args.tasks, BENCH_PLAN_ID, TASKS_PER_AGENT, AGENTS)
+            conn.commit()
+
+            task = "Step number 1234 of the plan"
+            params = (str(1234 % TASKS_PER_AGENT), f"agent-{1234 % AGENTS}-subtask", task, task)
+            seek = time_query(cursor, TASK_LOOKUP_SQL.format(hint=""), params, args.repeats)
+            scan = time_query(cursor, TASK_LOOKUP_SQL.format(hint="WITH (INDEX(0))"), params, args.repeats)
+            print(colored(f"\nRetrieveTask lookup over {args.tasks} tasks: seek {seek:.2f} ms, scan {scan:.2f} ms", "light_green"))
+        finally:
+            cleanup(cursor, conn)
+            cursor.close()
+
+
+if __name__ == "__main__":
+    main()
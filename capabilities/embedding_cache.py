@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_EMBEDDING_CACHE_SIZE = 10000
+# Name of Chroma's default Sentence Transformer; part of every cache key, so switching models never reuses vectors
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+def text_hash(text: str, model: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embeds texts for a MemoStore, remembering each embedding by a hash of its text so a string is embedded once:
+    Chroma would otherwise re-embed every query text (and every document added) with its Sentence Transformer.
+    All the texts missing from the cache are embedded in one batch call. The least recently used entries are
+    evicted past max_entries; save() persists the cache next to the memo DB, as plain NumPy arrays.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        embedding_function: Optional[Callable[[List[str]], Sequence]] = None,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        max_entries: Optional[int] = None,
+    ):
+        """
+        Args:
+            path (Optional, str): file the cache is loaded from and saved to. None keeps it in memory only.
+            embedding_function (Optional, Callable): embeds a list of texts. Defaults to Chroma's default embedding function.
+            model (Optional, str): name of the embedding model, part of the cache key. Default "all-MiniLM-L6-v2".
+            max_entries (Optional, int): embeddings kept. Defaults to EMBEDDING_CACHE_SIZE or 10000.
+        """
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get("EMBEDDING_CACHE_SIZE", DEFAULT_EMBEDDING_CACHE_SIZE))
+        self._embedding_function = embedding_function
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and os.path.exists(path):
+            try:
+                # Plain arrays only: nothing in the file is unpickled
+                with np.load(path, allow_pickle=False) as data:
+                    self._entries = OrderedDict(zip(data["keys"].tolist(), data["vectors"]))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading embedding cache: {e}")
+
+    @property
+    def embedding_function(self) -> Callable[[List[str]], Sequence]:
+        if self._embedding_function is None:
+            # Imported here: loading the model is slow and only needed on the first miss
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+            self._embedding_function = DefaultEmbeddingFunction()
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Returns the embeddings of texts as a float32 matrix, one row per text, embedding only the cache misses."""
+        keys = [text_hash(text, self.model) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+
+        # A text repeated in the batch is embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += sum(1 for key in keys if key in vectors)
+        self.misses += len(missing)
+
+        if missing:
+            embedded = self.embedding_function(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing, embedded):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    vectors[key] = vector
+                    self._entries[key] = vector
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._dirty = True
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def save(self):
+        """Writes the cache to path, if it changed since it was loaded or last saved."""
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            entries = dict(self._entries)
+            self._dirty = False
+        try:
+            with open(self.path, "wb") as f:
+                if entries:
+                    np.savez(f, keys=np.array(list(entries)), vectors=np.stack(list(entries.values())))
+                else:
+                    np.savez(f, keys=np.zeros(0, dtype="U64"), vectors=np.zeros((0, 0), dtype=np.float32))
+        except OSError as e:
+            print(f"Error saving embedding cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
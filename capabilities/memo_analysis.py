@@ -0,0 +1,110 @@
+import json
+import re
+from typing import Dict, Optional, Union
+
+from utils.step_extractor import extract_step_statuses
+
+# Asks for every decision StateAware needs about one message in a single reply
+ANALYSIS_INSTRUCTIONS = """Analyze the TEXT and reply with only a JSON object, with no other text, that has these keys:
+"contains_task": true if any part of the TEXT asks the agent to perform a task or solve a problem, otherwise false.
+"task": just the task copied from the TEXT, without solving it and without any advice. "" if there is no task.
+"general_task": a very brief summary, in general terms, of the type of task, leaving out details that might not appear in a similar problem. "" if there is no task.
+"completed_task": if the task was completed, just the task copied from the TEXT. "" if no task is completed.
+"contains_information": true if the TEXT contains information that could be committed to memory, otherwise false.
+"question": how the user would ask for this information if they forgot it. "" if there is no such information.
+"information": the information from the TEXT that should be committed to memory, with no explanation. "" if there is none."""
+
+# Messages made only of these words (acknowledgements, turn-taking) hold nothing to remember or look up
+ACKNOWLEDGEMENT = re.compile(
+    r"^(?:\W|ok(?:ay)?|thanks?|thank you|great|good|perfect|cool|sounds good|got it|yes|no|sure|done|next|continue|go ahead|terminate|approved?)*$",
+    re.IGNORECASE,
+)
+# Output of executed code, as the user proxy reports it
+CODE_OUTPUT = re.compile(r"^exitcode: -?\d+ \([^)]*\)\s*(?:Code output:|$)", re.IGNORECASE)
+CODE_BLOCK = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+
+
+def needs_analysis(text: Union[Dict, str]) -> bool:
+    """
+    Cheap local check of whether a message could hold anything StateAware stores or recalls. False only for
+    messages that obviously do not: empty ones, acknowledgements, code execution output, and messages that are
+    nothing but code or a {"Steps": [...]} status block. Short messages are analyzed: "Summarize report" is a task.
+    """
+    if isinstance(text, dict):
+        text = text.get("content")
+    if not isinstance(text, str):
+        return False
+
+    status_block = extract_step_statuses(text)
+    if status_block is not None:
+        text = status_block.body
+    text = text.strip()
+
+    if CODE_OUTPUT.match(text):
+        return False
+    prose = CODE_BLOCK.sub(" ", text).strip()
+    if not prose:
+        return False
+    return not ACKNOWLEDGEMENT.match(prose)
+
+
+class MemoAnalysis:
+    """The analyzer's decisions about one message, from one reply to ANALYSIS_INSTRUCTIONS."""
+
+    def __init__(self, contains_task: bool, task: str, general_task: str, completed_task: str,
+                 contains_information: bool, question: str, information: str):
+        self.contains_task = contains_task
+        self.task = task
+        self.general_task = general_task
+        self.completed_task = completed_task
+        self.contains_information = contains_information
+        self.question = question
+        self.information = information
+
+    @classmethod
+    def from_reply(cls, reply: Optional[str]) -> Optional["MemoAnalysis"]:
+        """Reads the analyzer's reply; None when it is not a JSON object of the expected shape."""
+        value = _decode_object(reply or "")
+        if value is None:
+            return None
+        try:
+            return cls(
+                contains_task=_as_bool(value["contains_task"]),
+                task=_as_text(value.get("task")),
+                general_task=_as_text(value.get("general_task")),
+                completed_task=_as_text(value.get("completed_task")),
+                contains_information=_as_bool(value["contains_information"]),
+                question=_as_text(value.get("question")),
+                information=_as_text(value.get("information")),
+            )
+        except (KeyError, ValueError):
+            return None
+
+
+def _decode_object(reply: str) -> Optional[dict]:
+    # The object itself, or the first object in the reply (e.g. inside a ```json fence)
+    decoder = json.JSONDecoder()
+    start = reply.find("{")
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(reply, start)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        start = reply.find("{", start + 1)
+    return None
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+        return value.strip().lower() in ("true", "yes")
+    raise ValueError(f"Not a boolean: {value}")
+
+
+def _as_text(value) -> str:
+    text = "" if value is None else str(value).strip()
+    # The step-by-step instructions this replaces answered "none" when there was nothing
+    return "" if text.lower() in ("none", "null", "n/a") else text
@@ -0,0 +1,45 @@
+import os
+import threading
+from typing import Callable, Iterable, List, Optional
+
+
+class MemoIdAllocator:
+    """
+    Hands out memo IDs for a MemoStore: increasing integers, never reused, even after memos are deleted or the
+    store is cleared. The last ID handed out is persisted next to the store, and a batch of IDs costs one write.
+    A store created before the allocator existed starts after the largest numeric ID it already holds.
+    """
+
+    def __init__(self, path: str, existing_ids: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Args:
+            path (str): file the last allocated ID is kept in.
+            existing_ids (Optional, Callable): returns the IDs already in the store; only called when path does not exist yet.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._last_id = int(f.read().strip() or 0)
+        elif existing_ids is not None:
+            self._last_id = max((int(uid) for uid in existing_ids() if str(uid).isdigit()), default=0)
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def allocate(self, count: int = 1) -> List[str]:
+        """Reserves count new IDs and returns them, in order."""
+        with self._lock:
+            first = self._last_id + 1
+            self._last_id += count
+            self._persist()
+        return [str(uid) for uid in range(first, first + count)]
+
+    def _persist(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(str(self._last_id))
+        os.replace(temp_path, self.path)
@@ -0,0 +1,306 @@
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from termcolor import colored
+
+DEFAULT_NUMPY_MEMO_INDEX_MAX_SIZE = 5000
+# Rows the vector file is first created with; it doubles when full
+INITIAL_CAPACITY = 64
+# Memos copied to Chroma per add call when a store outgrows the NumPy index
+PROMOTE_BATCH_SIZE = 1000
+
+
+def _empty_results(queries: int) -> Dict[str, List[list]]:
+    return {"ids": [[] for _ in range(queries)], "documents": [[] for _ in range(queries)], "distances": [[] for _ in range(queries)]}
+
+
+class NumpyMemoIndex:
+    """
+    In-process vector index for the memos of one agent: the unit-normalized embeddings are rows of a contiguous
+    float32 matrix, so top-k for a batch of queries is one matrix product plus argpartition, with the distance
+    threshold applied to the whole result at once. Distances are squared L2 between unit vectors (2 - 2 cos), the
+    same values Chroma's default space reports for the normalized default embeddings.
+
+    The matrix is a memory-mapped file ({path}.f32) and the IDs and documents are kept in {path}.json, so an index
+    opens without reading its vectors into memory. Changes reach the disk on save().
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (Optional, str): path of the index files, without extension. None keeps the index in memory only.
+        """
+        self.path = path
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+
+        if path is not None and os.path.exists(path + ".json"):
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.ids = meta["ids"]
+            self.documents = meta["documents"]
+            self._rows = {uid: row for row, uid in enumerate(self.ids)}
+            if meta["dim"]:
+                capacity = os.path.getsize(path + ".f32") // (4 * meta["dim"])
+                self._vectors = np.memmap(path + ".f32", dtype=np.float32, mode="r+", shape=(capacity, meta["dim"]))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path + ".json")
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self._vectors.shape[1] if self._vectors is not None else 0
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The normalized embeddings of the memos, one row each."""
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:len(self.ids)]
+
+    def add(self, ids: List[str], documents: List[str], embeddings: Sequence):
+        vectors = _normalize(embeddings)
+        self._reserve(len(self.ids) + len(ids), vectors.shape[1])
+        start = len(self.ids)
+        self._vectors[start:start + len(ids)] = vectors
+        for offset, uid in enumerate(ids):
+            self._rows[uid] = start + offset
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+
+    def update(self, ids: List[str], documents: List[str], embeddings: Sequence):
+        vectors = _normalize(embeddings)
+        for uid, document, vector in zip(ids, documents, vectors):
+            row = self._rows[uid]
+            self.documents[row] = document
+            self._vectors[row] = vector
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, list]:
+        results = {"ids": list(self.ids), "documents": list(self.documents)}
+        if include is not None and "embeddings" in include:
+            results["embeddings"] = self.vectors.tolist()
+        return results
+
+    def query(self, query_embeddings: Sequence, n_results: int = 10, max_distance: Optional[float] = None) -> Dict[str, List[list]]:
+        """
+        Returns the n_results nearest memos of each query embedding, nearest first, in the shape of a Chroma query result.
+
+        Args:
+            query_embeddings (Sequence): one embedding per query.
+            n_results (Optional, int): memos returned per query. Default 10.
+            max_distance (Optional, float): only memos closer than this are returned.
+        """
+        queries = _normalize(query_embeddings)
+        count = len(self.ids)
+        k = min(n_results, count)
+        if k <= 0 or len(queries) == 0:
+            return _empty_results(len(queries))
+
+        similarities = queries @ self.vectors.T
+        if k < count:
+            # Only the k best of each row are sorted
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(count), (len(queries), count))
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        distances = np.maximum(2.0 - 2.0 * np.take_along_axis(top_similarities, order, axis=1), 0.0)
+
+        keep = distances < max_distance if max_distance is not None else np.ones(distances.shape, dtype=bool)
+        results = _empty_results(len(queries))
+        for q in range(len(queries)):
+            rows = top[q][keep[q]]
+            results["ids"][q] = [self.ids[row] for row in rows]
+            results["documents"][q] = [self.documents[row] for row in rows]
+            results["distances"][q] = distances[q][keep[q]].tolist()
+        return results
+
+    def reset(self):
+        self.ids, self.documents, self._rows = [], [], {}
+        self._release()
+        if self.path is not None:
+            for extension in (".f32", ".json"):
+                if os.path.exists(self.path + extension):
+                    os.remove(self.path + extension)
+
+    def save(self):
+        """Flushes the vectors and writes the IDs and documents."""
+        if self.path is None:
+            return
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        temp_path = self.path + ".json.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "ids": self.ids, "documents": self.documents}, f)
+        os.replace(temp_path, self.path + ".json")
+
+    def _reserve(self, rows: int, dim: int):
+        if self._vectors is not None:
+            if dim != self.dim:
+                raise ValueError(f"Embedding dimension {dim} does not match the index dimension {self.dim}")
+            if rows <= self._vectors.shape[0]:
+                return
+
+        capacity = max(INITIAL_CAPACITY, self._vectors.shape[0] if self._vectors is not None else 0)
+        while capacity < rows:
+            capacity *= 2
+
+        count = len(self.ids)
+        old = np.array(self._vectors[:count]) if self._vectors is not None else None
+        self._release()
+        if self.path is None:
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        else:
+            # Growing the file keeps the rows already written; the mapping is made again over the new size
+            with open(self.path + ".f32", "ab") as f:
+                f.truncate(capacity * dim * 4)
+            self._vectors = np.memmap(self.path + ".f32", dtype=np.float32, mode="r+", shape=(capacity, dim))
+        if old is not None:
+            self._vectors[:count] = old
+
+    def _release(self):
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+            # The mapping must be closed before the file is resized or removed (Windows)
+            self._vectors._mmap.close()
+        self._vectors = None
+
+
+def _normalize(embeddings: Sequence) -> np.ndarray:
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class MemoIndex:
+    """
+    The vector index of a MemoStore. Stores of up to max_size memos (tens to low thousands, what a single agent
+    holds) use a NumpyMemoIndex, which answers without Chroma's client and query overhead; a store that grows past
+    it is copied into a Chroma collection, which is used from then on. MEMO_INDEX=numpy or chroma forces one.
+    """
+
+    def __init__(self, path_to_db_dir: str, collection_name: str = "memos", kind: Optional[str] = None,
+                 max_size: Optional[int] = None):
+        """
+        Args:
+            path_to_db_dir (str): directory of the store; Chroma's files and the NumPy index files go there.
+            collection_name (Optional, str): name of the Chroma collection, also the NumPy index file name. Default "memos".
+            kind (Optional, str): "auto", "numpy" or "chroma". Defaults to MEMO_INDEX or "auto".
+            max_size (Optional, int): most memos kept in the NumPy index in auto mode. Defaults to NUMPY_MEMO_INDEX_MAX_SIZE or 5000.
+        """
+        self.path_to_db_dir = path_to_db_dir
+        self.collection_name = collection_name
+        self.kind = (kind or os.environ.get("MEMO_INDEX", "auto")).lower()
+        self.max_size = max_size if max_size is not None else int(os.environ.get("NUMPY_MEMO_INDEX_MAX_SIZE", DEFAULT_NUMPY_MEMO_INDEX_MAX_SIZE))
+        self._db_client = None
+
+        os.makedirs(path_to_db_dir, exist_ok=True)
+        numpy_path = os.path.join(path_to_db_dir, collection_name + "_index")
+        if self.kind == "chroma":
+            self.index = self._collection()
+        elif self.kind == "numpy" or NumpyMemoIndex.exists(numpy_path):
+            self.index = NumpyMemoIndex(numpy_path)
+            self._promote_if_full()
+        elif os.path.exists(os.path.join(path_to_db_dir, "chroma.sqlite3")):
+            # A store written before the NumPy index existed: small ones are moved over once
+            self.index = self._collection()
+            if self.index.count() <= self.max_size:
+                self._demote(numpy_path)
+        else:
+            self.index = NumpyMemoIndex(numpy_path)
+
+    @property
+    def backend(self) -> str:
+        return "numpy" if isinstance(self.index, NumpyMemoIndex) else "chroma"
+
+    def count(self) -> int:
+        return self.index.count()
+
+    def add(self, ids: List[str], documents: List[str], embeddings: Sequence):
+        self.index.add(ids=ids, documents=documents, embeddings=_as_lists(embeddings))
+        self._promote_if_full()
+
+    def update(self, ids: List[str], documents: List[str], embeddings: Sequence):
+        self.index.update(ids=ids, documents=documents, embeddings=_as_lists(embeddings))
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, list]:
+        return self.index.get(include=include or ["documents"])
+
+    def query(self, query_embeddings: Sequence, n_results: int = 10, max_distance: Optional[float] = None) -> Dict[str, List[list]]:
+        """Returns the nearest memos of each query embedding, as a Chroma query result, keeping only those closer than max_distance."""
+        if isinstance(self.index, NumpyMemoIndex):
+            return self.index.query(query_embeddings, n_results=n_results, max_distance=max_distance)
+
+        results = self.index.query(query_embeddings=_as_lists(query_embeddings), n_results=n_results)
+        if max_distance is not None:
+            for q, distances in enumerate(results["distances"]):
+                keep = [i for i, distance in enumerate(distances) if distance < max_distance]
+                for field in ("ids", "documents", "distances"):
+                    results[field][q] = [results[field][q][i] for i in keep]
+        return results
+
+    def save(self):
+        if isinstance(self.index, NumpyMemoIndex):
+            self.index.save()
+
+    def reset(self):
+        """Deletes every memo, in memory and on disk."""
+        if isinstance(self.index, NumpyMemoIndex):
+            self.index.reset()
+        else:
+            self._client().delete_collection(self.collection_name)
+            self.index = self._client().create_collection(self.collection_name)
+
+    def _client(self):
+        if self._db_client is None:
+            # Imported here: Chroma is only loaded by stores that use it
+            import chromadb
+            from chromadb.config import Settings
+
+            settings = Settings(
+                anonymized_telemetry=False, allow_reset=True, is_persistent=True, persist_directory=self.path_to_db_dir
+            )
+            self._db_client = chromadb.Client(settings)
+        return self._db_client
+
+    def _collection(self):
+        return self._client().create_collection(self.collection_name, get_or_create=True)
+
+    def _promote_if_full(self):
+        if self.kind != "auto" or not isinstance(self.index, NumpyMemoIndex) or self.index.count() <= self.max_size:
+            return
+
+        print(colored(f"\nMOVING {self.index.count()} MEMOS TO CHROMA (more than {self.max_size})", "light_green"))
+        numpy_index = self.index
+        collection = self._collection()
+        vectors = numpy_index.vectors
+        for start in range(0, numpy_index.count(), PROMOTE_BATCH_SIZE):
+            end = start + PROMOTE_BATCH_SIZE
+            collection.add(ids=numpy_index.ids[start:end], documents=numpy_index.documents[start:end], embeddings=vectors[start:end].tolist())
+        self.index = collection
+        numpy_index.reset()
+
+    def _demote(self, numpy_path: str):
+        results = self.index.get(include=["documents", "embeddings"])
+        numpy_index = NumpyMemoIndex(numpy_path)
+        if results["ids"]:
+            numpy_index.add(results["ids"], results["documents"], results["embeddings"])
+        numpy_index.save()
+        print(colored(f"\nMOVED {numpy_index.count()} MEMOS FROM CHROMA TO THE NUMPY INDEX", "light_green"))
+        self._client().delete_collection(self.collection_name)
+        self.index = numpy_index
+
+
+def _as_lists(embeddings: Sequence):
+    return embeddings.tolist() if isinstance(embeddings, np.ndarray) else embeddings
@@ -0,0 +1,273 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from termcolor import colored
+
+# Both files start with a magic string and the generation they belong to; compaction starts a new generation
+FILE_HEADER = struct.Struct("<4sQ")
+LOG_MAGIC = b"MLOG"
+INDEX_MAGIC = b"MIDX"
+# Log record: uid, input text and output text lengths, then the three UTF-8 strings
+RECORD_HEADER = struct.Struct("<III")
+# Index entry: log offset of the record and the uid, NUL padded
+UID_BYTES = 24
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("uid", f"S{UID_BYTES}")])
+# Offset of a deletion entry, which has no log record
+DELETED = np.iinfo(np.uint64).max
+# Compaction runs on flush once superseded and deleted entries are this share of the index, and at least MIN_DEAD
+COMPACT_RATIO = 0.5
+MIN_DEAD = 100
+
+
+class MemoLog:
+    """
+    The uid -> (input text, output text) map of a MemoStore, kept in an append-only log instead of a pickled dict.
+    Setting or deleting a memo appends one record to {path}.log and one fixed-size entry to {path}.idx, so a
+    write costs the same whatever the number of memos. Opening reads only the index (offsets and uids); the log
+    is memory-mapped and a memo's text is read when it is accessed. Entries superseded by a later write of the
+    same uid are reclaimed by compact(), which flush() runs once they make up half the index.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): path of the log files, without extension.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._offsets = {}
+        self._entries = 0
+        self._map: Optional[mmap.mmap] = None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if not os.path.exists(path + ".log") or os.path.getsize(path + ".log") < FILE_HEADER.size:
+            self._create_files()
+        self._recover()
+        self._log = open(path + ".log", "ab")
+        self._index = open(path + ".idx", "ab")
+        self._load_index()
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path + ".log")
+
+    @classmethod
+    def from_pickle(cls, path: str, path_to_pickle: str) -> "MemoLog":
+        """Creates the log from a uid_text_dict.pkl written by earlier versions; the pickle file is left as it is."""
+        memo_log = cls(path)
+        with open(path_to_pickle, "rb") as f:
+            uid_text_dict = pickle.load(f)
+        for uid, (input_text, output_text) in uid_text_dict.items():
+            memo_log[uid] = input_text, output_text
+        memo_log.flush()
+        print(colored(f"    Moved {len(uid_text_dict)} memos from {path_to_pickle} to {path}.log", "light_green"))
+        return memo_log
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, uid) -> bool:
+        return str(uid) in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._offsets))
+
+    def __getitem__(self, uid) -> Tuple[str, str]:
+        with self._lock:
+            return self._read(self._offsets[str(uid)])[1:]
+
+    def get(self, uid, default=None):
+        try:
+            return self[uid]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._offsets)
+
+    def items(self) -> Iterator[Tuple[str, Tuple[str, str]]]:
+        for uid in self.keys():
+            yield uid, self[uid]
+
+    def __setitem__(self, uid, value: Tuple[str, str]):
+        uid = str(uid)
+        input_text, output_text = value
+        encoded = [uid.encode("utf-8"), str(input_text).encode("utf-8"), str(output_text).encode("utf-8")]
+        with self._lock:
+            offset = self._log.tell()
+            self._log.write(RECORD_HEADER.pack(*(len(part) for part in encoded)) + b"".join(encoded))
+            # The record is in the log before the index points at it
+            self._log.flush()
+            self._append_entry(offset, uid)
+            self._offsets[uid] = offset
+
+    def __delitem__(self, uid):
+        uid = str(uid)
+        with self._lock:
+            if uid not in self._offsets:
+                raise KeyError(uid)
+            self._append_entry(DELETED, uid)
+            del self._offsets[uid]
+
+    def clear(self):
+        with self._lock:
+            self._close_files()
+            self._create_files()
+            self._offsets = {}
+            self._entries = 0
+            self._log = open(self.path + ".log", "ab")
+            self._index = open(self.path + ".idx", "ab")
+
+    def flush(self):
+        """Makes the writes durable, compacting first when enough of the log is dead."""
+        with self._lock:
+            dead = self._entries - len(self._offsets)
+            if dead >= MIN_DEAD and dead >= COMPACT_RATIO * self._entries:
+                self.compact()
+            for f in (self._log, self._index):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrites the log and index with only the live memos, and swaps them in."""
+        with self._lock:
+            live = [(uid, self[uid]) for uid in self._offsets]
+            self._close_files()
+            # Left over if an earlier compaction was interrupted
+            for extension in (".log", ".idx"):
+                if os.path.exists(self.path + ".compact" + extension):
+                    os.remove(self.path + ".compact" + extension)
+            temp = MemoLog(self.path + ".compact")
+            for uid, value in live:
+                temp[uid] = value
+            temp._close_files()
+            # The log goes first: an old index left with the new log is rebuilt from it on open
+            for extension in (".log", ".idx"):
+                os.replace(self.path + ".compact" + extension, self.path + extension)
+            self._log = open(self.path + ".log", "ab")
+            self._index = open(self.path + ".idx", "ab")
+            self._load_index()
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def _append_entry(self, offset: int, uid: str):
+        encoded = uid.encode("utf-8")
+        if len(encoded) > UID_BYTES:
+            raise ValueError(f"Memo uid longer than {UID_BYTES} bytes: {uid}")
+        entry = np.array([(offset, encoded)], dtype=INDEX_DTYPE)
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        self._entries += 1
+
+    def _load_index(self):
+        entries = self._index_entries()
+        self._entries = len(entries)
+        # Later entries of a uid supersede earlier ones
+        offsets = {}
+        for offset, uid in zip(entries["offset"].tolist(), entries["uid"].tolist()):
+            if offset == DELETED:
+                offsets.pop(uid.decode("utf-8"), None)
+            else:
+                offsets[uid.decode("utf-8")] = offset
+        self._offsets = offsets
+
+    def _index_entries(self) -> np.ndarray:
+        size = (os.path.getsize(self.path + ".idx") - FILE_HEADER.size) // INDEX_DTYPE.itemsize
+        if size <= 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.path + ".idx", dtype=INDEX_DTYPE, mode="r", offset=FILE_HEADER.size, shape=(size,))
+
+    def _read(self, offset: int) -> Tuple[str, str, str]:
+        if self._map is None or offset + RECORD_HEADER.size > len(self._map):
+            self._remap()
+        lengths = RECORD_HEADER.unpack_from(self._map, offset)
+        if offset + RECORD_HEADER.size + sum(lengths) > len(self._map):
+            self._remap()
+        parts = []
+        position = offset + RECORD_HEADER.size
+        for length in lengths:
+            parts.append(self._map[position:position + length].decode("utf-8"))
+            position += length
+        return parts[0], parts[1], parts[2]
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        with open(self.path + ".log", "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _create_files(self):
+        generation = int.from_bytes(os.urandom(8), "little")
+        with open(self.path + ".log", "wb") as f:
+            f.write(FILE_HEADER.pack(LOG_MAGIC, generation))
+        with open(self.path + ".idx", "wb") as f:
+            f.write(FILE_HEADER.pack(INDEX_MAGIC, generation))
+
+    def _recover(self):
+        with open(self.path + ".log", "rb") as log:
+            log_magic, log_generation = FILE_HEADER.unpack(log.read(FILE_HEADER.size))
+        index_header = b""
+        if os.path.exists(self.path + ".idx"):
+            with open(self.path + ".idx", "rb") as index:
+                index_header = index.read(FILE_HEADER.size)
+        if log_magic != LOG_MAGIC:
+            raise ValueError(f"{self.path}.log is not a memo log")
+        if len(index_header) < FILE_HEADER.size or FILE_HEADER.unpack(index_header) != (INDEX_MAGIC, log_generation):
+            # The index is missing, or is from before a compaction that was interrupted
+            self._rebuild_index(log_generation)
+            return
+
+        # A crash can leave index entries whose record was cut short, or a partial entry at the end: both are dropped.
+        # A record the index never got to point at is unreachable and goes at the next compaction.
+        log_size = os.path.getsize(self.path + ".log")
+        index_size = os.path.getsize(self.path + ".idx")
+        valid = (index_size - FILE_HEADER.size) // INDEX_DTYPE.itemsize
+        entries = self._index_entries()
+        with open(self.path + ".log", "rb") as log:
+            while valid:
+                offset = int(entries["offset"][valid - 1])
+                if offset == DELETED:
+                    break
+                if offset + RECORD_HEADER.size <= log_size:
+                    log.seek(offset)
+                    if offset + RECORD_HEADER.size + sum(RECORD_HEADER.unpack(log.read(RECORD_HEADER.size))) <= log_size:
+                        break
+                valid -= 1
+        # The mapping must be closed before the file is truncated (Windows)
+        del entries
+        if FILE_HEADER.size + valid * INDEX_DTYPE.itemsize != index_size:
+            with open(self.path + ".idx", "r+b") as f:
+                f.truncate(FILE_HEADER.size + valid * INDEX_DTYPE.itemsize)
+
+    def _rebuild_index(self, generation: int):
+        # Every complete record of the log, in order; a compacted log has no superseded or deleted memos
+        log_size = os.path.getsize(self.path + ".log")
+        entries = []
+        with open(self.path + ".log", "rb") as log:
+            offset = FILE_HEADER.size
+            while offset + RECORD_HEADER.size <= log_size:
+                log.seek(offset)
+                lengths = RECORD_HEADER.unpack(log.read(RECORD_HEADER.size))
+                if offset + RECORD_HEADER.size + sum(lengths) > log_size:
+                    break
+                entries.append((offset, log.read(lengths[0])))
+                offset += RECORD_HEADER.size + sum(lengths)
+        with open(self.path + ".idx", "wb") as f:
+            f.write(FILE_HEADER.pack(INDEX_MAGIC, generation))
+            f.write(np.array(entries, dtype=INDEX_DTYPE).tobytes())
+
+    def _close_files(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        for f in (self._log, self._index):
+            if not f.closed:
+                f.flush()
+                f.close()
@@ -1,8 +1,5 @@
 import os
-import pickle
-from typing import Dict, Optional, Union
-import chromadb
-from chromadb.config import Settings
+from typing import Dict, List, Optional, Union
 from database import Tasks
 import regex
 import json
@@ -12,6 +9,11 @@ from autogen.agentchat.contrib.capabilities.agent_capability import AgentCapabil
 from autogen.agentchat.contrib.text_analyzer_agent import TextAnalyzerAgent
 from autogen import Agent
 from termcolor import colored
+from utils.step_extractor import extract_step_statuses
+from capabilities.embedding_cache import EmbeddingCache
+from capabilities.memo_index import MemoIndex
+from capabilities.memo_log import MemoLog
+from capabilities.memo_ids import MemoIdAllocator
 
 class Recollection(AgentCapability):
     """
@@ -161,10 +163,10 @@ class Recollection(AgentCapability):
         # If the agent is conversing, update the state to in progress. If the message the agent is about to send
         # contains the Done message, update the db to indicate the task is done
         # extract the json from the message and use that to update the tasks
-        json_str = message.split("=")[1]
-        response_json = json.loads(json_str)
+        status_block = extract_step_statuses(message)
+        steps = status_block.steps if status_block is not None else []
 
-        for step in response_json['Steps']:
+        for step in steps:
             self.task_db.update_task(self.teachable_agent.name + "-subtask", step["STEP"], step["DETAIL"], step["STATUS"])
 
         #expanded_text = self._retrieve_task_from_db(text)
@@ -323,7 +325,9 @@ class MemoStore:
     Each DB entry (called a memo) is a pair of strings: an input text and an output text.
     The input text might be a question, or a task to perform.
     The output text might be an answer to the question, or advice on how to perform the task.
-    Vector embeddings are currently supplied by Chroma's default Sentence Transformers.
+    Vector embeddings are currently supplied by Chroma's default Sentence Transformers, through an EmbeddingCache
+    so that a text is only embedded once, and an index from task text to ID answers exact matches without a
+    vector search.
     """
 
     def __init__(
@@ -341,25 +345,32 @@ class MemoStore:
         self.verbosity = verbosity
         self.path_to_db_dir = path_to_db_dir
 
-        # Load or create the vector DB on disk.
-        settings = Settings(
-            anonymized_telemetry=False, allow_reset=True, is_persistent=True, persist_directory=path_to_db_dir
-        )
-        self.db_client = chromadb.Client(settings)
-        self.vec_db = self.db_client.create_collection("memos", get_or_create=True)  # The collection is the DB.
+        # Load or create the vector DB on disk: an in-process NumPy index while the store is small, Chroma beyond.
+        self.vec_db = MemoIndex(path_to_db_dir, "memos")
 
-        # Load or create the associated memo dict on disk.
+        # New task IDs come from a persisted counter rather than the DB's count, so they never collide.
+        self.memo_ids = MemoIdAllocator(os.path.join(path_to_db_dir, "memo_ids"), lambda: self.vec_db.get()["ids"])
+
+        # Embeddings are computed here (and cached by text) rather than by Chroma on every add and query.
+        self.embeddings = EmbeddingCache(path=os.path.join(path_to_db_dir, "embedding_cache.npz"))
+        # Index from task text to its ID in the vector DB, and from ID back to the text, loaded on first use.
+        self._task_uids = None
+        self._uid_tasks = None
+
+        # Load or create the associated memo log on disk. Only its index is read here; the memo texts are read
+        # when used. A uid_text_dict.pkl written by earlier versions is moved into the log once.
+        self.path_to_log = os.path.join(path_to_db_dir, "memos")
         self.path_to_dict = os.path.join(path_to_db_dir, "uid_text_dict.pkl")
-        self.uid_text_dict = {}
-        self.last_memo_id = 0
-        if (not reset) and os.path.exists(self.path_to_dict):
+        if (not reset) and (not MemoLog.exists(self.path_to_log)) and os.path.exists(self.path_to_dict):
+            self.uid_text_dict = MemoLog.from_pickle(self.path_to_log, self.path_to_dict)
+        else:
+            self.uid_text_dict = MemoLog(self.path_to_log)
+        self.last_memo_id = 0 if reset else len(self.uid_text_dict)
+        if self.last_memo_id > 0:
             print(colored("\nLOADING MEMORY FROM DISK", "light_green"))
-            print(colored("    Location = {}".format(self.path_to_dict), "light_green"))
-            with open(self.path_to_dict, "rb") as f:
-                self.uid_text_dict = pickle.load(f)
-                self.last_memo_id = len(self.uid_text_dict)
-                if self.verbosity >= 3:
-                    self.list_memos()
+            print(colored("    Location = {}.log".format(self.path_to_log), "light_green"))
+            if self.verbosity >= 3:
+                self.list_memos()
 
         # Clear the DB if requested.
         if reset:
@@ -378,16 +389,18 @@ class MemoStore:
             )
 
     def _save_memos(self):
-        """Saves self.uid_text_dict to disk."""
-        with open(self.path_to_dict, "wb") as file:
-            pickle.dump(self.uid_text_dict, file)
+        """Makes the memo log durable, and saves the vector index and embedding cache to disk."""
+        self.uid_text_dict.flush()
+        self.vec_db.save()
+        self.embeddings.save()
 
     def reset_db(self):
         """Forces immediate deletion of the DB's contents, in memory and on disk."""
         print(colored("\nCLEARING MEMORY", "light_green"))
-        self.db_client.delete_collection("tasks")
-        self.vec_db = self.db_client.create_collection("tasks")
-        self.uid_text_dict = {}
+        self.vec_db.reset()
+        self.uid_text_dict.clear()
+        self._task_uids = {}
+        self._uid_tasks = {}
         self._save_memos()
 
     # def add_input_output_pair(self, input_text: str, output_text: str):
@@ -407,23 +420,62 @@ class MemoStore:
     #     if self.verbosity >= 3:
     #         self.list_memos()
 
-    def save_task_to_db(self, task: str):
-        print(self.vec_db.count()+1)
-        self.vec_db.add(documents=[task], ids=[str(self.vec_db.count()+1)])
-        print(colored(f"SAVING TASK TO DB: {task}", "light_green"))
+    def task_uids(self) -> Dict[str, str]:
+        """Returns the index from task text to ID, reading the IDs and documents (not the embeddings) once."""
+        if self._task_uids is None:
+            results = self.vec_db.get(include=["documents"])
+            self._task_uids = dict(zip(results["documents"], results["ids"]))
+            self._uid_tasks = dict(zip(results["ids"], results["documents"]))
+        return self._task_uids
+
+    def _index_task(self, uid: str, task: str):
+        # The ID's previous text no longer names it
+        task_uids = self.task_uids()
+        old_task = self._uid_tasks.get(uid)
+        if old_task is not None and old_task != task and task_uids.get(old_task) == uid:
+            del task_uids[old_task]
+        task_uids[task] = uid
+        self._uid_tasks[uid] = task
+
+    def save_task_to_db(self, task: str) -> str:
+        """Adds a task to the vector DB and returns its ID."""
+        return self.save_tasks_to_db([task])[0]
+
+    def save_tasks_to_db(self, tasks: List[str]) -> List[str]:
+        """Adds many tasks (e.g. the steps of a plan) with one embedding pass and one add, and returns their IDs."""
+        if len(tasks) == 0:
+            return []
+        uids = self.memo_ids.allocate(len(tasks))
+        self.vec_db.add(documents=list(tasks), embeddings=self.embeddings.embed(list(tasks)), ids=uids)
+        for uid, task in zip(uids, tasks):
+            self._index_task(uid, task)
+        self.vec_db.save()
+        self.embeddings.save()
+        for uid, task in zip(uids, tasks):
+            print(colored(f"SAVING TASK TO DB: {task} (ID {uid})", "light_green"))
+        return uids
 
     def update_task(self, task: str):
-        # get the task's id
-        result = self.get_task(task)
-        self.vec_db.update(ids=[str(result["ids"][0][0])], documents=[task])
+        # get the task's id: an exact match comes from the index, anything else from the nearest task
+        uid = self.task_uids().get(task)
+        if uid is None:
+            uid = str(self.get_task(task)["ids"][0][0])
+        self.vec_db.update(ids=[uid], documents=[task], embeddings=self.embeddings.embed([task]))
+        self._index_task(uid, task)
+        self.vec_db.save()
 
     def get_task_str(self, task: str):
-        result = self.vec_db.query(query_texts=[task], n_results=1)
+        result = self.get_task(task)
 
         return str(result["documents"][0][0])
     
     def get_task(self, task: str):
-        result = self.vec_db.query(query_texts=[task], n_results=1)
+        # An exact match is the nearest task; answer it in the shape of a query result without a vector search
+        uid = self.task_uids().get(task)
+        if uid is not None:
+            return {"ids": [[uid]], "documents": [[task]], "distances": [[0.0]]}
+
+        result = self.vec_db.query(query_embeddings=self.embeddings.embed([task]), n_results=1)
 
         return result
     
@@ -455,14 +507,25 @@ class MemoStore:
 
     def get_related_memos(self, query_text: str, n_results: int, threshold: Union[int, float]):
         """Retrieves memos that are related to the given query text within the specified distance threshold."""
+        return self.get_related_memos_batch([query_text], n_results, threshold)[0]
+
+    def get_related_memos_batch(self, query_texts: list, n_results: int, threshold: Union[int, float]):
+        """
+        Retrieves, for each query text, the memos related to it within the specified distance threshold.
+        The query texts are embedded in one pass and looked up with one vector DB query.
+        """
         if n_results > len(self.uid_text_dict):
             n_results = len(self.uid_text_dict)
-        results = self.vec_db.query(query_texts=[query_text], n_results=n_results)
-        memos = []
-        num_results = len(results["ids"][0])
-        for i in range(num_results):
-            uid, input_text, distance = results["ids"][0][i], results["documents"][0][i], results["distances"][0][i]
-            if distance < threshold:
+        if n_results == 0 or len(query_texts) == 0:
+            return [[] for _ in query_texts]
+        # The index applies the threshold to every result at once
+        results = self.vec_db.query(query_embeddings=self.embeddings.embed(query_texts), n_results=n_results, max_distance=threshold)
+        memo_lists = []
+        for q in range(len(query_texts)):
+            memos = []
+            num_results = len(results["ids"][q])
+            for i in range(num_results):
+                uid, input_text, distance = results["ids"][q][i], results["documents"][q][i], results["distances"][q][i]
                 input_text_2, output_text = self.uid_text_dict[uid]
                 assert input_text == input_text_2
                 if self.verbosity >= 1:
@@ -475,7 +538,8 @@ class MemoStore:
                         )
                     )
                 memos.append((input_text, output_text, distance))
-        return memos
+            memo_lists.append(memos)
+        return memo_lists
 
     # def prepopulate(self):
     #     """Adds a few arbitrary examples to the vector DB, just to make retrieval less trivial."""
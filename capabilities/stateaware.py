@@ -1,14 +1,17 @@
 import os
-import pickle
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-import chromadb
-from chromadb.config import Settings
 
 from autogen.agentchat.assistant_agent import ConversableAgent
 from autogen.agentchat.contrib.capabilities.agent_capability import AgentCapability
 from autogen.agentchat.contrib.text_analyzer_agent import TextAnalyzerAgent
 
+from capabilities.embedding_cache import EmbeddingCache
+from capabilities.memo_index import MemoIndex
+from capabilities.memo_log import MemoLog
+from capabilities.memo_ids import MemoIdAllocator
+from capabilities.memo_analysis import ANALYSIS_INSTRUCTIONS, MemoAnalysis, needs_analysis
+
 from termcolor import colored
 
 class StateAware(AgentCapability):
@@ -32,6 +35,7 @@ class StateAware(AgentCapability):
         recall_threshold: Optional[float] = 1.5,
         max_num_retrievals: Optional[int] = 10,
         llm_config: Optional[Union[Dict, bool]] = None,
+        prefilter: Optional[bool] = True,
     ):
         """
         Args:
@@ -42,12 +46,14 @@ class StateAware(AgentCapability):
             max_num_retrievals (Optional, int): The maximum number of memos to retrieve from the DB. Default 10.
             llm_config (dict or False): llm inference configuration passed to TextAnalyzerAgent.
                 If None, TextAnalyzerAgent uses llm_config from the teachable agent.
+            prefilter (Optional, bool): True (default) to skip the analyzer for messages that obviously hold nothing to store or recall.
         """
         self.verbosity = verbosity
         self.path_to_db_dir = path_to_db_dir
         self.recall_threshold = recall_threshold
         self.max_num_retrievals = max_num_retrievals
         self.llm_config = llm_config
+        self.prefilter = prefilter
 
         self.analyzer = None
         self.state_aware_agent = None
@@ -83,104 +89,130 @@ class StateAware(AgentCapability):
         Uses TextAnalyzerAgent to make decisions about task memo storage and retrieval.
         """
 
+        # Messages that obviously hold nothing to store or look up (acknowledgements, code output, bare status
+        # blocks) skip the analyzer entirely.
+        if self.prefilter and not needs_analysis(text):
+            if self.verbosity >= 1:
+                print(colored("\nNOTHING TO REMEMBER OR RECALL IN THIS MESSAGE", "light_yellow"))
+            return text
+
+        # One analyzer call answers every storage and retrieval question about the message.
+        analysis = self._analyze_message(text)
+
         # Try to retrieve relevant tasks from the DB.
         expanded_text = text
         if self.memo_store.last_memo_id > 0:
-            expanded_text = self._consider_memo_retrieval(text)
+            expanded_text = self._consider_memo_retrieval(text, analysis)
 
         # Try to store any user teachings in new memos to be used in the future.
-        self._consider_memo_storage(text)
+        self._consider_memo_storage(text, analysis)
 
         # Return the (possibly) expanded message text.
         return expanded_text
 
-    def _consider_memo_storage(self, comment: Union[Dict, str]):
-        """Decides whether to store something from one user comment in the DB."""
-        memo_added = False
+    def _analyze_message(self, comment: Union[Dict, str]) -> MemoAnalysis:
+        """Asks the analyzer for all its decisions about the comment in one reply, as a JSON object."""
+        analysis = MemoAnalysis.from_reply(self._analyze(comment, ANALYSIS_INSTRUCTIONS))
+        if analysis is None:
+            # The reply was not the expected JSON: ask one question at a time instead.
+            if self.verbosity >= 1:
+                print(colored("\nANALYSIS WAS NOT VALID JSON, ANALYZING STEP BY STEP", "light_yellow"))
+            analysis = self._analyze_step_by_step(comment)
+        return analysis
+
+    def _analyze_step_by_step(self, comment: Union[Dict, str]) -> MemoAnalysis:
+        """Gets the decisions of _analyze_message with one analyzer call per question."""
+        task = general_task = completed_task = question = information = ""
 
         # Check for a problem-solution pair.
         response = self._analyze(
             comment,
             "Does any part of the TEXT ask the agent to perform a task or solve a problem? Answer with just one word, yes or no.",
         )
-        if "yes" in response.lower():
-            # Can we extract the task?
-            advice = self._analyze(
+        contains_task = "yes" in response.lower()
+        if contains_task:
+            # Was the task completed?
+            completed_task = self._analyze(
                 comment,
                 "Briefly determine if the task was completed and if so then copy just the task from the TEXT. But if no task is completed, just respond with 'none'.",
-            #    "Briefly copy any advice from the TEXT that may be useful for a similar but different task in the future. But if no advice is present, just respond with 'none'.",
             )
-            if "none" not in advice.lower():
-                # Yes. Extract the task.
-                task = self._analyze(
-                    comment,
-                    "Briefly copy just the task from the TEXT, then stop. Don't solve it, and don't include any advice.",
-                )
-                # Generalize the task.
-                general_task = self._analyze(
-                    task,
-                    "Summarize very briefly, in general terms, the type of task described in the TEXT. Leave out details that might not appear in a similar problem.",
-                )
-                # Add the task-advice (problem-solution) pair to the vector DB.
-                if self.verbosity >= 1:
-                    print(colored("\nREMEMBER THIS TASK-ADVICE PAIR", "light_yellow"))
-                    print(colored(f"\nTASK: {general_task} ||| Advice: {advice}", "light_yellow"))
-                self.memo_store.add_input_output_pair(general_task, advice)
-                memo_added = True
+            # Only decides whether a memo is stored; retrieval needs the generalized task either way
+            if "none" in completed_task.lower():
+                completed_task = ""
+            # Extract the task.
+            task = self._analyze(
+                comment,
+                "Briefly copy just the task from the TEXT, then stop. Don't solve it, and don't include any advice.",
+            )
+            # Generalize the task.
+            general_task = self._analyze(
+                task,
+                "Summarize very briefly, in general terms, the type of task described in the TEXT. Leave out details that might not appear in a similar problem.",
+            )
 
         # Check for information to be learned.
         response = self._analyze(
             comment,
             "Does the TEXT contain information that could be committed to memory? Answer with just one word, yes or no.",
         )
-        if "yes" in response.lower():
-            # Yes. What question would this information answer?
+        contains_information = "yes" in response.lower()
+        if contains_information:
+            # What question would this information answer?
             question = self._analyze(
                 comment,
                 "Imagine that the user forgot this information in the TEXT. How would they ask you for this information? Include no other text in your response.",
             )
             # Extract the information.
-            answer = self._analyze(
+            information = self._analyze(
                 comment, "Copy the information from the TEXT that should be committed to memory. Add no explanation."
             )
-            # Add the question-answer pair to the vector DB.
+
+        return MemoAnalysis(contains_task, task, general_task, completed_task, contains_information, question, information)
+
+    def _consider_memo_storage(self, comment: Union[Dict, str], analysis: Optional[MemoAnalysis] = None):
+        """Decides whether to store something from one user comment in the DB."""
+        if analysis is None:
+            analysis = self._analyze_message(comment)
+        new_memos = []
+
+        # Was a task completed? Store it as a task-advice (problem-solution) pair.
+        if analysis.contains_task and analysis.completed_task:
+            general_task = analysis.general_task or analysis.completed_task
+            if self.verbosity >= 1:
+                print(colored("\nREMEMBER THIS TASK-ADVICE PAIR", "light_yellow"))
+                print(colored(f"\nTASK: {general_task} ||| Advice: {analysis.completed_task}", "light_yellow"))
+            new_memos.append((general_task, analysis.completed_task))
+
+        # Is there information to be learned? Store it as a question-answer pair.
+        if analysis.contains_information and analysis.question and analysis.information:
             if self.verbosity >= 1:
                 print(colored("\nREMEMBER THIS QUESTION-ANSWER PAIR", "light_yellow"))
-            self.memo_store.add_input_output_pair(question, answer)
-            memo_added = True
+            new_memos.append((analysis.question, analysis.information))
 
-        # Were any memos added?
-        if memo_added:
-            # Yes. Save them to disk.
+        # Were any memos found?
+        if new_memos:
+            # Yes. Add them together (one embedding pass) and save them to disk.
+            self.memo_store.add_input_output_pairs(new_memos)
             self.memo_store._save_memos()
 
-    def _consider_memo_retrieval(self, comment: Union[Dict, str]):
+    def _consider_memo_retrieval(self, comment: Union[Dict, str], analysis: Optional[MemoAnalysis] = None):
         """Decides whether to retrieve completed tasks from the DB, and add them to the chat context."""
+        if analysis is None:
+            analysis = self._analyze_message(comment)
 
         # First, use the comment directly as the lookup key.
         if self.verbosity >= 1:
             print(colored("\nLOOK FOR COMPLETED TASKS", "light_yellow"))
-        memo_list = self._retrieve_relevant_memos(comment)
+        lookup_keys = [comment]
 
-        # Next, if the comment involves a task, then extract and generalize the task before using it as the lookup key.
-        response = self._analyze(
-            comment,
-            "Does any part of the TEXT ask the agent to perform a task or solve a problem? Answer with just one word, yes or no.",
-        )
-        if "yes" in response.lower():
+        # Next, if the comment involves a task, then use the generalized task as a lookup key too.
+        if analysis.contains_task and analysis.general_task:
             if self.verbosity >= 1:
                 print(colored("\nLOOK FOR RELEVANT MEMOS, AS TASK-ADVICE PAIRS", "light_yellow"))
-            # Extract the task.
-            task = self._analyze(
-                comment, "Copy just the task from the TEXT, then stop. Don't solve it, and don't include any advice."
-            )
-            # Generalize the task.
-            general_task = self._analyze(
-                task,
-                "Summarize very briefly, in general terms, the type of task described in the TEXT. Leave out details that might not appear in a similar problem.",
-            )
-            # Append any relevant memos.
-            memo_list.extend(self._retrieve_relevant_memos(general_task))
+            lookup_keys.append(analysis.general_task)
+
+        # One embedding pass and one vector DB query serve every lookup key.
+        memo_list = self._retrieve_relevant_memos_batch(lookup_keys)
 
         # De-duplicate the memo list.
         memo_list = list(set(memo_list))
@@ -190,21 +222,27 @@ class StateAware(AgentCapability):
 
     def _retrieve_relevant_memos(self, input_text: str) -> list:
         """Returns semantically related Tasks from the DB."""
-        memo_list = self.memo_store.get_related_memos(
-            input_text, n_results=self.max_num_retrievals, threshold=self.recall_threshold
+        return self._retrieve_relevant_memos_batch([input_text])
+
+    def _retrieve_relevant_memos_batch(self, input_texts: list) -> list:
+        """Returns the Tasks from the DB related to any of the input texts, looked up together."""
+        memo_lists = self.memo_store.get_related_memos_batch(
+            input_texts, n_results=self.max_num_retrievals, threshold=self.recall_threshold
         )
 
-        if self.verbosity >= 1:
-            # Was anything retrieved?
-            if len(memo_list) == 0:
-                # No. Look at the closest memo.
-                print(colored("\nTHE CLOSEST MEMO IS BEYOND THE THRESHOLD:", "light_yellow"))
-                self.memo_store.get_nearest_memo(input_text)
-                print()  # Print a blank line. The memo details were printed by get_nearest_memo().
+        output_texts = []
+        for input_text, memo_list in zip(input_texts, memo_lists):
+            if self.verbosity >= 1:
+                # Was anything retrieved?
+                if len(memo_list) == 0:
+                    # No. Look at the closest memo.
+                    print(colored("\nTHE CLOSEST MEMO IS BEYOND THE THRESHOLD:", "light_yellow"))
+                    self.memo_store.get_nearest_memo(input_text)
+                    print()  # Print a blank line. The memo details were printed by get_nearest_memo().
 
-        # Create a list of just the memo output_text strings.
-        memo_list = [memo[1] for memo in memo_list]
-        return memo_list
+            # Create a list of just the memo output_text strings.
+            output_texts.extend(memo[1] for memo in memo_list)
+        return output_texts
 
     def _concatenate_memo_texts(self, memo_list: list) -> str:
         """Concatenates the memo texts into a single string for inclusion in the chat context."""
@@ -236,7 +274,9 @@ class MemoStore:
     Each DB entry (called a memo) is a pair of strings: an input text and an output text.
     The input text might be a question, or a task to perform.
     The output text might be an answer to the question, or advice on how to perform the task.
-    Vector embeddings are currently supplied by Chroma's default Sentence Transformers.
+    Vector embeddings are currently supplied by Chroma's default Sentence Transformers, through an EmbeddingCache
+    so that a text is only embedded once, and an index from input text to memo ID answers exact matches
+    without a vector search.
     """
 
     def __init__(
@@ -254,25 +294,32 @@ class MemoStore:
         self.verbosity = verbosity
         self.path_to_db_dir = path_to_db_dir
 
-        # Load or create the vector DB on disk.
-        settings = Settings(
-            anonymized_telemetry=False, allow_reset=True, is_persistent=True, persist_directory=path_to_db_dir
-        )
-        self.db_client = chromadb.Client(settings)
-        self.vec_db = self.db_client.create_collection("memos", get_or_create=True)  # The collection is the DB.
+        # Load or create the vector DB on disk: an in-process NumPy index while the store is small, Chroma beyond.
+        self.vec_db = MemoIndex(path_to_db_dir, "memos")
+
+        # Embeddings are computed here (and cached by text) rather than by Chroma on every add and query.
+        self.embeddings = EmbeddingCache(path=os.path.join(path_to_db_dir, "embedding_cache.npz"))
 
-        # Load or create the associated memo dict on disk.
+        # Load or create the associated memo log on disk. Only its index is read here; the memo texts are read
+        # when used. A uid_text_dict.pkl written by earlier versions is moved into the log once.
+        self.path_to_log = os.path.join(path_to_db_dir, "memos")
         self.path_to_dict = os.path.join(path_to_db_dir, "uid_text_dict.pkl")
-        self.uid_text_dict = {}
-        self.last_memo_id = 0
-        if (not reset) and os.path.exists(self.path_to_dict):
+        if (not reset) and (not MemoLog.exists(self.path_to_log)) and os.path.exists(self.path_to_dict):
+            self.uid_text_dict = MemoLog.from_pickle(self.path_to_log, self.path_to_dict)
+        else:
+            self.uid_text_dict = MemoLog(self.path_to_log)
+        self.last_memo_id = 0 if reset else len(self.uid_text_dict)
+        if self.last_memo_id > 0:
             print(colored("\nLOADING MEMORY FROM DISK", "light_green"))
-            print(colored("    Location = {}".format(self.path_to_dict), "light_green"))
-            with open(self.path_to_dict, "rb") as f:
-                self.uid_text_dict = pickle.load(f)
-                self.last_memo_id = len(self.uid_text_dict)
-                if self.verbosity >= 3:
-                    self.list_memos()
+            print(colored("    Location = {}.log".format(self.path_to_log), "light_green"))
+            if self.verbosity >= 3:
+                self.list_memos()
+
+        # New memo IDs come from a persisted counter, so they are never reused after a reset.
+        self.memo_ids = MemoIdAllocator(os.path.join(path_to_db_dir, "memo_ids"), self.uid_text_dict.keys)
+
+        # Index from input text to memo ID, for exact-match lookups, loaded on first use.
+        self._input_text_uids = None
 
         # Clear the DB if requested.
         if reset:
@@ -290,40 +337,62 @@ class MemoStore:
                 )
             )
 
+    def input_text_uids(self) -> Dict[str, str]:
+        """Returns the index from input text to memo ID, reading the memo log once."""
+        if self._input_text_uids is None:
+            self._input_text_uids = {input_text: uid for uid, (input_text, _) in self.uid_text_dict.items()}
+        return self._input_text_uids
+
     def _save_memos(self):
-        """Saves self.uid_text_dict to disk."""
-        with open(self.path_to_dict, "wb") as file:
-            pickle.dump(self.uid_text_dict, file)
+        """Makes the memo log durable, and saves the vector index and embedding cache to disk."""
+        self.uid_text_dict.flush()
+        self.vec_db.save()
+        self.embeddings.save()
 
     def reset_db(self):
         """Forces immediate deletion of the DB's contents, in memory and on disk."""
         print(colored("\nCLEARING MEMORY", "light_green"))
-        self.db_client.delete_collection("memos")
-        self.vec_db = self.db_client.create_collection("memos")
-        self.uid_text_dict = {}
+        self.vec_db.reset()
+        self.uid_text_dict.clear()
+        self._input_text_uids = {}
         self._save_memos()
 
     def add_input_output_pair(self, input_text: str, output_text: str):
         """Adds an input-output pair to the vector DB."""
-        self.last_memo_id += 1
-        self.vec_db.add(documents=[input_text], ids=[str(self.last_memo_id)])
-        self.uid_text_dict[str(self.last_memo_id)] = input_text, output_text
-        if self.verbosity >= 1:
-            print(
-                colored(
-                    "\nINPUT-OUTPUT PAIR ADDED TO VECTOR DATABASE:\n  ID\n    {}\n  INPUT\n    {}\n  OUTPUT\n    {}\n".format(
-                        self.last_memo_id, input_text, output_text
-                    ),
-                    "light_yellow",
+        self.add_input_output_pairs([(input_text, output_text)])
+
+    def add_input_output_pairs(self, pairs: List[Tuple[str, str]]):
+        """Adds many input-output pairs to the vector DB, with one embedding pass and one add."""
+        if len(pairs) == 0:
+            return
+        uids = self.memo_ids.allocate(len(pairs))
+        input_texts = [input_text for input_text, _ in pairs]
+        self.vec_db.add(documents=input_texts, embeddings=self.embeddings.embed(input_texts), ids=uids)
+        for uid, (input_text, output_text) in zip(uids, pairs):
+            self.uid_text_dict[uid] = input_text, output_text
+            self.input_text_uids()[input_text] = uid
+            if self.verbosity >= 1:
+                print(
+                    colored(
+                        "\nINPUT-OUTPUT PAIR ADDED TO VECTOR DATABASE:\n  ID\n    {}\n  INPUT\n    {}\n  OUTPUT\n    {}\n".format(
+                            uid, input_text, output_text
+                        ),
+                        "light_yellow",
+                    )
                 )
-            )
+        self.last_memo_id = len(self.uid_text_dict)
         if self.verbosity >= 3:
             self.list_memos()
 
     def get_nearest_memo(self, query_text: str):
         """Retrieves the nearest memo to the given query text."""
-        results = self.vec_db.query(query_texts=[query_text], n_results=1)
-        uid, input_text, distance = results["ids"][0][0], results["documents"][0][0], results["distances"][0][0]
+        uid = self.input_text_uids().get(query_text)
+        if uid is not None:
+            # An exact match is the nearest memo; no vector search needed.
+            input_text, distance = query_text, 0.0
+        else:
+            results = self.vec_db.query(query_embeddings=self.embeddings.embed([query_text]), n_results=1)
+            uid, input_text, distance = results["ids"][0][0], results["documents"][0][0], results["distances"][0][0]
         input_text_2, output_text = self.uid_text_dict[uid]
         assert input_text == input_text_2
         if self.verbosity >= 1:
@@ -339,14 +408,25 @@ class MemoStore:
 
     def get_related_memos(self, query_text: str, n_results: int, threshold: Union[int, float]):
         """Retrieves tasks that are related to the given query text within the specified distance threshold."""
+        return self.get_related_memos_batch([query_text], n_results, threshold)[0]
+
+    def get_related_memos_batch(self, query_texts: list, n_results: int, threshold: Union[int, float]):
+        """
+        Retrieves, for each query text, the tasks related to it within the specified distance threshold.
+        The query texts are embedded in one pass and looked up with one vector DB query.
+        """
         if n_results > len(self.uid_text_dict):
             n_results = len(self.uid_text_dict)
-        results = self.vec_db.query(query_texts=[query_text], n_results=n_results)
-        memos = []
-        num_results = len(results["ids"][0])
-        for i in range(num_results):
-            uid, input_text, distance = results["ids"][0][i], results["documents"][0][i], results["distances"][0][i]
-            if distance < threshold:
+        if n_results == 0 or len(query_texts) == 0:
+            return [[] for _ in query_texts]
+        # The index applies the threshold to every result at once
+        results = self.vec_db.query(query_embeddings=self.embeddings.embed(query_texts), n_results=n_results, max_distance=threshold)
+        memo_lists = []
+        for q in range(len(query_texts)):
+            memos = []
+            num_results = len(results["ids"][q])
+            for i in range(num_results):
+                uid, input_text, distance = results["ids"][q][i], results["documents"][q][i], results["distances"][q][i]
                 input_text_2, output_text = self.uid_text_dict[uid]
                 # assert input_text == input_text_2
                 if self.verbosity >= 1:
@@ -359,7 +439,8 @@ class MemoStore:
                         )
                     )
                 memos.append((input_text, output_text, distance))
-        return memos
+            memo_lists.append(memos)
+        return memo_lists
 
     def prepopulate(self):
         """Adds a few arbitrary examples to the vector DB, just to make retrieval less trivial."""
@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import Future
 from typing import Dict, Optional, Union
 import regex
 import json
@@ -9,10 +11,13 @@ from termcolor import colored
 from string import digits
 
 from models.agent_context import AgentContext, PlanContext
-from models.agent_memory import Event, Memory
+from models.agent_memory import Event, Memory, message_id
 from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Type, TypeVar, Union
 import json
 from models.agent_tasks import Tasks
+from datastore.storage_executor import get_ordered_storage_executor, in_event_loop
+from models.context_compactor import ContextCompactor, format_task_table
+from utils.step_extractor import extract_step_statuses
 
 class StateAwareNonLlm(AgentCapability):
     """
@@ -34,6 +39,7 @@ class StateAwareNonLlm(AgentCapability):
     MESSAGE_TYPE = "MESSAGE"
     EXCEPTION_TYPE = "EXCEPTION"
     AGENT_ROLE = "Agent"
+    RECOLLECT_LOOKBACK = 50
 
     def __init__(
         self,
@@ -42,7 +48,8 @@ class StateAwareNonLlm(AgentCapability):
         recall_threshold: Optional[float] = 1.5,
         max_num_retrievals: Optional[int] = 10,
         llm_config: Optional[Union[Dict, bool]] = None,
-        is_group_manager: Optional[bool] = False
+        is_group_manager: Optional[bool] = False,
+        token_budget: Optional[int] = None
     ):
         """
         Args:
@@ -53,6 +60,8 @@ class StateAwareNonLlm(AgentCapability):
             max_num_retrievals (Optional, int): The maximum number of memos to retrieve from the DB. Default 10.
             llm_config (dict or False): llm inference configuration passed to TextAnalyzerAgent.
                 If None, TextAnalyzerAgent uses llm_config from the teachable agent.
+            is_group_manager (Optional, bool): True when the agent is a group chat manager, which has no tasks of its own. Default False.
+            token_budget (Optional, int): tokens of conversation sent to the LLM per reply. Defaults to CONTEXT_TOKEN_BUDGET or 6000; 0 disables compaction.
         """
         self.verbosity = verbosity
         self.recall_threshold = recall_threshold
@@ -62,12 +71,16 @@ class StateAwareNonLlm(AgentCapability):
 
         self.analyzer = None
         self.state_aware_agent = None
-        self.memory = Memory(context.planContext.planId, context.taskName, context.taskId)
+        # Memory events are written behind the agent's hot path; call flush() at the end of the chat
+        self.memory = Memory(context.planContext.planId, context.taskName, context.taskId, write_behind=True)
         self.tasks = Tasks(context.planContext.planId, context.taskName, context.taskId)
 
         self.agent_context = context
         self.is_group_manager = is_group_manager
         self.is_recollecting = False
+        self.compactor = ContextCompactor(token_budget)
+        # Task writes the hooks queued instead of running inline (see _run_storage)
+        self._pending_writes: List[Future] = []
 
     def retrieve_steps(self, text: Union[Dict, str])->str:
         """Tries to retrieve the steps needed to complete a task."""
@@ -93,8 +106,7 @@ class StateAwareNonLlm(AgentCapability):
         self.state_aware_agent = agent
 
         # Save this task to the db if it doesn't already exist
-        if (not self.tasks.task_exists(self.tasks.taskId, agent.name, agent.description)):
-            self.tasks.add_task(self.tasks.taskId, agent.name, agent.description)
+        self.tasks.add_task(self.tasks.taskId, agent.name, agent.description)
 
         # Enable resuming by recollecting what we've done so far BEFORE registering hooks
         #self.recollect()
@@ -105,8 +117,41 @@ class StateAwareNonLlm(AgentCapability):
         agent.register_hook(hookable_method="process_last_received_message", hook=self.process_last_received_message)
         # For each outgoing message we store it in memory
         agent.register_hook(hookable_method="process_message_before_send", hook=self.process_message_before_send)
+        # Before each reply the conversation is compacted to the token budget; the stored history is unchanged
+        if self.compactor.enabled:
+            agent.register_hook(hookable_method="process_all_messages_before_reply", hook=self.compact_messages)
         
 
+    def flush(self):
+        """Makes every memory event and task write queued by this agent durable. Call at the end of a chat."""
+        for future in self._take_pending_writes():
+            future.exception()
+        self.memory.flush()
+
+    async def a_flush(self):
+        """Async version of flush."""
+        for future in self._take_pending_writes():
+            await asyncio.wrap_future(future)
+        await self.memory.a_flush()
+
+    def _run_storage(self, fn: Callable, *args):
+        """
+        Runs a task write for a hook. Autogen calls the hooks synchronously, also from a_initiate_chat(s), so under an
+        event loop the write is queued on the ordered storage executor instead of blocking every chat on the loop;
+        a synchronous chat runs it inline. Queued writes land in order; flush() waits for them.
+        """
+        if not in_event_loop():
+            fn(*args)
+            return
+        future = get_ordered_storage_executor().submit(fn, *args)
+        future.add_done_callback(_report_write_error)
+        self._pending_writes = [pending for pending in self._pending_writes if not pending.done()]
+        self._pending_writes.append(future)
+
+    def _take_pending_writes(self) -> List[Future]:
+        pending, self._pending_writes = self._pending_writes, []
+        return pending
+
     def recollect(self)->List:
         """
         Hydrates the agent with the necessary information to recollect previous runs.
@@ -117,19 +162,36 @@ class StateAwareNonLlm(AgentCapability):
         try:
             self.is_recollecting = True
         
-            events = self.memory.retrieve_memory(lookback=50)
-            
-            if len(events) > 0:
-                for event in events:
-                    if event.message_type == self.MESSAGE_TYPE:
-                        self.message_count += 1
-                        messages.append({"content": event.message, "role": event.role, "name": self.state_aware_agent.name})
+            # Only the last events are read from the server, and they are streamed rather than loaded up front
+            for event in self.memory.stream_memory(lookback=self.RECOLLECT_LOOKBACK):
+                self._recollect_event(event, messages)
                         
             if self.is_group_manager == False:
-                tasks = self.tasks.retrieve_tasks()
+                self._recollect_tasks(self.tasks.retrieve_tasks())
+                    
+        except Exception as e:
+            print(f"Error: {e}")
+            
+        self.is_recollecting = False
+        
+        return messages
 
-                for task in tasks:
-                    self.state_aware_agent.send({"content": task.task + ': ' + task.status, "role": 'assistant'}, self.state_aware_agent, request_reply=False, silent=True)
+    async def a_recollect(self)->List:
+        """
+        Async version of recollect. The reads run on the storage executor so that several agents or group chats
+        sharing an event loop can recollect concurrently.
+        """
+        
+        messages: List = []
+        
+        try:
+            self.is_recollecting = True
+        
+            async for event in self.memory.a_stream_memory(lookback=self.RECOLLECT_LOOKBACK):
+                self._recollect_event(event, messages)
+                        
+            if self.is_group_manager == False:
+                self._recollect_tasks(await self.tasks.a_retrieve_tasks())
                     
         except Exception as e:
             print(f"Error: {e}")
@@ -137,6 +199,32 @@ class StateAwareNonLlm(AgentCapability):
         self.is_recollecting = False
         
         return messages
+
+    def resume_from(self, message_count: int):
+        """
+        Restores the agent's state when the group chat history was rebuilt elsewhere (e.g. by HistoryReconstructor)
+        instead of by recollect: the number of messages already handled and, for agents, the status of their tasks.
+        """
+        try:
+            self.is_recollecting = True
+            self.message_count = message_count
+            
+            if self.is_group_manager == False:
+                self._recollect_tasks(self.tasks.retrieve_tasks())
+                
+        except Exception as e:
+            print(f"Error: {e}")
+            
+        self.is_recollecting = False
+
+    def _recollect_event(self, event: Event, messages: List):
+        if event.message_type == self.MESSAGE_TYPE:
+            self.message_count += 1
+            messages.append({"content": event.message, "role": event.role, "name": self.state_aware_agent.name})
+
+    def _recollect_tasks(self, tasks: List):
+        for task in tasks:
+            self.state_aware_agent.send({"content": task.task + ': ' + task.status, "role": 'assistant'}, self.state_aware_agent, request_reply=False, silent=True)
         
     def process_last_received_message(self, text: Union[Dict, str]):
         """
@@ -168,8 +256,7 @@ class StateAwareNonLlm(AgentCapability):
 
             for step in steps:
                 # Save this task to the db if it doesn't already exist
-                if not self.tasks.task_exists(self.tasks.taskId, self.state_aware_agent.name + "-subtask", step):
-                    self.tasks.add_task(self.tasks.taskId, self.state_aware_agent.name + "-subtask", step)
+                self._run_storage(self.tasks.add_task, self.tasks.taskId, self.state_aware_agent.name + "-subtask", step)
 
             text = f"""
             This is your task: 
@@ -197,6 +284,38 @@ class StateAwareNonLlm(AgentCapability):
         
         return text    
     
+    def compact_messages(self, messages: List[Dict])->List[Dict]:
+        """
+        Compacts the conversation sent to the LLM to the agent's token budget (see ContextCompactor). The task status
+        messages replayed by recollect are replaced with an exact table of the latest statuses from the task cache.
+        """
+        if self.is_recollecting or not messages:
+            return messages
+
+        task_table = None
+        is_status_message = None
+        if self.is_group_manager == False:
+            if in_event_loop():
+                # The cached statuses are used as they are; a stale cache is reloaded off the loop for later replies
+                if self.tasks.cache.is_stale():
+                    self._run_storage(self.tasks.cache.refresh)
+                tasks = self.tasks.retrieve_tasks(reload=False)
+            else:
+                tasks = self.tasks.retrieve_tasks()
+            if tasks:
+                task_table = format_task_table(tasks)
+                # What _recollect_tasks sends: "<task>: <status>", possibly with a status that has changed since
+                task_names = {task.task for task in tasks}
+                is_status_message = lambda content: content.rpartition(': ')[0] in task_names
+
+        compacted = self.compactor.compact(messages, task_table, is_status_message)
+
+        report = self.compactor.reports[-1]
+        if self.verbosity >= 1:
+            print(colored(f"Context of {self.state_aware_agent.name} compacted: {report}", "light_yellow"))
+
+        return compacted
+
     def isValidJson(self, json_str: str)->bool:
         try:
             json.loads(json_str)
@@ -216,25 +335,23 @@ class StateAwareNonLlm(AgentCapability):
         message = ConversableAgent._message_to_dict(message)
         # If the agent is conversing, update the state to in progress. If the message the agent is about to send
         # contains the Done message, update the db to indicate the task is done
-        # extract the json from the message and use that to update the tasks
-        message_parts = message.get('content').split("=")
-        response_json = {}
-        
-        if(len(message_parts) > 1) and self.isValidJson(message_parts[1]):
-            json_str = message_parts[1]
-            response_json = json.loads(json_str)
-            
-        elif len(message_parts) > 0 and self.isValidJson(message_parts[0]):
-            json_str = message_parts[0]
-            response_json = json.loads(json_str)
+        # extract the json from the message and use that to update the tasks: one pass over the message finds the
+        # trailing {"Steps": [...]} block, validated once
+        status_block = extract_step_statuses(message)
 
-        if response_json.__len__() > 0:
+        if status_block is not None:
+            if status_block.rejected:
+                print(colored(f"Ignoring invalid steps reported by {self.state_aware_agent.name}: " + "; ".join(status_block.rejected), "light_yellow"))
             if self.is_group_manager == False:
-                for step in response_json['Steps']:
+                steps = []
+                for step in status_block.steps:
                     # strip the number out of the step (i.e., it may come in as '3. Get how many months are profitable')
                     strStep = (str)(step["STEP"])
                     strStep = strStep[strStep.find('.') + 1:]
-                    self.tasks.update_task(self.state_aware_agent.name + "-subtask", strStep.strip(), step["DETAIL"], step["STATUS"], message.get("content"))
+                    steps.append((strStep.strip(), step["STATUS"], step["DETAIL"]))
+                # Only the steps whose status or detail changed are written, in one round-trip; the task rows keep a
+                # reference to the message (it is saved to memory below) rather than a copy of it
+                self._run_storage(self.tasks.update_tasks, self.state_aware_agent.name + "-subtask", steps, message_id(message.get("content")))
 
         self.memory.save_to_memory(
         event = Event(message_type=self.MESSAGE_TYPE, message=message.get("content"), role=self.__get_role__(message))
@@ -250,3 +367,9 @@ class StateAwareNonLlm(AgentCapability):
             return message.get("role")
         
         return "assistant"
+
+
+def _report_write_error(future: Future):
+    # Tasks reports storage errors itself; anything else would otherwise be lost with the future
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error writing tasks: {future.exception()}")
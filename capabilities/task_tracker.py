@@ -10,7 +10,7 @@ from autogen.agentchat.assistant_agent import ConversableAgent
 from autogen.agentchat.contrib.capabilities.agent_capability import AgentCapability
 from autogen.agentchat.contrib.text_analyzer_agent import TextAnalyzerAgent
 from autogen import Agent
-from domain_knowledge.direct_aoai import retrieve_llm_response_on_question
+from domain_knowledge.batch_query import get_domain_knowledge_queries
 from datastore.sql_db_manager import SqlManager
 
 from termcolor import colored
@@ -118,7 +118,7 @@ class TaskTrackingbility(AgentCapability):
         
         question = f"Respond with only the steps needed to perform this task with no additional detail or advice: {task}."
 
-        return retrieve_llm_response_on_question(question)
+        return get_domain_knowledge_queries().ask(question)
 
     def process_message_before_send(self, sender: Agent, message: Union[Dict, str], recipient: Agent, silent: bool):
         """
@@ -1,7 +1,8 @@
 import autogen
 from tools.call_llm import call_aoai
-from domain_knowledge.direct_aoai import retrieve_llm_response_on_question
+from domain_knowledge.batch_query import get_domain_knowledge_queries
 from autogen.agentchat.contrib.agent_builder import AgentBuilder
+from utils.deployment_router import balanced_llm_config
 import autogen
 
 config_file_or_env = "AOAI_CONFIG_LIST"
@@ -17,12 +18,12 @@ def get_configs():
         },
     )
 
-    gpt4_config = {
-        "cache_seed": 42,  
-        "temperature": 0,
-        "config_list": config_list_gpt4,
-        "timeout": 120,
-    }
+    gpt4_config = balanced_llm_config(
+        config_list_gpt4,
+        cache_seed=42,
+        temperature=0,
+        timeout=120,
+    )
 
     return config_list_gpt4, gpt4_config
 
@@ -94,21 +95,31 @@ def start_task(execution_task: str, agent_list: list, llm_config: dict):
     )
     agent_list[0].initiate_chat(manager, message=execution_task)
 
-def use_direct_llm(task: str):
-    question = f"""
+def roles_question(task: str) -> str:
+    return f"""
         This is your task: {task}. Can you give me the roles needed to accomplish this? Respond with just the roles.
         No additional detail is needed. Only provide the comma delimited list of roles needed. 
     """
 
-    roles_needed = retrieve_llm_response_on_question(question)
-
-    question = f"""
+def steps_question(task: str, roles_needed: str) -> str:
+    return f"""
     This is your task: {task}.
     Give me the steps to be completed for each of these roles to accomplish this task: {roles_needed}. 
     No additional detail is needed. Respond ONLY with the role and steps for each as a numbered list. 
     """
-    
-    steps_for_each_role = retrieve_llm_response_on_question(question)
+
+def get_roles_and_steps(tasks: list):
+    """
+    Asks the domain knowledge for the roles of every task, then for the steps of each role, as (roles, steps) per task.
+    The steps depend on the roles, but the tasks do not depend on each other, so each round is asked for all tasks at once.
+    """
+    queries = get_domain_knowledge_queries()
+    roles = queries.ask_many([roles_question(task) for task in tasks])
+    steps = queries.ask_many([steps_question(task, roles_needed) for task, roles_needed in zip(tasks, roles)])
+    return list(zip(roles, steps))
+
+def use_direct_llm(task: str):
+    roles_needed, steps_for_each_role = get_roles_and_steps([task])[0]
 
     print("Roles required: " + roles_needed)
     print("Steps retrieved for each role: " + steps_for_each_role)
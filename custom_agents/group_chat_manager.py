@@ -1,26 +1,71 @@
-from autogen import GroupChatManager, GroupChat
+from typing import Dict, List, Optional
+from autogen import ConversableAgent, GroupChatManager, GroupChat
 from models.agent_context import AgentContext
 import json
 
+# Fields of a message that are kept in an agent's conversation, as in ConversableAgent._append_oai_message
+OAI_MESSAGE_FIELDS = ("content", "function_call", "tool_calls", "tool_responses", "tool_call_id", "name", "context")
+
 class ResumableGroupChatManager(GroupChatManager):
     groupchat: GroupChat
 
-    def __init__(self, groupchat: GroupChat, context: AgentContext, **kwargs):
-        self.groupchat = groupchat
-        
+    def __init__(self, groupchat: GroupChat, context: AgentContext, history: Optional[List[Dict]] = None, **kwargs):
+        self.context = context
+
         if history:
-            self.groupchat.messages = history
+            groupchat.messages = history
 
         super().__init__(groupchat, **kwargs)
 
         if history:
             self.restore_from_history(history)
 
-    def restore_from_history(self, history) -> None:
+    def restore_from_history(self, history: List[Dict]) -> None:
+        """
+        Installs the history directly into the conversation between the manager and each agent, the state that
+        sending every message to every agent would leave behind, without going through send/receive.
+        Each message is converted once, and no hooks run, so capabilities such as StateAwareNonLlm do not
+        write the replayed messages to the database again.
+        """
+        # What the manager keeps as sender and what each agent keeps as receiver
+        sent = [_to_oai_message(message, "assistant") for message in history]
+        received = [_to_oai_message(message, "user") for message in history]
+
+        for agent in self.groupchat.agents:
+            if agent != self:
+                # Every conversation gets its own copies, since agents may edit messages in place
+                self._oai_messages[agent].extend([dict(message) for message in sent])
+                agent._oai_messages[self].extend([dict(message) for message in received])
+
+    def replay_history(self, history: List[Dict]) -> None:
+        """
+        Restores the history by sending every message to every agent, running all send hooks for each one.
+        Much slower than restore_from_history; only use it when a hook has to observe the replayed messages.
+        """
         for message in history:
-            # broadcast the message to all agents except the speaker.  
+            # broadcast the message to all agents except the speaker.
             # This idea is the same way GroupChat is implemented in AutoGen for new messages, this method simply allows us to replay old messages first.
             for agent in self.groupchat.agents:
                 if agent != self:
                     self.send(message, agent, request_reply=False, silent=True)
 
+def _to_oai_message(message, role: str) -> Dict:
+    """Converts a message the way ConversableAgent._append_oai_message does, raising like send does for invalid ones."""
+    message = ConversableAgent._message_to_dict(message)
+    oai_message = {k: message[k] for k in OAI_MESSAGE_FIELDS if k in message and message[k] is not None}
+    if "content" not in oai_message:
+        if "function_call" in oai_message or "tool_calls" in oai_message:
+            oai_message["content"] = None
+        else:
+            raise ValueError("Message can't be converted into a valid ChatCompletion message. Either content or function_call must be provided.")
+
+    if message.get("role") in ["function", "tool"]:
+        oai_message["role"] = message.get("role")
+    elif "override_role" in message:
+        oai_message["role"] = message.get("override_role")
+    else:
+        oai_message["role"] = role
+
+    if oai_message.get("function_call", False) or oai_message.get("tool_calls", False):
+        oai_message["role"] = "assistant"
+    return oai_message
@@ -1,98 +1,56 @@
-import os
-import pyodbc
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase
 from termcolor import colored
 
-SERVER = os.environ["SERVER"]
-DATABASE = os.environ["DATABASE"]
-USERNAME = os.environ["USERNAME"]
-PASSWORD = os.environ["PASSWORD"]
-connectionString = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
+from datastore.storage_backend import StorageBackend, StorageError, get_backend
+
+# The original task tracker had no notion of plans; its tasks are kept under a fixed plan and task id
+LEGACY_PLAN_ID = "legacy"
+LEGACY_TASK_ID = "0"
 
 class Tasks:
 
-    def update_task(self, agent_name: str, task: str, detail: str, status: str):
-        global connectionString
-        conn = pyodbc.connect(connectionString)
-        cursor = conn.cursor()
+    def __init__(self, backend: StorageBackend = None):
+        # Resolved on first use so that importing this module (or constructing Tasks as a default argument)
+        # does not require any storage settings
+        self._backend = backend
 
-        # if the task has any single quotes, we need to replace with two single quotes to avoid an unclosed quotation mark
-        task = task.replace("'", "''")
+    @property
+    def backend(self) -> StorageBackend:
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
 
-        SQL_STATEMENT = f"""
-            Update TaskTracker
-            Set Status = '{status}', Detail = '{detail}'
-            Where Agent = '{agent_name}' and Task = '{task}'
-            """
-        cursor.execute(
-            SQL_STATEMENT            
-        )
-        
-        conn.commit()
+    def update_task(self, agent_name: str, task: str, detail: str, status: str):
+        try:
+            self.backend.update_task(LEGACY_PLAN_ID, LEGACY_TASK_ID, agent_name, task, status, detail, None)
 
-        print(colored(f"Task {task}, for Agent {agent_name} updated. New status: {status}", "green"))
+            print(colored(f"Task {task}, for Agent {agent_name} updated. New status: {status}", "green"))
+        except StorageError as e:
+            print(f"Error updating task: {e}")
 
     # Print all tasks that exist in the database
     def print_tasks(self):
-        global connectionString
-        conn = pyodbc.connect(connectionString)
-        cursor = conn.cursor()
-
-        SQL_STATEMENT = """
-            Select * from TaskTracker
-            """
-        cursor.execute(
-            SQL_STATEMENT
-        )
-        for row in cursor.fetchall():
-            print(colored(row, "light_green"))
+        try:
+            for row in self.backend.fetch_all_tasks():
+                print(colored(row, "light_green"))
+        except StorageError as e:
+            print(f"Error retrieving tasks: {e}")
 
     # Determines if a task exists in the database or not
     def task_exists(self, task: str):
-        task_exists = False
+        try:
+            rows = self.backend.fetch_tasks(LEGACY_PLAN_ID, LEGACY_TASK_ID)
+        except StorageError as e:
+            print(f"Error retrieving tasks: {e}")
+            return False
 
-        global connectionString
-        conn = pyodbc.connect(connectionString)
-        cursor = conn.cursor()
-
-        SQL_STATEMENT = f"""
-            Select Task from TaskTracker where Task = '{task}'
-            """
-        cursor.execute(
-            SQL_STATEMENT
-        )
-
-        row = cursor.fetchval()
-
-        if row != None:
-            task_exists = True
-        
-        return task_exists
+        return any(row['Task'] == task for row in rows)
 
 
     def add_task(self, agent_name: str, task: str):
-        global connectionString
-        conn = pyodbc.connect(connectionString)
-        cursor = conn.cursor()
-
-        SQL_STATEMENT = """
-            INSERT TaskTracker (
-            Agent,
-            Task, 
-            Status,
-            Detail
-            ) OUTPUT INSERTED.ID 
-            VALUES (?, ?, ?, ?)
-            """
-        cursor.execute(
-            SQL_STATEMENT,
-            agent_name,
-            task,
-            f'NOT DONE', # all new tasks start as NOT DONE
-            'Not started'
-        )
-        resultId = cursor.fetchval()
-        conn.commit()
+        try:
+            # all new tasks start as NOT DONE
+            self.backend.add_task(LEGACY_PLAN_ID, LEGACY_TASK_ID, agent_name, task)
 
-        print(colored(f"Task Added: Agent: {agent_name}, Task: {task} (ID: {resultId})", "green"))
\ No newline at end of file
+            print(colored(f"Task Added: Agent: {agent_name}, Task: {task}", "green"))
+        except StorageError as e:
+            print(f"Error saving task: {e}")
\ No newline at end of file
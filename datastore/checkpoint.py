@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from datastore.transcript import TranscriptWriter, add_message_observer, read_transcript, remove_message_observer
+
+DEFAULT_CHECKPOINT_DIR = "./tmp/checkpoints"
+DEFAULT_SNAPSHOT_EVERY = 50
+
+# Task columns kept in a checkpoint; ChatHistory stays in the database
+TASK_STATE_FIELDS = ("TaskId", "AgentName", "Task", "Status", "Detail")
+
+
+class GroupChatState:
+    """Group chat state as of a checkpoint: what a resume needs without replaying the chat."""
+
+    def __init__(self, seq: int = 0, messages: List[Dict] = None, message_counts: Dict[str, int] = None, tasks: List[Dict] = None):
+        """
+        Args:
+            seq (int): number of messages recorded when the state was taken.
+            messages (List[Dict]): the group chat messages, oldest first.
+            message_counts (Dict[str, int]): StateAwareNonLlm.message_count of each agent, by agent name.
+            tasks (List[Dict]): the plan's task statuses, with the TASK_STATE_FIELDS columns.
+        """
+        self.seq = seq
+        self.messages = messages or []
+        self.message_counts = message_counts or {}
+        self.tasks = tasks or []
+
+    @property
+    def speakers(self) -> List[str]:
+        """Names of the speakers in speaking order."""
+        return [message.get("name") for message in self.messages]
+
+    @property
+    def last_speaker(self) -> Optional[str]:
+        return self.messages[-1].get("name") if self.messages else None
+
+    def apply(self, delta: Dict):
+        self.seq = delta["seq"]
+        self.messages.append(delta["message"])
+        self.message_counts.update(delta.get("message_counts", {}))
+        if "tasks" in delta:
+            tasks = {_task_key(task): task for task in self.tasks}
+            tasks.update({_task_key(task): task for task in delta["tasks"]})
+            self.tasks = list(tasks.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "messages": self.messages, "message_counts": self.message_counts, "tasks": self.tasks}
+
+
+def _task_key(task: Dict):
+    return (str(task["TaskId"]), task["AgentName"], task["Task"])
+
+
+def _task_state(row: Dict) -> Dict:
+    return {field: row.get(field) for field in TASK_STATE_FIELDS}
+
+
+class GroupChatCheckpointer:
+    """
+    Checkpoints a group chat as a compact snapshot of its full state plus a delta log of the messages since.
+    Every message the chat records is appended to the delta log with the message counts and task statuses
+    that changed with it; every snapshot_every messages (and on close) the state is written to a new snapshot
+    and the delta log starts over. Resuming loads the snapshot and applies only the deltas after it.
+
+    Files, for a checkpoint named <name>: <directory>/<name>.snapshot.json and <directory>/<name>.delta.jsonl.
+    """
+
+    def __init__(self, groupchat, name: str, capabilities: Optional[Dict[str, Any]] = None, tasks=None,
+                 directory: Optional[str] = None, snapshot_every: Optional[int] = None):
+        """
+        Args:
+            groupchat (GroupChat): the group chat to checkpoint.
+            name (str): checkpoint name, typically the manager's name.
+            capabilities (Optional, Dict[str, StateAwareNonLlm]): the agents' capabilities by agent name, whose message_count is checkpointed.
+            tasks (Optional, Tasks): the plan's tasks, whose cached statuses are checkpointed.
+            directory (Optional, str): where checkpoints are kept. Defaults to CHECKPOINT_DIR or ./tmp/checkpoints.
+            snapshot_every (Optional, int): messages between snapshots. Defaults to CHECKPOINT_SNAPSHOT_EVERY or 50.
+        """
+        self.groupchat = groupchat
+        self.name = name
+        self.capabilities = capabilities or {}
+        self.tasks = tasks
+        self.directory = directory or os.environ.get("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+        self.snapshot_every = snapshot_every or int(os.environ.get("CHECKPOINT_SNAPSHOT_EVERY", DEFAULT_SNAPSHOT_EVERY))
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        state = load_checkpoint(name, self.directory)
+        self._seq = state.seq if state else 0
+        self._snapshot_seq = self._seq
+        self._message_counts = self._current_message_counts()
+        self._tasks = self._current_tasks()
+        self._delta = TranscriptWriter(delta_path(self.directory, name))
+
+        if state is None:
+            # The first snapshot holds whatever history the chat was started with, which the deltas never see
+            with self._lock:
+                self._snapshot()
+
+    def attach(self):
+        """Starts checkpointing every message the group chat records."""
+        add_message_observer(self.groupchat, self._record)
+
+    def close(self):
+        """Stops checkpointing and writes a final snapshot."""
+        remove_message_observer(self.groupchat, self._record)
+        with self._lock:
+            if self._seq > self._snapshot_seq:
+                # Counts and statuses may have moved on since the last message was recorded
+                self._message_counts = self._current_message_counts()
+                self._tasks = self._current_tasks()
+                self._snapshot()
+            self._delta.close()
+
+    def _current_message_counts(self) -> Dict[str, int]:
+        return {name: capability.message_count for name, capability in self.capabilities.items()}
+
+    def _current_tasks(self) -> Dict:
+        if self.tasks is None:
+            return {}
+        # The task cache is in-process, so this costs no round-trip
+        return {_task_key(row): _task_state(row) for row in self.tasks.cache.cached_rows()}
+
+    def _record(self, message: Dict):
+        with self._lock:
+            self._seq += 1
+            delta = {"seq": self._seq, "message": message}
+
+            message_counts = self._current_message_counts()
+            changed_counts = {name: count for name, count in message_counts.items() if self._message_counts.get(name) != count}
+            if changed_counts:
+                delta["message_counts"] = changed_counts
+            self._message_counts = message_counts
+
+            tasks = self._current_tasks()
+            changed_tasks = [task for key, task in tasks.items() if self._tasks.get(key) != task]
+            if changed_tasks:
+                delta["tasks"] = changed_tasks
+            self._tasks = tasks
+
+            self._delta.append(delta)
+
+            if self._seq - self._snapshot_seq >= self.snapshot_every:
+                self._snapshot()
+
+    def _snapshot(self):
+        state = GroupChatState(self._seq, list(self.groupchat.messages), dict(self._message_counts), list(self._tasks.values()))
+        path = snapshot_path(self.directory, self.name)
+
+        # Write then rename, so a crash leaves either the old snapshot or the new one
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state.as_dict(), file, default=str)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        self._snapshot_seq = self._seq
+
+        # Start a new delta log; deltas left over by a crash at this point are skipped on load by their seq
+        self._delta.close()
+        os.remove(self._delta.path)
+        self._delta = TranscriptWriter(self._delta.path)
+
+
+def snapshot_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.snapshot.json")
+
+
+def delta_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.delta.jsonl")
+
+
+def load_checkpoint(name: str, directory: Optional[str] = None) -> Optional[GroupChatState]:
+    """Loads the latest snapshot and applies the deltas recorded after it. Returns None when there is no checkpoint."""
+    directory = directory or os.environ.get("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+    path = snapshot_path(directory, name)
+    deltas = delta_path(directory, name)
+    if not os.path.exists(path) and not os.path.exists(deltas):
+        return None
+
+    state = GroupChatState()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            state = GroupChatState(**json.load(file))
+
+    for delta in read_transcript(deltas):
+        if delta["seq"] > state.seq:
+            state.apply(delta)
+
+    return state
+
+
+def restore_group_chat(manager, state: GroupChatState, capabilities: Optional[Dict[str, Any]] = None, tasks=None):
+    """
+    Restores a ResumableGroupChatManager's group chat from a checkpoint: installs the messages in bulk,
+    restores each capability's message_count and seeds the plan's task cache with the checkpointed statuses.
+    """
+    manager.groupchat.messages = list(state.messages)
+    manager.restore_from_history(state.messages)
+
+    for name, capability in (capabilities or {}).items():
+        if name in state.message_counts:
+            capability.message_count = state.message_counts[name]
+
+    if tasks is not None and state.tasks:
+        tasks.cache.record_rows([dict(task, PlanId=tasks.planId) for task in state.tasks])
@@ -0,0 +1,350 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from termcolor import colored
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHECKOUT_TIMEOUT = 30.0
+DEFAULT_MAX_IDLE_TIME = 300.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be checked out of the pool before the checkout timeout."""
+
+
+class PoolStats:
+    """Counters describing how a ConnectionPool is being used."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.connections_created = 0
+        self.connections_discarded = 0
+        self.connections_reaped = 0
+
+    @property
+    def average_wait_time(self) -> float:
+        if self.checkouts == 0:
+            return 0.0
+        return self.total_wait_time / self.checkouts
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "total_wait_time": self.total_wait_time,
+            "average_wait_time": self.average_wait_time,
+            "max_wait_time": self.max_wait_time,
+            "exhausted": self.exhausted,
+            "timeouts": self.timeouts,
+            "connections_created": self.connections_created,
+            "connections_discarded": self.connections_discarded,
+            "connections_reaped": self.connections_reaped,
+        }
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of long-lived DB-API connections.
+
+    Connections are created lazily up to max_size and handed out most-recently-used first so that a small
+    working set stays warm while the rest age out. Connections that have been idle longer than
+    health_check_interval are validated with health_check_query before being handed out, and connections idle
+    longer than max_idle_time are closed by a background reaper.
+
+    Any DB-API 2.0 connect callable can back the pool, so the same code path can be exercised against
+    SQLite or an in-process stand-in instead of SQL Server.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: Optional[int] = None,
+        checkout_timeout: Optional[float] = None,
+        max_idle_time: Optional[float] = None,
+        health_check_interval: Optional[float] = None,
+        health_check_query: Optional[str] = "SELECT 1",
+    ):
+        """
+        Args:
+            connect (Callable): creates a new DB-API connection.
+            max_size (Optional, int): maximum number of open connections (idle and checked out). Default SQL_POOL_SIZE or 5.
+            checkout_timeout (Optional, float): seconds to wait for a free connection before raising PoolExhaustedError. Default SQL_POOL_CHECKOUT_TIMEOUT or 30.
+            max_idle_time (Optional, float): seconds an idle connection is kept open before it is reaped. 0 disables reaping. Default SQL_POOL_MAX_IDLE_TIME or 300.
+            health_check_interval (Optional, float): idle seconds after which a connection is validated before reuse. Default SQL_POOL_HEALTH_CHECK_INTERVAL or 30.
+            health_check_query (Optional, str): query used to validate a connection. None disables health checks.
+        """
+        self.max_size = max_size if max_size is not None else int(os.environ.get("SQL_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else float(os.environ.get("SQL_POOL_CHECKOUT_TIMEOUT", DEFAULT_CHECKOUT_TIMEOUT))
+        self.max_idle_time = max_idle_time if max_idle_time is not None else float(os.environ.get("SQL_POOL_MAX_IDLE_TIME", DEFAULT_MAX_IDLE_TIME))
+        self.health_check_interval = health_check_interval if health_check_interval is not None else float(os.environ.get("SQL_POOL_HEALTH_CHECK_INTERVAL", DEFAULT_HEALTH_CHECK_INTERVAL))
+        if self.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self._connect = connect
+        self.health_check_query = health_check_query
+
+        self.stats = PoolStats()
+
+        # (connection, last_used) pairs; the right end holds the most recently returned connection.
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition(threading.Lock())
+
+        self._reaper = None
+        self._reaper_stop = threading.Event()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out for the duration of the with block.
+        Whether or not the block raises, any transaction it left open is rolled back when the connection is returned,
+        and a connection that cannot be rolled back is discarded.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def acquire(self):
+        """Checks a connection out of the pool, creating one if the pool is below max_size."""
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        waited = False
+
+        while True:
+            conn, last_used = self._checkout(deadline, waited)
+            waited = True
+
+            if conn is None:
+                # We reserved a slot; open the connection outside of the lock.
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    self._free_slot()
+                    raise
+                with self._condition:
+                    self.stats.connections_created += 1
+                break
+
+            if self._needs_health_check(last_used) and not self._is_healthy(conn):
+                self._close(conn)
+                self._free_slot()
+                with self._condition:
+                    self.stats.connections_discarded += 1
+                continue
+
+            break
+
+        self._record_checkout(time.monotonic() - start)
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        """
+        Returns a connection to the pool. Discarded connections are closed and their slot freed.
+        Anything the caller left uncommitted is rolled back first, so no transaction or lock outlives the checkout;
+        a connection that cannot be rolled back is discarded.
+        """
+        if not discard and not self._closed and not self._try_rollback(conn):
+            discard = True
+
+        if discard or self._closed:
+            self._close(conn)
+            self._free_slot()
+            if discard:
+                with self._condition:
+                    self.stats.connections_discarded += 1
+            return
+
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+        self._ensure_reaper()
+
+    def reap_idle(self) -> int:
+        """Closes connections that have been idle longer than max_idle_time. Returns the number closed."""
+        if not self.max_idle_time:
+            return 0
+
+        expired = []
+        cutoff = time.monotonic() - self.max_idle_time
+        with self._condition:
+            # The left end holds the least recently used connections.
+            while self._idle and self._idle[0][1] < cutoff:
+                expired.append(self._idle.popleft()[0])
+            self._size -= len(expired)
+            self.stats.connections_reaped += len(expired)
+            if expired:
+                self._condition.notify(len(expired))
+
+        for conn in expired:
+            self._close(conn)
+
+        return len(expired)
+
+    def close(self):
+        """Closes every idle connection and prevents checked-out connections from being returned to the pool."""
+        self._reaper_stop.set()
+        with self._condition:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+
+        for conn in idle:
+            self._close(conn)
+
+    @property
+    def size(self) -> int:
+        """Number of open connections, idle and checked out."""
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def _checkout(self, deadline: float, waited: bool) -> Tuple[Any, Optional[float]]:
+        """
+        Pops an idle connection or reserves a slot for a new one, waiting up to the deadline.
+        Returns (None, None) when a slot was reserved.
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+
+                if not waited:
+                    self.stats.exhausted += 1
+                    waited = True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.timeouts += 1
+                    raise PoolExhaustedError(
+                        f"No connection available after {self.checkout_timeout}s (pool size {self.max_size})"
+                    )
+                self._condition.wait(remaining)
+
+    def _free_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _record_checkout(self, wait_time: float):
+        with self._condition:
+            self.stats.checkouts += 1
+            self.stats.total_wait_time += wait_time
+            if wait_time > self.stats.max_wait_time:
+                self.stats.max_wait_time = wait_time
+
+    def _needs_health_check(self, last_used: Optional[float]) -> bool:
+        if not self.health_check_query or last_used is None:
+            return False
+        return time.monotonic() - last_used >= self.health_check_interval
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _try_rollback(self, conn) -> bool:
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            print(colored(f"Error closing pooled connection: {e}", "red"))
+
+    def _ensure_reaper(self):
+        if self._reaper is not None or not self.max_idle_time:
+            return
+
+        with self._condition:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="ConnectionPoolReaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(self.max_idle_time / 2, 1.0)
+        while not self._reaper_stop.wait(interval):
+            self.reap_idle()
+
+
+def _odbc_connect(connection_string: str):
+    # Imported lazily so the pool can be used (and tested) with other DB-API drivers where pyodbc is not installed.
+    import pyodbc
+
+    return pyodbc.connect(connection_string)
+
+
+_pools: Dict[Tuple[int, str], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_string: str, connect: Optional[Callable[[], Any]] = None, **kwargs) -> ConnectionPool:
+    """
+    Returns the process-wide pool for the given connection string, creating it on first use.
+    Pools are keyed by process id so a forked worker never reuses its parent's connections.
+
+    Args:
+        connection_string (str): the ODBC connection string; also the registry key.
+        connect (Optional, Callable): overrides how connections are opened. Defaults to pyodbc.connect(connection_string).
+        kwargs: passed to ConnectionPool when the pool is created.
+    """
+    key = (os.getpid(), connection_string)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if connect is None:
+                connect = lambda: _odbc_connect(connection_string)
+            pool = ConnectionPool(connect, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Closes every pool owned by this process."""
+    pid = os.getpid()
+    with _pools_lock:
+        keys = [key for key in _pools if key[0] == pid]
+        pools = [_pools.pop(key) for key in keys]
+
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all_pools)
@@ -0,0 +1,139 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from datastore.storage_backend import EventRecord, Row, StorageBackend, TaskRecord, TaskUpdate
+
+
+def _key(*values) -> Tuple[str, ...]:
+    # SQL Server and SQLite compare ids across int/str (e.g. TaskId 1 and "1"); mirror that by keying on strings
+    return tuple(None if value is None else str(value) for value in values)
+
+
+class InMemoryBackend(StorageBackend):
+    """
+    Process-local storage backend that keeps everything in dicts. Nothing survives the process,
+    which makes it suited to tests, benchmarks of the capability hooks, and throwaway local runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._events: Dict[Tuple, List[Row]] = {}
+        # Latest event of each (planId, agentName, taskId, MessageId)
+        self._messages: Dict[Tuple, Row] = {}
+        self._tasks: List[Row] = []
+        self._last_memory_id = 0
+        self._last_task_id = 0
+
+    def save_events(self, records: List[EventRecord]):
+        with self._lock:
+            for planId, agentName, taskId, event in records:
+                self._last_memory_id += 1
+                row = {
+                    "MemoryId": self._last_memory_id,
+                    "PlanId": planId,
+                    "AgentName": agentName,
+                    "TaskId": taskId,
+                    "Role": event.role,
+                    "Message": event.message,
+                    "MessageType": event.message_type,
+                    "FromAgent": event.from_agent_name,
+                    "InsertTimeStamp": datetime.now(),
+                    "MessageId": event.message_id,
+                }
+                self._events.setdefault(_key(planId, agentName, taskId), []).append(row)
+                self._messages[_key(planId, agentName, taskId, event.message_id)] = row
+
+    def fetch_events(self, planId, agentName, taskId, lookback: int = -1, page_size: int = 500) -> Iterator[Row]:
+        with self._lock:
+            events = list(self._events.get(_key(planId, agentName, taskId), []))
+        if lookback is not None and lookback >= 0:
+            events = events[-lookback:] if lookback > 0 else []
+        for row in events:
+            yield dict(row)
+
+    def fetch_events_page(self, planId, agentName, taskId, after_memory_id=None, page_size: int = 500) -> List[Row]:
+        after_memory_id = after_memory_id or 0
+        with self._lock:
+            events = self._events.get(_key(planId, agentName, taskId), [])
+            page = [dict(row) for row in events if row["MemoryId"] > after_memory_id]
+        return page[:page_size]
+
+    def fetch_plan_events(self, planId, agentNames: Optional[List[str]] = None, lookback: int = -1) -> List[Row]:
+        names = None if agentNames is None else {str(name) for name in agentNames}
+        rows = []
+        with self._lock:
+            for (plan, agent, _), events in sorted(self._events.items(), key=lambda item: tuple(map(str, item[0]))):
+                if plan != _key(planId)[0] or (names is not None and agent not in names):
+                    continue
+                if lookback is not None and lookback >= 0:
+                    events = events[-lookback:] if lookback > 0 else []
+                rows.extend(dict(row) for row in events)
+        return rows
+
+    def fetch_message(self, planId, agentName, taskId, message_id: str) -> Optional[Row]:
+        with self._lock:
+            row = self._messages.get(_key(planId, agentName, taskId, message_id))
+            return dict(row) if row is not None else None
+
+    def add_task(self, planId, taskId, agentName: str, task: str):
+        with self._lock:
+            self._last_task_id += 1
+            self._tasks.append({
+                "id": self._last_task_id,
+                "PlanId": planId,
+                "TaskId": taskId,
+                "AgentName": agentName,
+                "Task": task,
+                "insert_timestamp": datetime.now(),
+                "Status": "NOT DONE",
+                "Detail": "Not started",
+                "ChatHistory": None,
+            })
+
+    def upsert_task(self, planId, taskId, agentName: str, task: str) -> bool:
+        with self._lock:
+            key = _key(planId, taskId, agentName, task)
+            if any(_key(row["PlanId"], row["TaskId"], row["AgentName"], row["Task"]) == key for row in self._tasks):
+                return False
+            self.add_task(planId, taskId, agentName, task)
+            return True
+
+    def register_tasks(self, planId, tasks: List[TaskRecord]) -> List[Row]:
+        with self._lock:
+            keys = set()
+            for taskId, agentName, task in tasks:
+                self.upsert_task(planId, taskId, agentName, task)
+                keys.add(_key(planId, taskId, agentName, task))
+            return [dict(row) for row in self._tasks
+                    if _key(row["PlanId"], row["TaskId"], row["AgentName"], row["Task"]) in keys]
+
+    def update_task(self, planId, taskId, agentName: str, task: str, status: str, detail: str, chat_history: str):
+        with self._lock:
+            for row in self._tasks:
+                if _key(row["PlanId"], row["TaskId"], row["AgentName"], row["Task"]) == _key(planId, taskId, agentName, task):
+                    row["Status"] = status
+                    row["Detail"] = detail
+                    row["ChatHistory"] = chat_history
+
+    def update_tasks(self, planId, taskId, updates: List[TaskUpdate]):
+        changes = {_key(planId, taskId, agentName, task): (status, detail, chat_history)
+                   for agentName, task, status, detail, chat_history in updates}
+        with self._lock:
+            for row in self._tasks:
+                change = changes.get(_key(row["PlanId"], row["TaskId"], row["AgentName"], row["Task"]))
+                if change is not None:
+                    row["Status"], row["Detail"], row["ChatHistory"] = change
+
+    def task_exists(self, taskId, agentName: str, task: str) -> bool:
+        with self._lock:
+            return any(_key(row["TaskId"], row["AgentName"], row["Task"]) == _key(taskId, agentName, task) for row in self._tasks)
+
+    def fetch_tasks(self, planId, taskId=None) -> List[Row]:
+        with self._lock:
+            return [dict(row) for row in self._tasks
+                    if _key(row["PlanId"]) == _key(planId) and (taskId is None or _key(row["TaskId"]) == _key(taskId))]
+
+    def fetch_all_tasks(self) -> List[Row]:
+        with self._lock:
+            return [dict(row) for row in self._tasks]
@@ -0,0 +1,113 @@
+import os
+import re
+import sys
+from typing import List, Tuple
+
+import pyodbc
+from termcolor import colored
+
+from datastore.connection_pool import ConnectionPool, get_pool
+
+SQL_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql_scripts")
+MIGRATIONS_DIR = os.path.join(SQL_SCRIPTS_DIR, "migrations")
+# Idempotent CREATE OR ALTER scripts that are re-applied after every migration run, in this order
+REPEATABLE_DIRS = [os.path.join(SQL_SCRIPTS_DIR, "views"), os.path.join(SQL_SCRIPTS_DIR, "stored_procedures")]
+
+MIGRATION_FILE_PATTERN = re.compile(r"^V(\d+)__(.+)\.sql$")
+BATCH_SEPARATOR = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+
+CREATE_SCHEMA_VERSION_SQL = """
+IF OBJECT_ID(N'dbo.SchemaVersion', N'U') IS NULL
+    CREATE TABLE dbo.SchemaVersion (
+        Version INT NOT NULL CONSTRAINT PK_SchemaVersion PRIMARY KEY,
+        Description NVARCHAR(200) NOT NULL,
+        AppliedOn DATETIME NOT NULL CONSTRAINT DF_SchemaVersion_AppliedOn DEFAULT (getdate())
+    )
+"""
+
+
+class MigrationRunner:
+    """
+    Applies the versioned scripts in sql_scripts/migrations (named V<version>__<description>.sql) that have not
+    yet been recorded in dbo.SchemaVersion, each in its own transaction, then re-applies the views and stored
+    procedures so they always match the latest schema.
+
+    The scripts in sql_scripts/tables are the baseline schema and must exist before the first run.
+    """
+
+    def __init__(self, pool: ConnectionPool, migrations_dir: str = MIGRATIONS_DIR, repeatable_dirs: List[str] = REPEATABLE_DIRS):
+        self.pool = pool
+        self.migrations_dir = migrations_dir
+        self.repeatable_dirs = repeatable_dirs
+
+    def pending_migrations(self) -> List[Tuple[int, str, str]]:
+        """Returns (version, description, path) for every migration not yet applied, lowest version first."""
+        applied = self.applied_versions()
+        return [migration for migration in self.available_migrations() if migration[0] not in applied]
+
+    def available_migrations(self) -> List[Tuple[int, str, str]]:
+        migrations = []
+        for file_name in os.listdir(self.migrations_dir):
+            match = MIGRATION_FILE_PATTERN.match(file_name)
+            if match:
+                migrations.append((int(match.group(1)), match.group(2).replace("_", " "), os.path.join(self.migrations_dir, file_name)))
+        return sorted(migrations)
+
+    def applied_versions(self) -> set:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_SCHEMA_VERSION_SQL)
+            conn.commit()
+            cursor.execute("SELECT Version FROM dbo.SchemaVersion")
+            versions = {row[0] for row in cursor.fetchall()}
+            cursor.close()
+        return versions
+
+    def migrate(self) -> List[int]:
+        """Applies every pending migration and the repeatable scripts. Returns the versions applied."""
+        applied = []
+        for version, description, path in self.pending_migrations():
+            print(colored(f"Applying migration V{version:03d}: {description}", "light_green"))
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                for batch in split_batches(read_script(path)):
+                    cursor.execute(batch)
+                cursor.execute("INSERT INTO dbo.SchemaVersion (Version, Description) VALUES (?, ?)", version, description)
+                conn.commit()
+                cursor.close()
+            applied.append(version)
+
+        self.apply_repeatable()
+        return applied
+
+    def apply_repeatable(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for directory in self.repeatable_dirs:
+                for file_name in sorted(os.listdir(directory)):
+                    if file_name.endswith(".sql"):
+                        for batch in split_batches(read_script(os.path.join(directory, file_name))):
+                            cursor.execute(batch)
+            conn.commit()
+            cursor.close()
+
+
+def read_script(path: str) -> str:
+    with open(path, "r", encoding="utf-8-sig") as file:
+        return file.read()
+
+
+def split_batches(script: str) -> List[str]:
+    """Splits a script on GO separators, which are a client-side convention rather than T-SQL."""
+    return [batch.strip() for batch in BATCH_SEPARATOR.split(script) if batch.strip()]
+
+
+if __name__ == "__main__":
+    # Usage: python -m datastore.migrations [connection string]; defaults to SQL_CONNECTIONSTRING
+    connection_string = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SQL_CONNECTIONSTRING")
+    try:
+        versions = MigrationRunner(get_pool(connection_string)).migrate()
+        print(colored(f"Applied {len(versions)} migration(s); schema is up to date", "green"))
+    except pyodbc.Error as e:
+        print(colored(f"Error applying migrations: {e}", "red"))
+        sys.exit(1)
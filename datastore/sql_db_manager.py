@@ -1,4 +1,4 @@
-import pyodbc
+from datastore.storage_backend import StorageBackend, StorageError, create_backend, get_backend, SQLSERVER_BACKEND
 
 class SqlManager:
     def __init__(self, server: str, database: str, username: str, password: str):
@@ -9,16 +9,18 @@ class SqlManager:
         self.password = password
         self.use_connection_string = False
         
-    def __init__(self, connection_string: str):
-        # Retrieve the connection strings here
+    def __init__(self, connection_string: str = None, backend: StorageBackend = None):
+        # Retrieve the connection strings here; with neither a connection string nor a backend
+        # the process-wide backend (see STORAGE_BACKEND) is used
         self.connection_string = connection_string
         self.use_connection_string = True
+        self.backend = backend
         
-    def __get_connection(self):
+    def __get_connection_string(self):
         if self.use_connection_string:
-            return pyodbc.connect(self.connection_string)
+            return self.connection_string
         else:
-            return pyodbc.connect(
+            return (
                 f"DRIVER={{ODBC Driver 17for SQL Server}};"
                 f"SERVER={self.server};"
                 f"DATABASE={self.database};"
@@ -26,27 +28,24 @@ class SqlManager:
                 f"PWD={self.password};"
             )
             
+    def __get_backend(self):
+        if self.backend is None:
+            connection_string = self.__get_connection_string()
+            if connection_string:
+                # Draws from the same process-wide connection pool as Memory and Tasks
+                self.backend = create_backend(SQLSERVER_BACKEND, connection_string=connection_string)
+            else:
+                self.backend = get_backend()
+        return self.backend
+            
     def executeSql(self, sql):
         try:
-            # Establish a connection to the Azure SQL database
-            conn = self.__get_connection()
-            
-            # Create a cursor object to execute SQL statements
-            cursor = conn.cursor()
-            
-            # Execute the SQL statement
-            cursor.execute(sql)
-            
-            # Commit the changes (if any)
-            conn.commit()
-            
-            # Close the cursor and connection
-            cursor.close()
-            conn.close()
+            # Execute the SQL statement and commit the changes (if any)
+            self.__get_backend().execute(sql)
             
             # Return any desired result or success message
             return "SQL statement executed successfully"
         
-        except pyodbc.Error as e:
+        except StorageError as e:
             # Handle any errors that occur during execution
             return f"Error executing SQL statement: {str(e)}"
\ No newline at end of file
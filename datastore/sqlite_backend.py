@@ -0,0 +1,247 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from datastore.connection_pool import ConnectionPool, PoolExhaustedError
+from datastore.storage_backend import EventRecord, Row, StorageBackend, StorageError, TaskRecord, TaskUpdate
+
+# Mirrors sql_scripts/tables plus the V001-V003 migrations, with SQLite types
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS MemoryTable (
+    MemoryId INTEGER PRIMARY KEY AUTOINCREMENT,
+    PlanId TEXT NULL,
+    AgentName TEXT NULL,
+    TaskId TEXT NULL,
+    Role TEXT NULL,
+    Message TEXT NULL,
+    MessageType TEXT NULL,
+    FromAgent TEXT NULL,
+    InsertTimeStamp TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    MessageId TEXT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_MemoryTable_Plan_Agent_Task ON MemoryTable (PlanId, AgentName, TaskId, MemoryId);
+
+CREATE TABLE IF NOT EXISTS TaskTracker (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    PlanId TEXT NOT NULL,
+    TaskId TEXT NOT NULL,
+    AgentName TEXT NULL,
+    Task TEXT NULL,
+    insert_timestamp TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    Status TEXT NOT NULL,
+    Detail TEXT NULL,
+    ChatHistory TEXT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_TaskTracker_TaskId_Agent_Task ON TaskTracker (TaskId, AgentName, Task);
+CREATE INDEX IF NOT EXISTS IX_TaskTracker_Plan_TaskId_Agent_Task ON TaskTracker (PlanId, TaskId, AgentName, Task);
+"""
+
+# Created after MessageId is added to databases from before V003
+MESSAGE_ID_INDEX_SQL = "CREATE INDEX IF NOT EXISTS IX_MemoryTable_Plan_Agent_Task_MessageId ON MemoryTable (PlanId, AgentName, TaskId, MessageId)"
+
+MEMORY_COLUMNS = "MemoryId, PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent, InsertTimeStamp"
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Embedded storage backend for local runs, load tests and single-node deployments.
+    The database runs in WAL mode so readers never block the writer, and connections are pooled like SQL Server's.
+    """
+
+    def __init__(self, path: str, pool_size: int = 5, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            path (str): path to the database file. Its directory is created if needed.
+            pool_size (Optional, int): maximum number of pooled connections. Default 5.
+            busy_timeout_ms (Optional, int): how long a connection waits on a locked database. Default 5000.
+        """
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.pool = ConnectionPool(self._connect, max_size=pool_size)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA_SQL)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(MemoryTable)")}
+            if "MessageId" not in columns:
+                conn.execute("ALTER TABLE MemoryTable ADD COLUMN MessageId TEXT NULL")
+            conn.execute(MESSAGE_ID_INDEX_SQL)
+            conn.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        # WAL makes NORMAL durable against application crashes; only an OS crash can lose the last commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        try:
+            with self.pool.connection() as conn:
+                yield conn
+        except (sqlite3.Error, PoolExhaustedError) as e:
+            raise StorageError(str(e)) from e
+
+    def save_events(self, records: List[EventRecord]):
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO MemoryTable (PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent, MessageId) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(planId, agentName, taskId, event.role, event.message, event.message_type, event.from_agent_name, event.message_id)
+                 for planId, agentName, taskId, event in records],
+            )
+            conn.commit()
+
+    def fetch_events(self, planId, agentName, taskId, lookback: int = -1, page_size: int = 500) -> Iterator[Row]:
+        if lookback is None or lookback < 0:
+            sql = (f"SELECT {MEMORY_COLUMNS} FROM MemoryTable WHERE PlanId = ? AND AgentName = ? AND TaskId = ? "
+                   "ORDER BY MemoryId ASC")
+            params = (planId, agentName, taskId)
+        else:
+            sql = (f"SELECT * FROM (SELECT {MEMORY_COLUMNS} FROM MemoryTable WHERE PlanId = ? AND AgentName = ? AND TaskId = ? "
+                   "ORDER BY MemoryId DESC LIMIT ?) ORDER BY MemoryId ASC")
+            params = (planId, agentName, taskId, lookback)
+
+        with self._connection() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+            cursor.close()
+
+    def fetch_events_page(self, planId, agentName, taskId, after_memory_id=None, page_size: int = 500) -> List[Row]:
+        return self._fetch_rows(
+            f"SELECT {MEMORY_COLUMNS} FROM MemoryTable WHERE PlanId = ? AND AgentName = ? AND TaskId = ? AND MemoryId > ? "
+            "ORDER BY MemoryId ASC LIMIT ?",
+            (planId, agentName, taskId, after_memory_id or 0, page_size),
+        )
+
+    def fetch_plan_events(self, planId, agentNames: Optional[List[str]] = None, lookback: int = -1) -> List[Row]:
+        agent_filter = ""
+        params: list = [planId]
+        if agentNames is not None:
+            if not agentNames:
+                return []
+            agent_filter = f" AND AgentName IN ({', '.join('?' * len(agentNames))})"
+            params.extend(agentNames)
+        params.extend([lookback if lookback is not None else -1] * 2)
+
+        return self._fetch_rows(
+            f"SELECT {MEMORY_COLUMNS} FROM ("
+            f"SELECT *, ROW_NUMBER() OVER (PARTITION BY AgentName, TaskId ORDER BY MemoryId DESC) AS RowFromEnd "
+            f"FROM MemoryTable WHERE PlanId = ?{agent_filter}) "
+            "WHERE ? < 0 OR RowFromEnd <= ? "
+            "ORDER BY AgentName, TaskId, MemoryId",
+            tuple(params),
+        )
+
+    def fetch_message(self, planId, agentName, taskId, message_id: str) -> Optional[Row]:
+        rows = self._fetch_rows(
+            f"SELECT {MEMORY_COLUMNS} FROM MemoryTable WHERE PlanId = ? AND AgentName = ? AND TaskId = ? AND MessageId = ? "
+            "ORDER BY MemoryId DESC LIMIT 1",
+            (planId, agentName, taskId, message_id),
+        )
+        return rows[0] if rows else None
+
+    def add_task(self, planId, taskId, agentName: str, task: str):
+        self._execute(
+            "INSERT INTO TaskTracker (PlanId, TaskId, AgentName, Task, Status, Detail) VALUES (?, ?, ?, ?, 'NOT DONE', 'Not started')",
+            (planId, taskId, agentName, task),
+        )
+
+    def upsert_task(self, planId, taskId, agentName: str, task: str) -> bool:
+        with self._connection() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front so two connections cannot both see the task missing
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "INSERT INTO TaskTracker (PlanId, TaskId, AgentName, Task, Status, Detail) "
+                "SELECT ?, ?, ?, ?, 'NOT DONE', 'Not started' "
+                "WHERE NOT EXISTS (SELECT 1 FROM TaskTracker WHERE PlanId = ? AND TaskId = ? AND AgentName = ? AND Task = ?)",
+                (planId, taskId, agentName, task, planId, taskId, agentName, task),
+            )
+            inserted = cursor.rowcount > 0
+            conn.commit()
+
+        return inserted
+
+    def register_tasks(self, planId, tasks: List[TaskRecord]) -> List[Row]:
+        keys = {(str(taskId), agentName, task) for taskId, agentName, task in tasks}
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO TaskTracker (PlanId, TaskId, AgentName, Task, Status, Detail) "
+                "SELECT ?, ?, ?, ?, 'NOT DONE', 'Not started' "
+                "WHERE NOT EXISTS (SELECT 1 FROM TaskTracker WHERE PlanId = ? AND TaskId = ? AND AgentName = ? AND Task = ?)",
+                [(planId, taskId, agentName, task, planId, taskId, agentName, task) for taskId, agentName, task in keys],
+            )
+            cursor = conn.execute("SELECT * FROM TaskTracker WHERE PlanId = ? ORDER BY id", (planId,))
+            rows = [dict(row) for row in cursor.fetchall()]
+            cursor.close()
+            conn.commit()
+
+        return [row for row in rows if (str(row["TaskId"]), row["AgentName"], row["Task"]) in keys]
+
+    def update_task(self, planId, taskId, agentName: str, task: str, status: str, detail: str, chat_history: str):
+        self._execute(
+            "UPDATE TaskTracker SET Status = ?, Detail = ?, ChatHistory = ? "
+            "WHERE PlanId = ? AND TaskId = ? AND AgentName = ? AND Task = ?",
+            (status, detail, chat_history, planId, taskId, agentName, task),
+        )
+
+    def update_tasks(self, planId, taskId, updates: List[TaskUpdate]):
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE TaskTracker SET Status = ?, Detail = ?, ChatHistory = ? "
+                "WHERE PlanId = ? AND TaskId = ? AND AgentName = ? AND Task = ?",
+                [(status, detail, chat_history, planId, taskId, agentName, task)
+                 for agentName, task, status, detail, chat_history in updates],
+            )
+            conn.commit()
+
+    def task_exists(self, taskId, agentName: str, task: str) -> bool:
+        rows = self._fetch_rows(
+            "SELECT Task FROM TaskTracker WHERE TaskId = ? AND AgentName = ? AND Task = ? LIMIT 1",
+            (taskId, agentName, task),
+        )
+        return len(rows) > 0
+
+    def fetch_tasks(self, planId, taskId=None) -> List[Row]:
+        if taskId is None:
+            return self._fetch_rows("SELECT * FROM TaskTracker WHERE PlanId = ?", (planId,))
+        return self._fetch_rows("SELECT * FROM TaskTracker WHERE PlanId = ? AND TaskId = ?", (planId, taskId))
+
+    def fetch_all_tasks(self) -> List[Row]:
+        return self._fetch_rows("SELECT * FROM TaskTracker", ())
+
+    def execute(self, sql: str):
+        with self._connection() as conn:
+            conn.executescript(sql)
+            conn.commit()
+
+    def close(self):
+        self.pool.close()
+
+    def _execute(self, sql: str, params: tuple):
+        with self._connection() as conn:
+            conn.execute(sql, params)
+            conn.commit()
+
+    def _fetch_rows(self, sql: str, params: tuple) -> List[Row]:
+        with self._connection() as conn:
+            cursor = conn.execute(sql, params)
+            rows = [dict(row) for row in cursor.fetchall()]
+            cursor.close()
+
+        return rows
@@ -0,0 +1,155 @@
+import json
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import pyodbc
+
+from datastore.connection_pool import ConnectionPool, PoolExhaustedError, get_pool
+from datastore.storage_backend import EventRecord, Row, StorageBackend, StorageError, TaskRecord, TaskUpdate
+
+# SQL Server allows at most 2100 parameters per request and SaveToMemory takes 8
+MAX_EVENTS_PER_STATEMENT = 250
+
+SAVE_TO_MEMORY_SQL = "EXECUTE dbo.SaveToMemory ?, ?, ?, ?, ?, ?, ?, ?"
+
+
+class SqlServerBackend(StorageBackend):
+    """Storage backend for SQL Server (or Azure SQL) using the stored procedures in sql_scripts."""
+
+    def __init__(self, connection_string: str, pool: ConnectionPool = None):
+        """
+        Args:
+            connection_string (str): ODBC connection string.
+            pool (Optional, ConnectionPool): pool to draw connections from. Defaults to the process-wide pool for the connection string.
+        """
+        self.connection_string = connection_string
+        self.pool = pool if pool is not None else get_pool(connection_string)
+
+    @contextmanager
+    def _connection(self):
+        try:
+            with self.pool.connection() as conn:
+                yield conn
+        except (pyodbc.Error, PoolExhaustedError) as e:
+            raise StorageError(str(e)) from e
+
+    def save_events(self, records: List[EventRecord]):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            # One round-trip per chunk: the procedure calls are sent as a single batch and run in order
+            for start in range(0, len(records), MAX_EVENTS_PER_STATEMENT):
+                chunk = records[start:start + MAX_EVENTS_PER_STATEMENT]
+                params = []
+                for planId, agentName, taskId, event in chunk:
+                    params.extend([planId, agentName, taskId,
+                                   event.role, event.message, event.message_type, event.from_agent_name, event.message_id])
+                cursor.execute(";\n".join([SAVE_TO_MEMORY_SQL] * len(chunk)), params)
+
+            conn.commit()
+            cursor.close()
+
+    def fetch_events(self, planId, agentName, taskId, lookback: int = -1, page_size: int = 500) -> Iterator[Row]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            # Call the stored procedure with the appropriate parameters
+            cursor.execute("EXECUTE dbo.RetrieveMemory ?, ?, ?, ?",
+                            planId, agentName, taskId, lookback)
+            columns = [column[0] for column in cursor.description]
+
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+
+            cursor.close()
+
+    def fetch_events_page(self, planId, agentName, taskId, after_memory_id=None, page_size: int = 500) -> List[Row]:
+        return self._fetch_rows("EXECUTE dbo.RetrieveMemoryPage ?, ?, ?, ?, ?",
+                                planId, agentName, taskId, after_memory_id, page_size)
+
+    def fetch_plan_events(self, planId, agentNames: Optional[List[str]] = None, lookback: int = -1) -> List[Row]:
+        return self._fetch_rows("EXECUTE dbo.RetrievePlanMemory ?, ?, ?",
+                                planId, json.dumps(agentNames) if agentNames is not None else None, lookback)
+
+    def fetch_message(self, planId, agentName, taskId, message_id: str) -> Optional[Row]:
+        rows = self._fetch_rows("EXECUTE dbo.RetrieveMessage ?, ?, ?, ?", planId, agentName, taskId, message_id)
+        return rows[0] if rows else None
+
+    def add_task(self, planId, taskId, agentName: str, task: str):
+        self._execute("EXECUTE dbo.AddTask ?, ?, ?, ?",
+                      planId, taskId, agentName, task)
+
+    def upsert_task(self, planId, taskId, agentName: str, task: str) -> bool:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("EXECUTE dbo.UpsertTask ?, ?, ?, ?",
+                            planId, taskId, agentName, task)
+            # The procedure only returns a row when it inserted
+            inserted = cursor.fetchone() is not None
+            conn.commit()
+            cursor.close()
+
+        return inserted
+
+    def register_tasks(self, planId, tasks: List[TaskRecord]) -> List[Row]:
+        # The tasks travel as a single JSON parameter, so a plan of any size is one request with no 2100-parameter limit
+        payload = json.dumps([{"TaskId": str(taskId), "AgentName": agentName, "Task": task}
+                              for taskId, agentName, task in tasks])
+        # The procedure inserts, so its transaction is committed once the rows are read
+        return self._fetch_rows("EXECUTE dbo.RegisterTasks ?, ?", planId, payload, commit=True)
+
+    def update_task(self, planId, taskId, agentName: str, task: str, status: str, detail: str, chat_history: str):
+        self._execute("EXECUTE dbo.UpdateTask ?, ?, ?, ?, ?, ?, ?",
+                      planId, taskId, agentName, task, status, detail, chat_history)
+
+    def update_tasks(self, planId, taskId, updates: List[TaskUpdate]):
+        # One JSON parameter and one UPDATE for the whole status block of a message
+        payload = json.dumps([{"AgentName": agentName, "Task": task, "Status": status, "Detail": detail, "ChatHistory": chat_history}
+                              for agentName, task, status, detail, chat_history in updates])
+        self._execute("EXECUTE dbo.UpdateTasks ?, ?, ?", planId, taskId, payload)
+
+    def task_exists(self, taskId, agentName: str, task: str) -> bool:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("EXECUTE dbo.RetrieveTask ?, ?, ?",
+                            taskId, agentName, task)
+            row = cursor.fetchval()
+            cursor.close()
+
+        return row is not None
+
+    def fetch_tasks(self, planId, taskId=None) -> List[Row]:
+        return self._fetch_rows("EXECUTE dbo.RetrieveTasks ?, ?", planId, taskId)
+
+    def fetch_all_tasks(self) -> List[Row]:
+        return self._fetch_rows("SELECT * FROM dbo.vAllTasks")
+
+    def execute(self, sql: str):
+        self._execute(sql)
+
+    def close(self):
+        self.pool.close()
+
+    def _execute(self, sql: str, *params):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, *params)
+            conn.commit()
+            cursor.close()
+
+    def _fetch_rows(self, sql: str, *params, commit: bool = False) -> List[Row]:
+        # An error rolls the transaction back (see ConnectionPool.connection)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, *params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            if commit:
+                conn.commit()
+            cursor.close()
+
+        return rows
@@ -0,0 +1,160 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Rows exchanged with a backend are dicts keyed by the SQL Server column names
+# (MemoryTable: MemoryId, PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent, InsertTimeStamp, MessageId;
+#  TaskTracker: id, PlanId, TaskId, AgentName, Task, insert_timestamp, Status, Detail, ChatHistory)
+# so Memory and Tasks convert them the same way whichever backend produced them.
+Row = Dict[str, Any]
+
+# (planId, agentName, taskId, event) as queued by Memory; event.message_id is stored as MessageId
+EventRecord = Tuple[Any, Any, Any, Any]
+
+# (taskId, agentName, task) as registered by Tasks.register_plan
+TaskRecord = Tuple[Any, str, str]
+
+# (agentName, task, status, detail, chat_history) as written by Tasks.update_tasks
+TaskUpdate = Tuple[str, str, str, str, str]
+
+SQLSERVER_BACKEND = "sqlserver"
+SQLITE_BACKEND = "sqlite"
+MEMORY_BACKEND = "memory"
+
+DEFAULT_SQLITE_DB_PATH = "./tmp/agent_state.db"
+
+
+class StorageError(Exception):
+    """Raised by a backend when the underlying store fails; wraps the driver-specific error."""
+
+
+class StorageBackend(ABC):
+    """
+    Storage used by Memory, Tasks and SqlManager for agent memory events and task tracking.
+    Implementations must be safe to call from several threads.
+    """
+
+    @abstractmethod
+    def save_events(self, records: List[EventRecord]):
+        """Persists the events in order, as one unit of work."""
+
+    @abstractmethod
+    def fetch_events(self, planId, agentName, taskId, lookback: int = -1, page_size: int = 500) -> Iterator[Row]:
+        """Yields the last `lookback` events for the key (all when negative), oldest first."""
+
+    @abstractmethod
+    def fetch_events_page(self, planId, agentName, taskId, after_memory_id=None, page_size: int = 500) -> List[Row]:
+        """Returns up to page_size events with a MemoryId greater than after_memory_id, oldest first."""
+
+    @abstractmethod
+    def fetch_plan_events(self, planId, agentNames: Optional[List[str]] = None, lookback: int = -1) -> List[Row]:
+        """
+        Returns the events of several agents of a plan (all of them when agentNames is None) in one query,
+        with the last `lookback` events per agent and task (all when negative). Each agent's events are
+        oldest first; events of different agents are not ordered relative to each other.
+        """
+
+    @abstractmethod
+    def fetch_message(self, planId, agentName, taskId, message_id: str) -> Optional[Row]:
+        """Returns the latest event for the key whose MessageId is message_id, or None."""
+
+    @abstractmethod
+    def add_task(self, planId, taskId, agentName: str, task: str):
+        """Inserts a task with the initial NOT DONE status."""
+
+    @abstractmethod
+    def upsert_task(self, planId, taskId, agentName: str, task: str) -> bool:
+        """Inserts the task unless the plan already tracks it, atomically. Returns True if it was inserted."""
+
+    @abstractmethod
+    def register_tasks(self, planId, tasks: List[TaskRecord]) -> List[Row]:
+        """
+        Upserts every task in one transaction and one round-trip.
+        Returns the rows of all the given tasks, including those that were already tracked, in id order.
+        """
+
+    @abstractmethod
+    def update_task(self, planId, taskId, agentName: str, task: str, status: str, detail: str, chat_history: str):
+        """Updates the status, detail and chat history of a task."""
+
+    @abstractmethod
+    def update_tasks(self, planId, taskId, updates: List[TaskUpdate]):
+        """Applies several status updates of one task id in one transaction and one round-trip."""
+
+    @abstractmethod
+    def task_exists(self, taskId, agentName: str, task: str) -> bool:
+        """Returns True if the task has been added for the agent."""
+
+    @abstractmethod
+    def fetch_tasks(self, planId, taskId=None) -> List[Row]:
+        """Returns every task tracked for the plan and task id, or for the whole plan when taskId is None."""
+
+    @abstractmethod
+    def fetch_all_tasks(self) -> List[Row]:
+        """Returns every tracked task."""
+
+    def execute(self, sql: str):
+        """Executes a raw SQL statement. Only SQL-based backends support this."""
+        raise StorageError(f"{type(self).__name__} does not support raw SQL statements")
+
+    def close(self):
+        """Releases any resources held by the backend."""
+
+
+def connection_string_from_env() -> Optional[str]:
+    """SQL_CONNECTIONSTRING, or one built from SERVER/DATABASE/USERNAME/PASSWORD when those are set instead."""
+    connection_string = os.environ.get("SQL_CONNECTIONSTRING")
+    if connection_string:
+        return connection_string
+
+    parts = [os.environ.get(name) for name in ("SERVER", "DATABASE", "USERNAME", "PASSWORD")]
+    if all(parts):
+        server, database, username, password = parts
+        return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
+
+    return None
+
+
+def create_backend(kind: Optional[str] = None, **kwargs) -> StorageBackend:
+    """
+    Creates a backend of the given kind: "sqlserver" (default), "sqlite" or "memory".
+    Backend modules are imported here so that, e.g., the SQLite backend works without pyodbc installed.
+    """
+    kind = (kind or os.environ.get("STORAGE_BACKEND") or SQLSERVER_BACKEND).lower()
+
+    if kind == SQLSERVER_BACKEND:
+        from datastore.sqlserver_backend import SqlServerBackend
+
+        return SqlServerBackend(kwargs.pop("connection_string", None) or connection_string_from_env(), **kwargs)
+    if kind == SQLITE_BACKEND:
+        from datastore.sqlite_backend import SqliteBackend
+
+        return SqliteBackend(kwargs.pop("path", None) or os.environ.get("SQLITE_DB_PATH", DEFAULT_SQLITE_DB_PATH), **kwargs)
+    if kind == MEMORY_BACKEND:
+        from datastore.inmemory_backend import InMemoryBackend
+
+        return InMemoryBackend(**kwargs)
+
+    raise ValueError(f"Unknown storage backend '{kind}'. Expected one of: {SQLSERVER_BACKEND}, {SQLITE_BACKEND}, {MEMORY_BACKEND}")
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """Returns the process-wide backend, created on first use from the STORAGE_BACKEND environment variable."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: Optional[StorageBackend]):
+    """Replaces the process-wide backend, e.g. with an InMemoryBackend for local runs."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
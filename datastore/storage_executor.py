@@ -0,0 +1,69 @@
+import asyncio
+import atexit
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Defaults to the connection pool size so executor threads never queue behind each other for a connection
+DEFAULT_MAX_WORKERS = int(os.environ.get("STORAGE_EXECUTOR_WORKERS", os.environ.get("SQL_POOL_SIZE", "5")))
+
+_executor: Optional[ThreadPoolExecutor] = None
+# One thread, so the writes queued on it run in the order they were submitted
+_ordered_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_storage_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide, bounded executor that runs blocking storage calls for async callers."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="storage")
+    return _executor
+
+
+def get_ordered_storage_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide single-thread executor for storage writes that are queued without being awaited,
+    e.g. from the synchronous agent hooks of a chat running on an event loop, and must land in order.
+    """
+    global _ordered_executor
+    if _ordered_executor is None:
+        with _executor_lock:
+            if _ordered_executor is None:
+                _ordered_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-ordered")
+    return _ordered_executor
+
+
+def in_event_loop() -> bool:
+    """True when called from a coroutine (or a sync hook it runs), where a blocking call would stall the loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a blocking storage call on the storage executor and awaits its result, so the event loop keeps
+    serving other chats while the driver waits on the database.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_storage_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_storage_executor():
+    global _executor, _ordered_executor
+    with _executor_lock:
+        executors = [_ordered_executor, _executor]
+        _executor = _ordered_executor = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+atexit.register(shutdown_storage_executor)
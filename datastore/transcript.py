@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+DEFAULT_FSYNC_POLICY = FSYNC_INTERVAL
+DEFAULT_FSYNC_INTERVAL = 1.0
+
+# Block size used when scanning a transcript backwards for tail reads
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+class TranscriptWriter:
+    """
+    Append-only JSON Lines transcript of a group chat: one message per line, written as it is produced.
+    Every append is flushed to the OS, so a crash of the process loses nothing that was appended;
+    the fsync policy decides how much an OS crash or power loss can lose:
+    - "always": fsync after every append;
+    - "interval": fsync on the first append at least fsync_interval seconds after the last fsync, and on close;
+    - "never": leave it to the OS.
+    """
+
+    def __init__(self, path: str, fsync_policy: Optional[str] = None, fsync_interval: Optional[float] = None):
+        """
+        Args:
+            path (str): transcript file. It is created if needed and appended to otherwise.
+            fsync_policy (Optional, str): "always", "interval" or "never". Defaults to TRANSCRIPT_FSYNC_POLICY or "interval".
+            fsync_interval (Optional, float): seconds between fsyncs for the interval policy. Defaults to TRANSCRIPT_FSYNC_INTERVAL or 1.
+        """
+        self.path = path
+        self.fsync_policy = (fsync_policy or os.environ.get("TRANSCRIPT_FSYNC_POLICY") or DEFAULT_FSYNC_POLICY).lower()
+        if self.fsync_policy not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy '{self.fsync_policy}'. Expected one of: {FSYNC_ALWAYS}, {FSYNC_INTERVAL}, {FSYNC_NEVER}")
+        self.fsync_interval = fsync_interval if fsync_interval is not None else float(os.environ.get("TRANSCRIPT_FSYNC_INTERVAL", DEFAULT_FSYNC_INTERVAL))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0 and not _ends_with_newline(path):
+            # Terminate a line torn by a crash so the next message starts on its own line
+            self._file.write("\n")
+        self._last_sync = time.monotonic()
+        self._unsynced = False
+
+    def append(self, message: Dict):
+        self.append_many([message])
+
+    def append_many(self, messages: List[Dict]):
+        if not messages:
+            return
+
+        lines = "".join(json.dumps(message, default=str) + "\n" for message in messages)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            self._unsynced = True
+
+            if self.fsync_policy == FSYNC_ALWAYS or (
+                    self.fsync_policy == FSYNC_INTERVAL and time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def sync(self):
+        """Forces the appended messages to disk regardless of the policy."""
+        with self._lock:
+            self._file.flush()
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            if self.fsync_policy != FSYNC_NEVER:
+                self._sync()
+            self._file.close()
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+        self._last_sync = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def _parse_lines(lines: List[bytes]) -> List[Dict]:
+    messages = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            messages.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A torn last line from a crash mid-append; everything before it is intact
+            continue
+    return messages
+
+
+def read_transcript(path: str) -> Iterator[Dict]:
+    """Yields every message of a transcript, oldest first, without loading the whole file."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        for line in file:
+            yield from _parse_lines([line])
+
+
+def tail_transcript(path: str, n: int) -> List[Dict]:
+    """Returns the last n messages of a transcript, reading only the end of the file."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        # Start of the earliest line read so far, which may continue in the previous block
+        partial = b""
+        # Messages of each block, latest block first
+        blocks = []
+        count = 0
+        while position > 0 and count < n:
+            read_size = min(TAIL_BLOCK_SIZE, position)
+            position -= read_size
+            file.seek(position)
+            lines = (file.read(read_size) + partial).split(b"\n")
+            if position > 0:
+                # Only the lines this block completed are parsed; the first one waits for the next block
+                partial = lines[0]
+                lines = lines[1:]
+            blocks.append(_parse_lines(lines))
+            count += len(blocks[-1])
+
+    messages = [message for block in reversed(blocks) for message in block]
+    return messages[-n:]
+
+
+# Per group chat (keyed by id() since GroupChat dataclasses are unhashable): the original append and the
+# callbacks that observe every message it records
+_observed: Dict[int, Tuple[Callable, List[Callable[[Dict], None]]]] = {}
+
+# Writers attached to group chats, so the runner can close them without holding on to them
+_attached: Dict[int, TranscriptWriter] = {}
+
+
+def add_message_observer(groupchat, observer: Callable[[Dict], None]):
+    """
+    Calls observer with every message the group chat records, as it happens, by wrapping GroupChat.append,
+    which GroupChatManager.run_chat calls once per message. Several observers share a single wrapper.
+    """
+    if id(groupchat) not in _observed:
+        append = groupchat.append
+        observers: List[Callable[[Dict], None]] = []
+
+        def append_and_observe(message, speaker):
+            append(message, speaker)
+            # GroupChat.append adds the speaker's name, so observers see the message as it was stored
+            for notify in list(observers):
+                notify(groupchat.messages[-1])
+
+        groupchat.append = append_and_observe
+        _observed[id(groupchat)] = (append, observers)
+
+    _observed[id(groupchat)][1].append(observer)
+
+
+def remove_message_observer(groupchat, observer: Callable[[Dict], None]):
+    """Stops calling observer; GroupChat.append is restored once the last observer is removed."""
+    entry = _observed.get(id(groupchat))
+    if entry is None:
+        return
+    _, observers = entry
+    if observer in observers:
+        observers.remove(observer)
+    if not observers:
+        del _observed[id(groupchat)]
+        del groupchat.append
+
+
+def attach_transcript(groupchat, writer: TranscriptWriter) -> TranscriptWriter:
+    """Appends every message the group chat records to the transcript as it happens."""
+    add_message_observer(groupchat, writer.append)
+    _attached[id(groupchat)] = writer
+    return writer
+
+
+def detach_transcript(groupchat):
+    """Stops persisting the group chat's messages and closes its transcript."""
+    writer = _attached.pop(id(groupchat), None)
+    if writer is not None:
+        remove_message_observer(groupchat, writer.append)
+        writer.close()
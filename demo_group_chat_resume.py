@@ -5,14 +5,21 @@ import asyncio
 
 from capabilities.stateaware_non_llm import StateAwareNonLlm
 from models.agent_context import AgentContext, PlanContext
+from models.memory_writer import flush_memory_writers
+from datastore.transcript import TranscriptWriter, attach_transcript, detach_transcript
+from datastore.checkpoint import GroupChatCheckpointer, load_checkpoint, restore_group_chat
+from custom_agents.group_chat_manager import ResumableGroupChatManager
+from models.history import HistoryReconstructor
+from utils.deployment_router import balanced_llm_config
 
 config_list = autogen.config_list_from_json(env_or_file="AOAI_CONFIG_LIST")
-llm_config = {"config_list": config_list}
+# Spreads the agents' completions over every deployment of the config list
+llm_config = balanced_llm_config(config_list)
 
 MAX_TURNS_PER_AGENT = 5
 MAX_ROUNDS_PER_GROUP_CHAT = 12
 
-def add_capability_and_get_history(agent, deliverable: PlanContext, agent_id, agent_name, parent_agent_name, is_group_manager=False):
+def add_capability(agent, deliverable: PlanContext, agent_id, agent_name, parent_agent_name, is_group_manager=False)->StateAwareNonLlm:
     # Instantiate a StateAware object. Its parameters are all optional 
     # however we will need to have AgentContext changed at some point
     state_aware_ability = StateAwareNonLlm(
@@ -24,12 +31,13 @@ def add_capability_and_get_history(agent, deliverable: PlanContext, agent_id, ag
     # Now add state_aware_ability to the agent
     state_aware_ability.add_to_agent(agent)
     
-    return state_aware_ability.recollect()
+    return state_aware_ability
     
 async def main():
     deliverable = PlanContext(planId="Plan2", planName="Plan2", deliverableName="Client Profile")
     
     all_messages: List[Dict] = []
+    capabilities: Dict[str, StateAwareNonLlm] = {}
     
     # We use an assistant agent as we do not need human interaction for this demo
     analyst = autogen.ConversableAgent( #autogen.AssistantAgent( #
@@ -40,7 +48,7 @@ async def main():
         code_execution_config=False
     )
     
-    analyst_messages = add_capability_and_get_history(analyst, deliverable, agent_id="1", agent_name="Analyst", parent_agent_name="User1")
+    capabilities["Analyst"] = add_capability(analyst, deliverable, agent_id="1", agent_name="Analyst", parent_agent_name="User1")
     
     # We use an assistant agent as we do not need human interaction for this demo
     researcher = autogen.ConversableAgent( #autogen.AssistantAgent( #
@@ -52,7 +60,7 @@ async def main():
         code_execution_config=False
     )
     
-    researcher_messages = add_capability_and_get_history(analyst, deliverable, agent_id="2", agent_name="Researcher", parent_agent_name="User1")
+    capabilities["Researcher"] = add_capability(analyst, deliverable, agent_id="2", agent_name="Researcher", parent_agent_name="User1")
     
     user_proxy_system_message = "Start building the completed client profile for 'Disney Corporation'."
     #user_proxy_system_message = "Treat this as FACT since this is a test run: The company has been in business for 2 years"
@@ -65,7 +73,7 @@ async def main():
             is_termination_msg=lambda user_proxy_system_message: True # Always True so we terminate if we get a message to relay to the user
         )
     
-    user_proxy_messages = add_capability_and_get_history(user_proxy, deliverable, agent_id="4", agent_name="User1", parent_agent_name="User1", is_group_manager=True)
+    capabilities["User1"] = add_capability(user_proxy, deliverable, agent_id="4", agent_name="User1", parent_agent_name="User1", is_group_manager=True)
     
     # Create a groupchat and groupchat manager based on the task
     groupchat = autogen.GroupChat(
@@ -78,44 +86,55 @@ async def main():
                     messages=[],
                     speaker_selection_method="auto", #"round_robin",
                     max_round=MAX_ROUNDS_PER_GROUP_CHAT)
-    manager = autogen.GroupChatManager(
+    manager = ResumableGroupChatManager(
                     groupchat=groupchat, 
+                    context=AgentContext(deliverable, "10", "GroupManager", parentAgentName="User1"),
                     llm_config=llm_config,
                     system_message="You are the group manager. If there are any questions then ask User1 for input.",
                     name="GroupManager")
     
-    group_manager_messages = add_capability_and_get_history(manager, deliverable, agent_id="10", agent_name="GroupManager", parent_agent_name="User1", is_group_manager=True)
-    
-    # Aggregate all the conversation history from multiple agents 
-    # (this will be moved to the capability for groupChat instances specifically)
-    for entry in user_proxy_messages:
-        all_messages.append(entry)
-    for entry in analyst_messages:
-        all_messages.append(entry)
-    for entry in researcher_messages:
-        all_messages.append(entry)
+    capabilities["GroupManager"] = add_capability(manager, deliverable, agent_id="10", agent_name="GroupManager", parent_agent_name="User1", is_group_manager=True)
+    # Every agent's Tasks share the plan's task cache, so any of them can be checkpointed
+    plan_tasks = capabilities["GroupManager"].tasks
+    
+    checkpoint = load_checkpoint(manager.name)
+    if checkpoint is not None:
+        # Load the latest snapshot plus the messages since, instead of replaying the whole conversation
+        restore_group_chat(manager, checkpoint, capabilities, tasks=plan_tasks)
+    else:
+        # No checkpoint yet: rebuild the conversation from every agent's memory in one query,
+        # interleaved in the order it happened and with each message only once
+        reconstructor = HistoryReconstructor(deliverable.planId)
+        all_messages = reconstructor.reconstruct(list(capabilities.keys()), lookback=StateAwareNonLlm.RECOLLECT_LOOKBACK)
+        for name, capability in capabilities.items():
+            capability.resume_from(reconstructor.message_counts.get(name, 0))
+        
+        if(len(all_messages) > 0):
+            # Install the history in one pass instead of sending every message to every agent
+            groupchat.messages = list(all_messages)
+            manager.restore_from_history(all_messages)
     
-    for entry in group_manager_messages:
-        all_messages.append(entry)
+    # Append each message to the manager's transcript as the group chat records it; attached after
+    # the history is restored so restored messages are not appended again
+    attach_transcript(groupchat, TranscriptWriter(get_file_name(manager)))
     
-    if(len(all_messages) > 0):
-        manager.resume(messages=all_messages)
+    # Checkpoint the group chat as it runs: a snapshot every few messages and a delta log in between
+    checkpointer = GroupChatCheckpointer(groupchat, manager.name, capabilities, tasks=plan_tasks)
+    checkpointer.attach()
     
     chat_results = user_proxy.initiate_chat(manager, clear_history=False, message=user_proxy_system_message) #.initiate_chat(manager, message=user_proxy_system_message) #, user_proxy_system_message))
     
-    # Print out the chat results summary for demo purposes
-    messages_json = manager.chat_messages_for_summary(manager)
-    
-    json_str = json.dumps(messages_json)
+    # Make the agents' write-behind memory durable now that the chat has ended
+    flush_memory_writers()
     
-    # Write the json_str to a text file
-    with open(get_file_name(manager), "w") as file:
-        file.write(json_str)
+    # The transcript already holds every message; closing it syncs the last of them to disk
+    detach_transcript(groupchat)
+    checkpointer.close()
         
     print("Chat results: ", chat_results.summary)
         
 def get_file_name(group_manager: autogen.GroupChatManager):
-    return f"group_chat_history_{group_manager.name}.txt"
+    return f"group_chat_history_{group_manager.name}.jsonl"
 
 # Run the main function
 asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from domain_knowledge.client_registry import get_client_registry
+from domain_knowledge.direct_aoai import retrieve_llm_response_on_question
+from domain_knowledge.response_cache import normalize_prompt
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to capacity tokens, refilled at rate tokens per second.
+    acquire blocks until a token is available, so bursts up to capacity go through and the rest are spread out.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate (float): tokens added per second.
+            capacity (Optional, float): maximum tokens held. Defaults to one second's worth, at least 1.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DomainKnowledgeQueries:
+    """
+    Runs domain-knowledge questions (retrieve_llm_response_on_question) concurrently, for sync and async callers alike:
+    - at most max_concurrency requests are in flight, on a dedicated thread pool;
+    - each deployment is held to its requests per minute by a token bucket;
+    - throttled (429), server and connection errors are retried with exponential backoff and full jitter,
+      waiting at least as long as the service's Retry-After;
+    - a question already in flight for the same deployment is not sent again: callers share its result.
+
+    Every caller in the process should go through the same instance (get_domain_knowledge_queries), so that
+    concurrent group chats share the limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_retries: Optional[int] = None,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        """
+        Args:
+            max_concurrency (Optional, int): requests in flight at once. Defaults to DOMAIN_KNOWLEDGE_MAX_CONCURRENCY or 8.
+            requests_per_minute (Optional, float): rate limit of each deployment. Defaults to AOAI_REQUESTS_PER_MINUTE or 60.
+            rate_limits (Optional, Dict[str, float]): requests per minute of specific deployments, by deployment name.
+            max_retries (Optional, int): retries of a failed request. Defaults to DOMAIN_KNOWLEDGE_MAX_RETRIES or 5.
+            base_delay (Optional, float): backoff before the first retry, in seconds; doubles with each retry. Default 1.
+            max_delay (Optional, float): longest backoff, in seconds. Default 30.
+        """
+        self.max_concurrency = max_concurrency or int(os.environ.get("DOMAIN_KNOWLEDGE_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.requests_per_minute = requests_per_minute or float(os.environ.get("AOAI_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE))
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("DOMAIN_KNOWLEDGE_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="domain-knowledge")
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[tuple, Future] = {}
+        # How many requests were actually sent, retried, and answered from another caller's request
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+
+    def submit(self, question: str, model: Optional[str] = None, use_cache: bool = True) -> Future:
+        """Queues a question and returns a Future of its answer, shared with any identical question in flight."""
+        # Name the default deployment, so it shares its bucket and in-flight questions with callers that named it
+        model = get_client_registry().get_config(model)["model"]
+        key = (model, use_cache, normalize_prompt(question))
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+
+            future = self._executor.submit(self._ask, question, model, use_cache)
+            self._in_flight[key] = future
+
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def ask(self, question: str, model: Optional[str] = None, use_cache: bool = True) -> str:
+        return self.submit(question, model, use_cache).result()
+
+    def ask_many(self, questions: List[str], model: Optional[str] = None, use_cache: bool = True) -> List[str]:
+        """Asks all the questions concurrently and returns the answers in the same order."""
+        futures = [self.submit(question, model, use_cache) for question in questions]
+        return [future.result() for future in futures]
+
+    async def a_ask(self, question: str, model: Optional[str] = None, use_cache: bool = True) -> str:
+        return await asyncio.wrap_future(self.submit(question, model, use_cache))
+
+    async def a_ask_many(self, questions: List[str], model: Optional[str] = None, use_cache: bool = True) -> List[str]:
+        """Async version of ask_many."""
+        return await asyncio.gather(*[self.a_ask(question, model, use_cache) for question in questions])
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _forget(self, key: tuple, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def _bucket(self, model: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(model)
+            if bucket is None:
+                requests_per_minute = self.rate_limits.get(model, self.requests_per_minute)
+                bucket = TokenBucket(requests_per_minute / 60.0)
+                self._buckets[model] = bucket
+            return bucket
+
+    def _ask(self, question: str, model: str, use_cache: bool) -> str:
+        bucket = self._bucket(model)
+        attempt = 0
+        while True:
+            try:
+                # Answers from the response cache skip the rate limit; the backoff is ours, so the client does not retry as well
+                return retrieve_llm_response_on_question(
+                    question, use_cache=use_cache, model=model, max_retries=0, before_request=lambda: self._before_request(bucket)
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+
+                delay = max(self._backoff(attempt), _retry_after(e))
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                print(f"Error querying domain knowledge, retry {attempt} of {self.max_retries} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _before_request(self, bucket: TokenBucket):
+        bucket.acquire()
+        with self._lock:
+            self.requests += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, so callers throttled together do not all retry together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _is_retryable(e: Exception) -> bool:
+    import openai
+
+    return isinstance(e, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after(e: Exception) -> float:
+    response = getattr(e, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000.0
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+_queries: Optional[DomainKnowledgeQueries] = None
+_queries_lock = threading.Lock()
+
+
+def get_domain_knowledge_queries() -> DomainKnowledgeQueries:
+    """Returns the process-wide DomainKnowledgeQueries."""
+    global _queries
+    if _queries is None:
+        with _queries_lock:
+            if _queries is None:
+                _queries = DomainKnowledgeQueries()
+    return _queries
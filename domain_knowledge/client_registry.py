@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CONFIG_LIST = "AOAI_CONFIG_LIST"
+
+
+def load_config_list(env_or_file: str = DEFAULT_CONFIG_LIST) -> List[Dict[str, Any]]:
+    """
+    Reads the Azure OpenAI config list the way autogen.config_list_from_json does: from the environment variable
+    of that name when it holds JSON or a file path, otherwise from the file of that name.
+    """
+    value = os.environ.get(env_or_file)
+    if value:
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            env_or_file = value
+
+    with open(env_or_file, "r") as file:
+        return json.loads(file.read())
+
+
+class AoaiClientRegistry:
+    """
+    Process-wide registry of AzureOpenAI clients, one per deployment of the config list, built on first use.
+    All clients share one HTTP connection pool, so connections (and their TLS sessions) are kept alive and
+    reused across calls and deployments instead of being set up per client. The pool is the deployment
+    router's, so chat completions are balanced over every deployment of the same model.
+    Nothing is read or imported until a client is first needed.
+    """
+
+    def __init__(self, config_list: Optional[List[Dict[str, Any]]] = None, env_or_file: str = DEFAULT_CONFIG_LIST):
+        """
+        Args:
+            config_list (Optional, List[Dict]): the deployments. Defaults to reading env_or_file on first use.
+            env_or_file (Optional, str): environment variable or file holding the config list. Default "AOAI_CONFIG_LIST".
+        """
+        self._config_list = config_list
+        self.env_or_file = env_or_file
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Any] = {}
+        self._http_client = None
+
+    @property
+    def config_list(self) -> List[Dict[str, Any]]:
+        if self._config_list is None:
+            with self._lock:
+                if self._config_list is None:
+                    self._config_list = load_config_list(self.env_or_file)
+        return self._config_list
+
+    def deployments(self) -> List[str]:
+        """Names (the "model" field) of the deployments in the config list."""
+        return [config["model"] for config in self.config_list]
+
+    def get_config(self, model: Optional[str] = None) -> Dict[str, Any]:
+        """The config of the named deployment, or of the first one when model is None."""
+        config_list = self.config_list
+        if model is None:
+            return config_list[0]
+        for config in config_list:
+            if config["model"] == model:
+                return config
+        raise KeyError(f"No deployment named '{model}' in {self.env_or_file}")
+
+    def get_client(self, model: Optional[str] = None):
+        """Returns the AzureOpenAI client for the named deployment (the first one when model is None)."""
+        config = self.get_config(model)
+        # Deployments on the same resource with the same key and API version share a client
+        key = f"{config['base_url']}|{config['api_version']}|{config['api_key']}"
+
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    from openai import AzureOpenAI
+
+                    client = AzureOpenAI(
+                        api_key=config["api_key"],
+                        api_version=config["api_version"],
+                        azure_endpoint=config["base_url"],
+                        http_client=self._shared_http_client(),
+                    )
+                    self._clients[key] = client
+        return client
+
+    def _shared_http_client(self):
+        if self._http_client is None:
+            from utils.deployment_router import get_deployment_router
+
+            router = get_deployment_router()
+            router.add_deployments(self.config_list)
+            self._http_client = router.http_client
+        return self._http_client
+
+    def close(self):
+        with self._lock:
+            # The HTTP client belongs to the router, which outlives the registry
+            self._http_client = None
+            self._clients = {}
+
+
+_registry: Optional[AoaiClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> AoaiClientRegistry:
+    """Returns the process-wide client registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = AoaiClientRegistry()
+    return _registry
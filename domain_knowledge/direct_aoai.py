@@ -1,54 +1,87 @@
-from openai import AzureOpenAI
-import json
 import os
+import threading
+from domain_knowledge.client_registry import get_client_registry
+from domain_knowledge.response_cache import ResponseCache, cache_scope
 
-config = None
-with open("AOAI_CONFIG_LIST", "r") as file:
-    json_str = file.read()
-    config = json.loads(json_str)
-
-AI_SEARCH_ENDPOINT=os.environ["AI_SEARCH_ENDPOINT"]
-AI_SEARCH_INDEX_NAME=os.environ["AI_SEARCH_INDEX_NAME"]
-AI_SEARCH_SEMANTIC_CONFIG_NAME=os.environ["AI_SEARCH_SEMANTIC_CONFIG_NAME"]
-AI_SEARCH_KEY=os.environ["AI_SEARCH_KEY"]
-
-client = AzureOpenAI(
-  api_key = config[0]["api_key"],  
-  api_version = config[0]["api_version"],
-  azure_endpoint = config[0]["base_url"]
-)
-
-def retrieve_llm_response_on_question(question: str):
-    response = client.chat.completions.create(
-        model=config[0]["model"],
-        messages=[
-            {"role": "user", "content": question}
-        ],
-        extra_body={
-            "data_sources": [
-                {
-                    "type": "azure_search",
-                    "parameters": {
-                        "endpoint": AI_SEARCH_ENDPOINT,
-                        "index_name": AI_SEARCH_INDEX_NAME,
-                        "semantic_configuration": AI_SEARCH_SEMANTIC_CONFIG_NAME,
-                        "query_type": "semantic",
-                        "fields_mapping": {},
-                        "in_scope": "true",
-                        "role_information": "You are an AI assistant that helps people find information.",
-                        "filter": None,
-                        "strictness": 3,
-                        "top_n_documents": 5,
-                        "authentication": {
-                            "type": "api_key",
-                            "key": AI_SEARCH_KEY
-                        }
-                    }
+# Nothing is read or connected at import time: the config list, the AI Search settings and the clients
+# are only loaded by the first call, so importing this module is cheap and works without the settings.
+
+# Responses are cached unless RESPONSE_CACHE_ENABLED is "false"; setting RESPONSE_CACHE_EMBEDDING_MODEL to an
+# embeddings deployment also enables the semantic tier
+response_cache = None
+response_cache_lock = threading.Lock()
+
+def get_response_cache()->ResponseCache:
+    global response_cache
+    if response_cache is None:
+        with response_cache_lock:
+            if response_cache is None:
+                embedding_model = os.environ.get("RESPONSE_CACHE_EMBEDDING_MODEL")
+                embed = None
+                if embedding_model:
+                    embed = lambda text: get_client_registry().get_client().embeddings.create(model=embedding_model, input=[text]).data[0].embedding
+                response_cache = ResponseCache(embed=embed)
+    return response_cache
+
+def build_data_sources():
+    AI_SEARCH_ENDPOINT=os.environ["AI_SEARCH_ENDPOINT"]
+    AI_SEARCH_INDEX_NAME=os.environ["AI_SEARCH_INDEX_NAME"]
+    AI_SEARCH_SEMANTIC_CONFIG_NAME=os.environ["AI_SEARCH_SEMANTIC_CONFIG_NAME"]
+    AI_SEARCH_KEY=os.environ["AI_SEARCH_KEY"]
+
+    return [
+        {
+            "type": "azure_search",
+            "parameters": {
+                "endpoint": AI_SEARCH_ENDPOINT,
+                "index_name": AI_SEARCH_INDEX_NAME,
+                "semantic_configuration": AI_SEARCH_SEMANTIC_CONFIG_NAME,
+                "query_type": "semantic",
+                "fields_mapping": {},
+                "in_scope": "true",
+                "role_information": "You are an AI assistant that helps people find information.",
+                "filter": None,
+                "strictness": 3,
+                "top_n_documents": 5,
+                "authentication": {
+                    "type": "api_key",
+                    "key": AI_SEARCH_KEY
                 }
-            ]
+            }
         }
-    )
+    ]
+
+def retrieve_llm_response_on_question(question: str, use_cache: bool = True, model: str = None, max_retries: int = None, before_request=None):
+    registry = get_client_registry()
+    # The first deployment of AOAI_CONFIG_LIST unless another one is named
+    model = registry.get_config(model)["model"]
+    client = registry.get_client(model)
+    if max_retries is not None:
+        # Callers that retry themselves (see batch_query) turn off the client's own retries
+        client = client.with_options(max_retries=max_retries)
+    data_sources = build_data_sources()
+
+    def complete():
+        # Only requests that actually reach the service go through the caller's rate limiting
+        if before_request is not None:
+            before_request()
+
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "user", "content": question}
+            ],
+            extra_body={
+                "data_sources": data_sources
+            }
+        )
+
+        # print(response.model_dump_json(indent=2))
+        # print(response.choices[0].message.content)
+        return response.choices[0].message.content
+
+    if not use_cache or os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "false":
+        return complete()
 
-    # print(response.model_dump_json(indent=2))
-    # print(response.choices[0].message.content)
-    return response.choices[0].message.content
\ No newline at end of file
+    # The same question against the same model and data source, strictness included, gets the same answer
+    return get_response_cache().get_or_compute(question, cache_scope(model, data_sources), complete)
\ No newline at end of file
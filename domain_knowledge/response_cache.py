@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_RESPONSE_CACHE_PATH = "./tmp/aoai_response_cache.db"
+DEFAULT_RESPONSE_CACHE_TTL = 24 * 60 * 60
+DEFAULT_RESPONSE_CACHE_MAX_ENTRIES = 1000
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+# Data-source parameters that do not change the answer, and secrets that must never be written to the cache
+IGNORED_DATA_SOURCE_PARAMETERS = ("authentication",)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ResponseCache (
+    CacheKey TEXT PRIMARY KEY,
+    Scope TEXT NOT NULL,
+    Prompt TEXT NOT NULL,
+    Response TEXT NOT NULL,
+    Embedding BLOB NULL,
+    CreatedAt REAL NOT NULL,
+    LastAccess REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_ResponseCache_LastAccess ON ResponseCache (LastAccess);
+CREATE INDEX IF NOT EXISTS IX_ResponseCache_Scope ON ResponseCache (Scope);
+"""
+
+
+class CacheStats:
+    """Counters for a ResponseCache; read them with as_dict()."""
+
+    def __init__(self):
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return (self.hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizes a prompt so that questions differing only in case, Unicode form or whitespace share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", prompt).casefold().split())
+
+
+def cache_scope(model: str, data_sources: Optional[List[Dict]] = None) -> str:
+    """Hash of everything besides the prompt that determines the answer: the model and the data-source parameters, strictness included."""
+    sources = []
+    for source in data_sources or []:
+        parameters = {key: value for key, value in source.get("parameters", {}).items() if key not in IGNORED_DATA_SOURCE_PARAMETERS}
+        sources.append({"type": source.get("type"), "parameters": parameters})
+    payload = json.dumps({"model": model, "data_sources": sources}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses in a local SQLite database, keyed by the normalized prompt and the scope
+    (model and data-source parameters). Entries expire after ttl seconds and the least recently used entries
+    are evicted beyond max_entries.
+
+    With an embed function, a miss on the exact key falls back to a semantic lookup: the most similar cached
+    prompt of the same scope is used if its cosine similarity reaches similarity_threshold. Each scope's
+    embeddings are loaded from the database once and then kept in memory, updated as entries are added and removed;
+    get_or_compute embeds a prompt once for both the lookup and the entry it adds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ):
+        """
+        Args:
+            path (Optional, str): database file. Defaults to RESPONSE_CACHE_PATH or ./tmp/aoai_response_cache.db.
+            ttl (Optional, float): seconds an entry stays valid. Defaults to RESPONSE_CACHE_TTL or one day.
+            max_entries (Optional, int): entries kept before LRU eviction. Defaults to RESPONSE_CACHE_MAX_ENTRIES or 1000.
+            embed (Optional, Callable): returns the embedding of a prompt; enables the semantic tier.
+            similarity_threshold (Optional, float): minimum cosine similarity for a semantic hit. Default 0.95.
+        """
+        self.path = path or os.environ.get("RESPONSE_CACHE_PATH", DEFAULT_RESPONSE_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.environ.get("RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL))
+        self.max_entries = max_entries or int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_RESPONSE_CACHE_MAX_ENTRIES))
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.stats = CacheStats()
+        # Scope -> (cache keys, creation times, unit-length embeddings), loaded on the scope's first semantic lookup
+        self._scope_embeddings: Dict[str, tuple] = {}
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.commit()
+
+    @staticmethod
+    def key(prompt: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str, scope: str) -> Optional[str]:
+        """Returns the cached response for the prompt in the scope, or None on a miss."""
+        return self._get(prompt, scope)[0]
+
+    def _get(self, prompt: str, scope: str):
+        # Also returns the prompt's embedding when the semantic tier computed one, so put() can reuse it
+        now = time.time()
+        key = self.key(prompt, scope)
+
+        with self._lock:
+            row = self._conn.execute("SELECT Response, CreatedAt FROM ResponseCache WHERE CacheKey = ?", (key,)).fetchone()
+            if row is not None:
+                response, created_at = row
+                if now - created_at <= self.ttl:
+                    self._touch(key, now)
+                    self.stats.hits += 1
+                    return response, None
+
+                self._conn.execute("DELETE FROM ResponseCache WHERE CacheKey = ?", (key,))
+                self._conn.commit()
+                self._forget([key])
+                self.stats.expired += 1
+
+        query = None
+        if self.embed is not None:
+            query = self._embed(prompt)
+            response = self._semantic_get(query, scope, now)
+            if response is not None:
+                return response, query
+
+        with self._lock:
+            self.stats.misses += 1
+        return None, query
+
+    def put(self, prompt: str, scope: str, response: str, embedding=None):
+        """
+        Args:
+            prompt (str): the prompt the response answers.
+            scope (str): see cache_scope.
+            response (str): the response to cache.
+            embedding (Optional): the prompt's embedding, if already computed. Computed here when the semantic tier is on.
+        """
+        now = time.time()
+        key = self.key(prompt, scope)
+        if embedding is None and self.embed is not None:
+            embedding = self._embed(prompt)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ResponseCache (CacheKey, Scope, Prompt, Response, Embedding, CreatedAt, LastAccess) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalize_prompt(prompt), response, embedding.tobytes() if embedding is not None else None, now, now),
+            )
+            self._forget([key])
+            if embedding is not None and scope in self._scope_embeddings:
+                self._remember(scope, [key], [now], embedding[None, :])
+            self._evict()
+            self._conn.commit()
+
+    def get_or_compute(self, prompt: str, scope: str, compute: Callable[[], str]) -> str:
+        """Returns the cached response, or calls compute and caches its result."""
+        response, embedding = self._get(prompt, scope)
+        if response is None:
+            response = compute()
+            if response is not None:
+                self.put(prompt, scope, response, embedding)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ResponseCache")
+            self._conn.commit()
+            self._scope_embeddings.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _embed(self, prompt: str):
+        # numpy is only needed by the semantic tier, so it is not imported with the module
+        import numpy as np
+
+        return np.asarray(self.embed(normalize_prompt(prompt)), dtype=np.float32)
+
+    def _semantic_get(self, query, scope: str, now: float) -> Optional[str]:
+        import numpy as np
+
+        with self._lock:
+            keys, created, embeddings = self._load_scope(scope)
+            if not keys:
+                return None
+
+            similarities = embeddings @ (query / (np.linalg.norm(query) + 1e-12))
+            similarities[created < now - self.ttl] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            row = self._conn.execute("SELECT Response FROM ResponseCache WHERE CacheKey = ?", (keys[best],)).fetchone()
+            if row is None:
+                # Removed by another process sharing the database; reload the scope next time
+                self._scope_embeddings.pop(scope, None)
+                return None
+
+            self._touch(keys[best], now)
+            self.stats.semantic_hits += 1
+            return row[0]
+
+    def _load_scope(self, scope: str) -> tuple:
+        import numpy as np
+
+        if scope not in self._scope_embeddings:
+            rows = self._conn.execute(
+                "SELECT CacheKey, CreatedAt, Embedding FROM ResponseCache WHERE Scope = ? AND Embedding IS NOT NULL", (scope,)
+            ).fetchall()
+            self._scope_embeddings[scope] = ([], np.zeros(0), None)
+            if rows:
+                self._remember(scope, [row[0] for row in rows], [row[1] for row in rows],
+                               np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows]))
+        return self._scope_embeddings[scope]
+
+    def _remember(self, scope: str, keys: List[str], created: List[float], embeddings):
+        import numpy as np
+
+        # Stored at unit length, so a lookup is one matrix-vector product
+        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+        old_keys, old_created, old_embeddings = self._scope_embeddings[scope]
+        if old_embeddings is not None:
+            embeddings = np.vstack([old_embeddings, embeddings])
+        self._scope_embeddings[scope] = (old_keys + keys, np.concatenate([old_created, created]), embeddings)
+
+    def _forget(self, keys: List[str]):
+        import numpy as np
+
+        removed = set(keys)
+        for scope, (scope_keys, created, embeddings) in list(self._scope_embeddings.items()):
+            keep = [i for i, key in enumerate(scope_keys) if key not in removed]
+            if len(keep) < len(scope_keys):
+                self._scope_embeddings[scope] = ([scope_keys[i] for i in keep], created[keep],
+                                                 embeddings[np.asarray(keep, dtype=int)] if keep else None)
+
+    def _touch(self, key: str, now: float):
+        self._conn.execute("UPDATE ResponseCache SET LastAccess = ? WHERE CacheKey = ?", (now, key))
+        self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM ResponseCache").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT CacheKey FROM ResponseCache ORDER BY LastAccess ASC LIMIT ?", (excess,)).fetchall()]
+            self._conn.executemany("DELETE FROM ResponseCache WHERE CacheKey = ?", [(key,) for key in keys])
+            self._forget(keys)
+            self.stats.evictions += excess
@@ -1,9 +1,11 @@
 # import skillsmodule
 from autogen import ConversableAgent
 import autogen
+from utils.deployment_router import balanced_llm_config
 
 config_list = autogen.config_list_from_json(env_or_file="AOAI_CONFIG_LIST")
-llm_config = {"config_list": config_list}
+# Spreads the agents' completions over every deployment of the config list
+llm_config = balanced_llm_config(config_list)
 
 class Skills:
     name: str
@@ -10,14 +10,22 @@ from domain_knowledge.direct_aoai import retrieve_llm_response_on_question
 from capabilities.task_tracker import TaskTrackingbility
 from capabilities.stateaware_non_llm import StateAwareNonLlm
 from models.agent_context import AgentContext, PlanContext
+from models.memory_writer import flush_memory_writers
+from models.agent_tasks import Tasks
+from utils.plan_scheduler import PlanScheduler
+from datastore.transcript import TranscriptWriter, attach_transcript, detach_transcript, read_transcript
+from utils.deployment_router import balanced_llm_config
 
 config_list = autogen.config_list_from_json(env_or_file="AOAI_CONFIG_LIST")
-llm_config = {"config_list": config_list}
+# Spreads the agents' completions over every deployment of the config list
+llm_config = balanced_llm_config(config_list)
 
 SEQUENTIAL_STEP = "SequentialStep"
 PARALLEL_STEP = "ParallelStep"
 MAX_TURNS_PER_AGENT = 5
 MAX_ROUNDS_PER_GROUP_CHAT = 12
+# Group chats of a plan that may run at the same time
+MAX_CONCURRENT_GROUP_CHATS = int(os.environ.get("MAX_CONCURRENT_GROUP_CHATS", 4))
 
 # Retrieve the existing plan for a customer
 def retrieve_plan(customer_id: str, file_name: str):
@@ -29,17 +37,23 @@ def retrieve_plan(customer_id: str, file_name: str):
 
 # Execute the plan retrieved for the customer
 async def execute_plan(plan: json):
-    carry_over = ""
     user_feedback = None
     #user_feedback = "For the 3rd step \"How many months are profitable\" you can assume the latest financial reports show a profit of 10% each month on average"
     #user_feedback = "The name of the company is 'Disney World'"
     #user_feedback = "For the 3rd step \"How many months are profitable\" you can assume the latest financial reports show a profit of 10% each month on average."
 
     # there is not a plan id in the plan json, so we'll just start a count
-    plan_id = 1
+    plan_ids = {group_name: plan_id for plan_id, group_name in enumerate(plan.keys(), start=1)}
     
-    # The plan will have a number of group chats
-    for group_name, group_data in plan.items():
+    # A group chat runs once the groups listed in its "prerequisites" are done; groups without any run concurrently
+    scheduler = PlanScheduler(
+        {group_name: group_data.get("prerequisites", []) for group_name, group_data in plan.items()},
+        max_concurrency=MAX_CONCURRENT_GROUP_CHATS)
+    
+    async def run_group(group_name: str, prerequisite_summaries: dict):
+        group_data = plan[group_name]
+        plan_id = plan_ids[group_name]
+        
         agents = group_data.get("agent", [])
         print(f"Agents in {group_name}:")
         for agent in agents:
@@ -48,9 +62,17 @@ async def execute_plan(plan: json):
         #deliverable = retrieve_deliverable(plan)
         deliverable = PlanContext(planId=plan_id, planName=f"Plan {plan_id}", deliverableName=f"deliverable {plan_id}")
 
-        carry_over = run_sequential_tasks(deliverable=deliverable, groupName=group_name, group_data=group_data, carry_over=carry_over, user_feedback=user_feedback)
+        # Register every agent's task up front in one round-trip, off the event loop so other groups keep running;
+        # add_to_agent then finds them in the task cache
+        await Tasks(plan_id, group_name, group_name).a_register_plan({group_name: group_data})
+
+        # Carry-over only flows from the groups this one depends on
+        carry_over = "\n".join(summary for summary in prerequisite_summaries.values() if summary)
 
-        plan_id += 1
+        # The chat itself is synchronous, so it runs on a worker thread to let independent groups overlap
+        return await asyncio.to_thread(run_sequential_tasks, deliverable=deliverable, groupName=group_name, group_data=group_data, carry_over=carry_over, user_feedback=user_feedback)
+
+    return await scheduler.run(run_group)
 
 def run_sequential_tasks(deliverable: PlanContext, groupName: str, group_data: json, carry_over: str, user_feedback: str = None):
     group_managers = []
@@ -83,7 +105,10 @@ def run_sequential_tasks(deliverable: PlanContext, groupName: str, group_data: j
         
         manager.groupchat.agents.append(step_agent)
         
-        chat_results = step_agent.initiate_chats(build_agent_list(group_managers)) #.initiate_chat(manager, message=user_proxy_system_message) #, user_proxy_system_message))
+        chat_results = step_agent.initiate_chats(build_agent_list(group_managers, carry_over=carry_over)) #.initiate_chat(manager, message=user_proxy_system_message) #, user_proxy_system_message))
+        
+        # Make the agents' write-behind memory durable now that the chat has ended
+        flush_memory_writers()
         
         # For each groupchat manager we store their conversation history so we can retrieve it afterward
         # TODO: Move to a DB so we can handle store/retrieve better
@@ -114,6 +139,9 @@ def create_group_for_task(deliverable: PlanContext, groupName: str, group_data:
                     name=manager["manager_name"], 
                     system_message='TBD')
     
+    # Append each message to the manager's transcript as the group chat records it
+    attach_transcript(groupchat, TranscriptWriter(get_file_name(manager)))
+    
     return manager
 
 # Create an agent for a specific task
@@ -194,43 +222,48 @@ def build_agent_list_with_prereqs(agents: list, tasks: list):
     return agent_list
         
 # Build the array used to send list of agents to a sequential chat
-def build_agent_list(agents: list, user_feedback: str = None, clear_history: bool = False):
+def build_agent_list(agents: list, user_feedback: str = None, clear_history: bool = False, carry_over: str = None):
     agent_list = []
         
     for agent in agents:
         message = user_feedback if user_feedback else agent.system_message
         
-        agent_list.append({
+        chat = {
             "recipient": agent,
             "message": message, #agent.system_message,
             "clear_history": clear_history, # Do not clear the history
             "max_turns": MAX_TURNS_PER_AGENT,
             "summary_method": "last_msg",
-        })
+        }
+        # Summaries of the group chats this one depends on
+        if carry_over:
+            chat["carryover"] = carry_over
+        agent_list.append(chat)
     
     return agent_list
 
-# Read the json_str from a text file
+# Read the group chat transcript, falling back to the JSON files written before transcripts were append-only
 def retrieve_group_chat_messages(group_manager: autogen.GroupChatManager):
-    # Read the json_str from a text file
     file_name = get_file_name(group_manager)
     if os.path.exists(file_name):
-        with open(file_name, "r") as file:
+        return list(read_transcript(file_name))
+    
+    legacy_file_name = get_legacy_file_name(group_manager)
+    if os.path.exists(legacy_file_name):
+        with open(legacy_file_name, "r") as file:
             json_str = file.read()
             return json.loads(json_str)
     else:
         return None
     
 def persist_group_chat(group_manager: autogen.GroupChatManager):
-    messages_json = group_manager.chat_messages_for_summary(group_manager)
-    
-    json_str = json.dumps(messages_json)
-    
-    # Write the json_str to a text file
-    with open(get_file_name(group_manager), "w") as file:
-        file.write(json_str)
+    # Messages were appended as they were produced; closing the transcript syncs the last of them to disk
+    detach_transcript(group_manager.groupchat)
 
 def get_file_name(group_manager: autogen.GroupChatManager):
+    return f"group_chat_history_{group_manager.name}.jsonl"
+
+def get_legacy_file_name(group_manager: autogen.GroupChatManager):
     return f"group_chat_history_{group_manager.name}.txt"
 
 async def main():
@@ -1,66 +1,179 @@
+import hashlib
 import os
-import pyodbc
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
 from models.agent_context import AgentContext
+from datastore.storage_backend import StorageBackend, StorageError, get_backend
+from datastore.storage_executor import run_blocking
+from models.memory_writer import get_memory_writer
+
+DEFAULT_PAGE_SIZE = 500
+# Seconds a read waits for the write-behind writer before reading what has been written so far
+DEFAULT_MEMORY_FLUSH_TIMEOUT = 10.0
+MESSAGE_ID_PREFIX = "msg:"
+
+def message_id(message: Optional[str])->str:
+    """
+    Returns a short, stable reference to a message, derived from its content. The MemoryId of the saved event is
+    assigned by the database (possibly later, by the write-behind writer), so the reference stored with task updates
+    is content addressed instead. It is saved with the event (MessageId), so Memory.find_message resolves it with one lookup.
+    """
+    return MESSAGE_ID_PREFIX + hashlib.sha256((message or "").encode("utf-8")).hexdigest()[:16]
 
 class Event:
-    def __init__(self, role, message, message_type, from_agent_name=None):
+    def __init__(self, role, message, message_type, from_agent_name=None, timestamp=None, memory_id=None):
         self.role = role
         self.message = message
         self.message_type = message_type
         self.from_agent_name = from_agent_name
+        self.timestamp = timestamp
+        self.memory_id = memory_id
+
+    @property
+    def message_id(self)->str:
+        return message_id(self.message)
+
+class MemoryCursor:
+    """Position in an agent's memory history used for keyset paging: the last MemoryId returned."""
+    def __init__(self, after_memory_id=None):
+        self.after_memory_id = after_memory_id
+
+    def advance(self, events: list[Event])->'MemoryCursor':
+        """Returns the cursor positioned after the given page of events."""
+        return MemoryCursor(events[-1].memory_id)
         
 class Memory:
-    def __init__(self, planId, agentName, taskId):
-        # Sample connection string: replace with your actual connection string
-        # self.connection_string = "Driver={SQL Server};Server=myServerAddress;Database=myDatabase;Uid=myUsername;Pwd=myPassword;"
-        self.connection_string = os.environ.get('SQL_CONNECTIONSTRING')
+    def __init__(self, planId, agentName, taskId, write_behind: bool = False, backend: StorageBackend = None):
+        # The backend (SQL Server by default) is chosen by the STORAGE_BACKEND environment variable;
+        # see datastore.storage_backend.create_backend
+        self.backend = backend if backend is not None else get_backend()
         self.planId = planId
         self.agentName = agentName
         self.taskId = taskId
+        # When enabled, events are queued and written in batches off the caller's thread
+        self.writer = get_memory_writer(self.backend) if write_behind else None
+        self.flush_timeout = float(os.environ.get("MEMORY_FLUSH_TIMEOUT", DEFAULT_MEMORY_FLUSH_TIMEOUT))
 
     def save_to_memory(self, event: Event):
+        if self.writer is not None:
+            try:
+                self.writer.enqueue(self.planId, self.agentName, self.taskId, event)
+            except StorageError as e:
+                print(f"Error saving to memory: {e}")
+            return
+
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
-
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.SaveToMemory ?, ?, ?, ?, ?, ?, ?",
-                            self.planId, self.agentName, self.taskId, 
-                            event.role, event.message, event.message_type, event.from_agent_name)
-            conn.commit()
-
-            cursor.close()
-            conn.close()
-        except pyodbc.Error as e:
+            self.backend.save_events([(self.planId, self.agentName, self.taskId, event)])
+        except StorageError as e:
             print(f"Error saving to memory: {e}")
 
+    def flush(self, timeout: float = None)->bool:
+        """Blocks until every event queued by the write-behind writer has been written."""
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
+
     def retrieve_memory(self, lookback: int = -1)->list[Event]:
+        """Returns the last `lookback` events (or the whole history when lookback is negative), oldest first."""
+        return list(self.stream_memory(lookback=lookback))
+
+    def stream_memory(self, lookback: int = -1, page_size: int = DEFAULT_PAGE_SIZE)->Iterator[Event]:
+        """
+        Yields events oldest first without materializing the whole history.
+        With a non-negative lookback only the last `lookback` events are read from the server;
+        otherwise the full history is read one page of `page_size` rows at a time.
+        """
+        # Read our own writes: anything still queued must land before we query, but a stuck writer must not hang the read
+        if not self.flush(self.flush_timeout):
+            print(f"Error retrieving memory: queued events not written after {self.flush_timeout}s, reading without them")
+
+        if lookback is not None and lookback >= 0:
+            try:
+                for row in self.backend.fetch_events(self.planId, self.agentName, self.taskId, lookback, page_size):
+                    yield self._to_event(row)
+            except StorageError as e:
+                print(f"Error retrieving memory: {e}")
+            return
+
+        cursor = None
+        while True:
+            events, cursor = self.retrieve_memory_page(cursor, page_size)
+            yield from events
+            if cursor is None:
+                return
+
+    def retrieve_memory_page(self, cursor: Optional[MemoryCursor] = None, page_size: int = DEFAULT_PAGE_SIZE)->Tuple[list[Event], Optional[MemoryCursor]]:
+        """
+        Returns one page of history, oldest first, starting after `cursor` (or from the beginning when None),
+        along with the cursor for the next page. The returned cursor is None once the history is exhausted.
+        """
+        if cursor is None:
+            cursor = MemoryCursor()
+
+        try:
+            rows = self.backend.fetch_events_page(self.planId, self.agentName, self.taskId, cursor.after_memory_id, page_size)
+        except StorageError as e:
+            print(f"Error retrieving memory: {e}")
+            return [], None
+
+        events = [self._to_event(row) for row in rows]
+
+        if len(events) < page_size:
+            return events, None
+
+        return events, cursor.advance(events)
+
+    def find_message(self, reference: str)->Optional[Event]:
+        """Returns the latest event whose message has the given message_id, or None."""
+        if not self.flush(self.flush_timeout):
+            print(f"Error retrieving memory: queued events not written after {self.flush_timeout}s, reading without them")
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
-
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.RetrieveMemory ?, ?, ?",
-                            self.planId, self.agentName, self.taskId)
-            rows = cursor.fetchall()
-
-            columns = [column[0] for column in cursor.description]
-            rows = [dict(zip(columns, row)) for row in rows]
-
-            cursor.close()
-            conn.close()
-
-            events = []
-            for row in rows:
-                role = row['Role']
-                message = row['Message']
-                message_type = row['MessageType']
-                from_agent_name = row['FromAgent']
-                event = Event(role, message, message_type, from_agent_name)
-                events.append(event)
-            
-            return events
-        except pyodbc.Error as e:
+            row = self.backend.fetch_message(self.planId, self.agentName, self.taskId, reference)
+        except StorageError as e:
             print(f"Error retrieving memory: {e}")
-            return []
\ No newline at end of file
+            return None
+        return self._to_event(row) if row is not None else None
+
+    async def a_save_to_memory(self, event: Event):
+        """Async version of save_to_memory; the write runs on the storage executor instead of the event loop."""
+        if self.writer is not None:
+            # Queueing never touches the database
+            self.save_to_memory(event)
+            return
+        await run_blocking(self.save_to_memory, event)
+
+    async def a_flush(self, timeout: float = None)->bool:
+        """Async version of flush."""
+        if self.writer is None:
+            return True
+        return await run_blocking(self.flush, timeout)
+
+    async def a_retrieve_memory(self, lookback: int = -1)->list[Event]:
+        """Async version of retrieve_memory."""
+        return await run_blocking(self.retrieve_memory, lookback)
+
+    async def a_retrieve_memory_page(self, cursor: Optional[MemoryCursor] = None, page_size: int = DEFAULT_PAGE_SIZE)->Tuple[list[Event], Optional[MemoryCursor]]:
+        """Async version of retrieve_memory_page."""
+        return await run_blocking(self.retrieve_memory_page, cursor, page_size)
+
+    async def a_stream_memory(self, lookback: int = -1, page_size: int = DEFAULT_PAGE_SIZE)->AsyncIterator[Event]:
+        """Async version of stream_memory; each page is fetched on the storage executor."""
+        if lookback is not None and lookback >= 0:
+            for event in await self.a_retrieve_memory(lookback):
+                yield event
+            return
+
+        if not await self.a_flush(self.flush_timeout):
+            print(f"Error retrieving memory: queued events not written after {self.flush_timeout}s, reading without them")
+
+        cursor = None
+        while True:
+            events, cursor = await self.a_retrieve_memory_page(cursor, page_size)
+            for event in events:
+                yield event
+            if cursor is None:
+                return
+
+    def _to_event(self, row: dict)->Event:
+        return Event(row['Role'], row['Message'], row['MessageType'], row['FromAgent'],
+                     timestamp=row.get('InsertTimeStamp'), memory_id=row.get('MemoryId'))
\ No newline at end of file
@@ -1,7 +1,8 @@
-import os
-import pyodbc
-
+from typing import Dict, List, Tuple
 from termcolor import colored
+from datastore.storage_backend import StorageBackend, StorageError, TaskRecord, get_backend
+from datastore.storage_executor import run_blocking
+from models.task_cache import get_task_cache
 
 class Task:
     def __init__(self, is_subtask, task, status, detail):
@@ -10,106 +11,128 @@ class Task:
         self.status = status
         self.detail = detail
 
+def plan_tasks(plan: dict)->List[TaskRecord]:
+    """
+    Lists the (taskId, agentName, task) of every agent in a plan, as StateAwareNonLlm.add_to_agent would add them.
+    Understands both plan formats:
+    - agent_plan: {group_name: {"agent": [{"agent_variable", "agent_name", "description", ...}], "manager": {...}}}
+      where each agent is keyed by its agent_variable, as in AgentContext;
+    - sample_plan: {"Steps": [{"Tasks": [{"Id", "Name", "Description", "SubTasks": [...]}]}]}
+      where task ids are made unique across steps as "<step>.<task>" and "<step>.<task>.<subtask>".
+    """
+    records = []
+
+    if "Steps" in plan:
+        for step in plan["Steps"]:
+            for task in step.get("Tasks", []):
+                task_id = f"{step['Id']}.{task['Id']}"
+                records.append((task_id, task["Name"], task.get("Description", "")))
+                for subtask in task.get("SubTasks", []):
+                    records.append((f"{task_id}.{subtask['Id']}", subtask["Name"], subtask.get("Description", "")))
+        return records
+
+    for group_data in plan.values():
+        for agent in group_data.get("agent", []):
+            records.append((agent["agent_variable"], agent["agent_name"], agent.get("description", "")))
+    return records
+
 class Tasks:
-    def __init__(self, planId, agentName, taskId):
-        # Sample connection string: replace with your actual connection string
-        # self.connection_string = "Driver={SQL Server};Server=myServerAddress;Database=myDatabase;Uid=myUsername;Pwd=myPassword;"
-        self.connection_string = os.environ.get('SQL_CONNECTIONSTRING')
+    def __init__(self, planId, agentName, taskId, backend: StorageBackend = None):
+        # The backend (SQL Server by default) is chosen by the STORAGE_BACKEND environment variable;
+        # see datastore.storage_backend.create_backend
+        self.backend = backend if backend is not None else get_backend()
         self.planId = planId
         self.agentName = agentName
         self.taskId = taskId
+        # Shared by every Tasks instance of the plan in this process; answers existence and status without a round-trip
+        self.cache = get_task_cache(planId, self.backend)
 
     def print_tasks(self):
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
-
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE select * from vAllTasks")
-            conn.commit()
-
-            for row in cursor.fetchall():
+            for row in self.backend.fetch_all_tasks():
                 print(colored(row, "light_green"))
 
-            cursor.close()
-            conn.close()
-
-        except pyodbc.Error as e:
+        except StorageError as e:
             print(f"Error saving task: {e}")
 
     def add_task(self, taskId: str, agentName: str, taskName: str):
+        # Idempotent: a task the plan already tracks is left as it is, so callers need no task_exists check first
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
+            if self.cache.ensure_task(taskId, agentName, taskName):
+                print(colored(f"Task Added: Agent: {self.agentName}, Task: {taskName} (ID: {self.taskId})", "green"))
+        except StorageError as e:
+            print(f"Error saving task: {e}")
 
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.AddTask ?, ?, ?, ?",
-                            self.planId, taskId, agentName, taskName)
-            conn.commit()
+    def register_plan(self, plan: dict)->Dict[TaskRecord, int]:
+        """
+        Registers every task and subtask of the plan under this plan id in one transaction and one round-trip,
+        instead of an add_task per agent and step. Tasks already tracked are left as they are.
 
-            cursor.close()
-            conn.close()
+        Args:
+            plan (dict): a plan in either format understood by plan_tasks.
 
-            print(colored(f"Task Added: Agent: {self.agentName}, Task: {taskName} (ID: {self.taskId})", "green"))
-        except pyodbc.Error as e:
-            print(f"Error saving task: {e}")
+        Returns:
+            The TaskTracker id of every task, keyed by (taskId, agentName, task).
+        """
+        records = plan_tasks(plan)
+        if not records:
+            return {}
 
-    def update_task(self, agentName: str, taskName: str, detail: str, status: str, chat_history: str):
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
+            rows = self.backend.register_tasks(self.planId, records)
+            self.cache.record_rows(rows)
 
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.UpdateTask ?, ?, ?, ?, ?, ?, ?",
-                            self.planId, self.taskId, agentName, taskName, 
-                            status, detail, chat_history)
-            conn.commit()
+            print(colored(f"Registered {len(rows)} tasks for plan {self.planId}", "green"))
+            return {(str(row["TaskId"]), row["AgentName"], row["Task"]): row["id"] for row in rows}
+        except StorageError as e:
+            print(f"Error registering tasks: {e}")
+            return {}
 
-            cursor.close()
-            conn.close()
+    def update_task(self, agentName: str, taskName: str, detail: str, status: str, chat_history: str):
+        try:
+            self.backend.update_task(self.planId, self.taskId, agentName, taskName, status, detail, chat_history)
+            self.cache.record_update(self.taskId, agentName, taskName, status, detail, chat_history)
 
             print(colored(f"Task {taskName} for Agent {self.agentName} updated. New status: {status}", "green"))
-        except pyodbc.Error as e:
+        except StorageError as e:
             print(f"Error updating task: {e}")
     
-    def task_exists(self, taskId: str, agent_name: str, task: str):
+    def update_tasks(self, agentName: str, updates: List[Tuple[str, str, str]], chat_history: str)->int:
+        """
+        Applies the (task, status, detail) updates of one message. Only the tasks whose status or detail actually
+        changed are written, all in one round-trip. Returns how many tasks were written.
+
+        Args:
+            agentName (str): the agent the tasks belong to.
+            updates (List[Tuple[str, str, str]]): (task, status, detail) for each reported step.
+            chat_history (str): reference to the message that reported them (see models.agent_memory.message_id).
+        """
         try:
-            task_exists = False
-
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
-
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.RetrieveTask ?, ?, ?",
-                            taskId, agent_name, task)
-            
-            row = cursor.fetchval()
+            changed = self.cache.changed(self.taskId, agentName, updates)
+            if not changed:
+                return 0
 
-            if row != None:
-                task_exists = True
+            self.backend.update_tasks(self.planId, self.taskId, [(agentName, task, status, detail, chat_history) for task, status, detail in changed])
+            for task, status, detail in changed:
+                self.cache.record_update(self.taskId, agentName, task, status, detail, chat_history)
 
-            cursor.close()
-            conn.close()
+            print(colored(f"{len(changed)} of {len(updates)} tasks for Agent {self.agentName} updated: "
+                          + ", ".join(f"{task}: {status}" for task, status, _ in changed), "green"))
+            return len(changed)
+        except StorageError as e:
+            print(f"Error updating tasks: {e}")
+            return 0
 
-            return task_exists
-        except pyodbc.Error as e:
+    def task_exists(self, taskId: str, agent_name: str, task: str):
+        try:
+            return self.cache.exists(taskId, agent_name, task)
+        except StorageError as e:
             print(f"Error updating task: {e}")
     
-    def retrieve_tasks(self)->list[Task]:
+    def retrieve_tasks(self, reload: bool = True)->list[Task]:
+        """Returns the tasks of this task id from the task cache; reload=False uses the cached rows even when stale."""
         try:
-            conn = pyodbc.connect(self.connection_string)
-            cursor = conn.cursor()
-
-            # Call the stored procedure with the appropriate parameters
-            cursor.execute("EXECUTE dbo.RetrieveTasks ?, ?",
-                            self.planId, self.taskId)
-            rows = cursor.fetchall()
-
-            columns = [column[0] for column in cursor.description]
-            rows = [dict(zip(columns, row)) for row in rows]
-
-            cursor.close()
-            conn.close()
+            rows = self.cache.tasks_for(self.taskId, reload)
 
             tasks = []
             for row in rows:
@@ -124,6 +147,27 @@ class Tasks:
                 tasks.append(task)
             
             return tasks
-        except pyodbc.Error as e:
+        except StorageError as e:
             print(f"Error retrieving tasks: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    # Async versions of the methods above. The blocking backend call runs on the bounded storage executor,
+    # so concurrent chats on one event loop do not serialize behind each other's database round-trips.
+
+    async def a_add_task(self, taskId: str, agentName: str, taskName: str):
+        await run_blocking(self.add_task, taskId, agentName, taskName)
+
+    async def a_register_plan(self, plan: dict)->Dict[TaskRecord, int]:
+        return await run_blocking(self.register_plan, plan)
+
+    async def a_update_task(self, agentName: str, taskName: str, detail: str, status: str, chat_history: str):
+        await run_blocking(self.update_task, agentName, taskName, detail, status, chat_history)
+
+    async def a_update_tasks(self, agentName: str, updates: List[Tuple[str, str, str]], chat_history: str)->int:
+        return await run_blocking(self.update_tasks, agentName, updates, chat_history)
+
+    async def a_task_exists(self, taskId: str, agent_name: str, task: str):
+        return await run_blocking(self.task_exists, taskId, agent_name, task)
+
+    async def a_retrieve_tasks(self)->list[Task]:
+        return await run_blocking(self.retrieve_tasks)
\ No newline at end of file
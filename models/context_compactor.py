@@ -0,0 +1,272 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from utils.step_extractor import extract_step_statuses
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 6000
+DEFAULT_KEEP_RECENT = 4
+# Blocks shorter than this are never treated as repeated instructions
+DEFAULT_MIN_BLOCK_CHARS = 200
+# Characters of a dropped message kept in the summary of earlier turns
+SUMMARY_LINE_CHARS = 160
+# Tokens added per message by the chat format, on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+REPEATED_BLOCK = "[Repeated instructions omitted; they are the same as earlier in the conversation.]"
+
+# Instruction blocks are separated by blank lines or by ---- rules; the separators are kept so the text reads the same
+BLOCK_SEPARATOR = re.compile(r"(\n[ \t]*-{3,}[ \t]*\n|\n[ \t]*\n)")
+
+
+class CompactionReport:
+    """What compacting one prompt did."""
+
+    def __init__(self, tokens_before: int, tokens_after: int, deduplicated_blocks: int, stripped_status_blocks: int,
+                 summarized_messages: int):
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.deduplicated_blocks = deduplicated_blocks
+        self.stripped_status_blocks = stripped_status_blocks
+        self.summarized_messages = summarized_messages
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def __str__(self) -> str:
+        return (f"{self.tokens_before} -> {self.tokens_after} tokens (saved {self.tokens_saved}): "
+                f"{self.deduplicated_blocks} repeated blocks, {self.stripped_status_blocks} status blocks, "
+                f"{self.summarized_messages} messages summarized")
+
+
+class ContextCompactor:
+    """
+    Keeps the messages an agent sends to the LLM within a token budget, without changing its stored history.
+    A prompt within budget is sent as it is. Otherwise the stages run in order, each only while the prompt is still
+    over budget (the first two always run):
+    1. the task status messages replayed by recollect are replaced with one exact table of the latest statuses,
+       placed just before the last turn;
+    2. instruction blocks repeated from an earlier message (the step list and response format) are omitted;
+    3. the {"Steps": [...]} status blocks of older turns are stripped, since the table supersedes them;
+    4. the oldest turns are replaced with a one-line-per-message summary.
+    The first message (the task) and the last keep_recent messages are never summarized. An assistant message with
+    tool (or function) calls and the responses to them are one turn: they are kept or summarized together, and the
+    table is never placed between them.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, model: str = "gpt-4", keep_recent: int = DEFAULT_KEEP_RECENT,
+                 min_block_chars: int = DEFAULT_MIN_BLOCK_CHARS):
+        """
+        Args:
+            token_budget (Optional, int): tokens the messages may use. Defaults to CONTEXT_TOKEN_BUDGET or 6000; 0 disables compaction.
+            model (Optional, str): model whose tokenizer counts the tokens. Default "gpt-4".
+            keep_recent (Optional, int): latest messages always kept verbatim. Default 4.
+            min_block_chars (Optional, int): shortest block that counts as repeated instructions. Default 200.
+        """
+        self.token_budget = token_budget if token_budget is not None else int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET))
+        self.model = model
+        self.keep_recent = keep_recent
+        self.min_block_chars = min_block_chars
+        self.reports: List[CompactionReport] = []
+        self._token_counts: Dict[str, int] = {}
+        self._use_tokenizer = True
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(report.tokens_saved for report in self.reports)
+
+    def count_tokens(self, text: str) -> int:
+        count = self._token_counts.get(text)
+        if count is None:
+            count = self._count(text)
+            if len(self._token_counts) > 10000:
+                self._token_counts.clear()
+            self._token_counts[text] = count
+        return count
+
+    def _count(self, text: str) -> int:
+        if self._use_tokenizer:
+            try:
+                from autogen.token_count_utils import count_token
+
+                return count_token(text, self.model)
+            except Exception as e:
+                # e.g. tiktoken cannot download its encoding; fall back to the usual 4 characters per token
+                print(f"Error counting tokens, estimating instead: {e}")
+                self._use_tokenizer = False
+        return len(text) // 4 + 1
+
+    def message_tokens(self, message: Dict) -> int:
+        content = message.get("content")
+        return MESSAGE_OVERHEAD_TOKENS + (self.count_tokens(content) if isinstance(content, str) else 0)
+
+    def total_tokens(self, messages: List[Dict]) -> int:
+        return sum(self.message_tokens(message) for message in messages)
+
+    def compact(self, messages: List[Dict], task_table: Optional[str] = None,
+                is_status_message: Optional[Callable[[str], bool]] = None) -> List[Dict]:
+        """
+        Returns the compacted messages; the given list and its messages are left untouched.
+
+        Args:
+            messages (List[Dict]): the messages about to be sent to the LLM, oldest first.
+            task_table (Optional, str): the latest task statuses, added as one message.
+            is_status_message (Optional, Callable): tells the replayed task status messages the table replaces.
+        """
+        tokens_before = self.total_tokens(messages)
+        messages = list(messages)
+        if tokens_before <= self.token_budget:
+            self.reports.append(CompactionReport(tokens_before, tokens_before, 0, 0, 0))
+            return messages
+
+        table_index = None
+        if task_table:
+            if is_status_message is not None:
+                messages = [m for m in messages if not (_is_plain(m) and isinstance(m.get("content"), str) and is_status_message(m["content"]))]
+            turns = _turns(messages)
+            table_index = turns[-1][0] if turns else 0
+            messages.insert(table_index, {"content": task_table, "role": "user"})
+
+        messages, deduplicated = self._deduplicate_blocks(messages)
+
+        stripped = 0
+        if self.total_tokens(messages) > self.token_budget and task_table:
+            messages, stripped = self._strip_status_blocks(messages)
+
+        summarized = 0
+        if self.total_tokens(messages) > self.token_budget:
+            messages, summarized = self._summarize_oldest(messages, table_index)
+
+        self.reports.append(CompactionReport(tokens_before, self.total_tokens(messages), deduplicated, stripped, summarized))
+        return messages
+
+    def _deduplicate_blocks(self, messages: List[Dict]):
+        seen = set()
+        deduplicated = 0
+        compacted = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str):
+                compacted.append(message)
+                continue
+
+            parts = BLOCK_SEPARATOR.split(content)
+            changed = False
+            # Even indices are blocks, odd ones the separators between them
+            for i in range(0, len(parts), 2):
+                key = " ".join(parts[i].split())
+                if len(key) < self.min_block_chars:
+                    continue
+                if key in seen:
+                    parts[i] = REPEATED_BLOCK
+                    changed = True
+                    deduplicated += 1
+                else:
+                    seen.add(key)
+
+            compacted.append(dict(message, content="".join(parts)) if changed else message)
+        return compacted, deduplicated
+
+    def _strip_status_blocks(self, messages: List[Dict]):
+        stripped = 0
+        compacted = []
+        last_older = len(messages) - self.keep_recent
+        for i, message in enumerate(messages):
+            content = message.get("content")
+            if i < last_older and isinstance(content, str):
+                start = _status_block_start(content)
+                if start is not None:
+                    message = dict(message, content=content[:start].rstrip(" \n="))
+                    stripped += 1
+            compacted.append(message)
+        return compacted, stripped
+
+    def _summarize_oldest(self, messages: List[Dict], table_index: Optional[int] = None):
+        # The task (first turn), the table and the latest messages stay; everything between is summarized oldest
+        # first, a whole turn at a time so a tool response is never kept without the call it answers
+        turns = _turns(messages)
+        first = turns[0][1] if turns else 0
+        last = len(messages) - self.keep_recent
+        if table_index is not None:
+            last = min(last, table_index)
+        for start, end in turns:
+            if start < last < end:
+                last = start
+        if last <= first:
+            return messages, 0
+
+        total = self.total_tokens(messages)
+        lines = []
+        end = first
+        for turn_start, turn_end in turns:
+            if turn_start < first:
+                continue
+            if turn_end > last or total <= self.token_budget:
+                break
+            for message in messages[turn_start:turn_end]:
+                line = _summary_line(message)
+                total += self.count_tokens(line) - self.message_tokens(message)
+                lines.append(line)
+            end = turn_end
+        if not lines:
+            return messages, 0
+
+        # The summary itself must fit too: its oldest lines go first
+        omitted = 0
+        while total > self.token_budget and omitted < len(lines):
+            total -= self.count_tokens(lines[omitted])
+            omitted += 1
+
+        header = f"Summary of {len(lines)} earlier messages"
+        if omitted:
+            header += f" (the oldest {omitted} omitted)"
+        summary = {"content": header + ":\n" + "\n".join(lines[omitted:]), "role": "user"}
+        return messages[:first] + [summary] + messages[end:], len(lines)
+
+
+def _is_plain(message: Dict) -> bool:
+    return message.get("role") not in ("tool", "function") and not message.get("tool_calls") and not message.get("function_call")
+
+
+def _turns(messages: List[Dict]) -> List[tuple]:
+    """(start, end) of each turn: a single message, or a message with tool/function calls and the responses that follow it."""
+    turns = []
+    i = 0
+    while i < len(messages):
+        end = i + 1
+        if messages[i].get("tool_calls") or messages[i].get("function_call"):
+            while end < len(messages) and messages[end].get("role") in ("tool", "function"):
+                end += 1
+        turns.append((i, end))
+        i = end
+    return turns
+
+
+def _status_block_start(content: str) -> Optional[int]:
+    status_block = extract_step_statuses(content)
+    # Only a block that ends the message is a status trailer
+    if status_block is None or content[status_block.end:].strip():
+        return None
+    return status_block.start
+
+
+def _summary_line(message: Dict) -> str:
+    content = message.get("content")
+    text = " ".join(content.split()) if isinstance(content, str) else ""
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS] + "..."
+    return f"- {message.get('name') or message.get('role', 'user')}: {text}"
+
+
+def format_task_table(tasks) -> str:
+    """Formats tasks (models.agent_tasks.Task) as the exact table of their latest statuses."""
+    lines = ["Current status of your tasks (authoritative; supersedes earlier status updates):", "| Task | Status | Detail |", "| --- | --- | --- |"]
+    for task in tasks:
+        detail = " ".join(str(task.detail or "").split())
+        lines.append(f"| {task.task} | {task.status} | {detail} |")
+    return "\n".join(lines)
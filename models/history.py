@@ -0,0 +1,94 @@
+import heapq
+import itertools
+from typing import Dict, List, Optional
+
+from datastore.storage_backend import Row, StorageBackend, StorageError, get_backend
+from datastore.storage_executor import run_blocking
+
+# How many merged messages back an identical message from another agent still counts as the same message
+DEFAULT_DEDUP_WINDOW = 20
+
+MESSAGE_TYPE = "MESSAGE"
+
+
+class HistoryReconstructor:
+    """
+    Rebuilds a group chat's history from the memory of all its agents: one query across the agents of the plan,
+    then a k-way merge of the per-agent runs by insertion sequence (MemoryId), dropping the copies of a message
+    that several agents recorded.
+
+    Every agent stores what it sends and, with StateAwareNonLlm, what it receives, so concatenating each
+    agent's recollected list repeats messages and loses their order.
+    """
+
+    def __init__(self, planId, backend: StorageBackend = None, dedup_window: int = DEFAULT_DEDUP_WINDOW):
+        """
+        Args:
+            planId: plan whose history is rebuilt.
+            backend (Optional, StorageBackend): where the memory is read from. Defaults to the process-wide backend.
+            dedup_window (Optional, int): how many merged messages back a copy from another agent is looked for. Default 20.
+        """
+        self.planId = planId
+        self.backend = backend if backend is not None else get_backend()
+        self.dedup_window = dedup_window
+        # MESSAGE events read per agent, before dedup; the count StateAwareNonLlm.recollect would have reached
+        self.message_counts: Dict[str, int] = {}
+
+    def reconstruct(self, agent_names: Optional[List[str]] = None, lookback: int = -1) -> List[Dict]:
+        """
+        Returns the merged history as group chat messages ({"content", "role", "name"}), oldest first.
+
+        Args:
+            agent_names (Optional, List[str]): agents to include. Defaults to every agent of the plan.
+            lookback (Optional, int): the last events to read per agent. Default -1 (all).
+        """
+        try:
+            rows = self.backend.fetch_plan_events(self.planId, agent_names, lookback)
+        except StorageError as e:
+            print(f"Error retrieving memory: {e}")
+            return []
+
+        return self.merge(rows)
+
+    async def a_reconstruct(self, agent_names: Optional[List[str]] = None, lookback: int = -1) -> List[Dict]:
+        """Async version of reconstruct; the query runs on the storage executor."""
+        return await run_blocking(self.reconstruct, agent_names, lookback)
+
+    def merge(self, rows: List[Row]) -> List[Dict]:
+        """Merges rows that are sorted within each agent and task into one deduplicated, ordered history."""
+        runs = []
+        self.message_counts = {}
+        for (agent_name, _), run in itertools.groupby(rows, key=lambda row: (row["AgentName"], row["TaskId"])):
+            run = [row for row in run if row["MessageType"] == MESSAGE_TYPE]
+            self.message_counts[agent_name] = self.message_counts.get(agent_name, 0) + len(run)
+            runs.append(run)
+
+        messages = []
+        # For each recent message content: where it was emitted and which agents recorded it since
+        recent: Dict[str, tuple] = {}
+        for row in heapq.merge(*runs, key=_sequence):
+            content = row["Message"]
+            agent_name = row["AgentName"]
+
+            seen = recent.get(content)
+            if seen is not None:
+                position, agents = seen
+                if len(messages) - position <= self.dedup_window and agent_name not in agents:
+                    # Another agent's copy of a message already in the history
+                    agents.add(agent_name)
+                    continue
+
+            recent[content] = (len(messages), {agent_name})
+            messages.append({"content": content, "role": row["Role"], "name": agent_name})
+
+            # Forget contents that fell out of the window so memory stays bounded
+            if len(recent) > 4 * self.dedup_window:
+                horizon = len(messages) - self.dedup_window
+                recent = {key: value for key, value in recent.items() if value[0] >= horizon}
+
+        return messages
+
+
+def _sequence(row: Row):
+    # MemoryId follows insertion order across agents; rows without one sort after them by timestamp
+    return (row["MemoryId"] is None, row["MemoryId"] or 0, str(row["InsertTimeStamp"]))
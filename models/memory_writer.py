@@ -0,0 +1,209 @@
+import atexit
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from termcolor import colored
+
+from datastore.storage_backend import StorageBackend, StorageError
+
+MAX_ROWS_PER_BATCH = 1000
+MAX_RETRIES = 3
+
+
+class MemoryWriter:
+    """
+    Write-behind buffer for memory events.
+
+    Events are queued by the agent hooks and written by a single background thread in batches, either when
+    batch_size events are waiting or flush_interval seconds after the first event of a batch was queued.
+    Because one thread drains a FIFO queue and each batch is saved in order as one unit of work, events land
+    in MemoryTable in the same order they were saved, which is the order recollect() replays them in.
+    Call flush() at the end of a chat (and before reading memory back) to make every queued event durable.
+    A batch that keeps failing is written again one event at a time, so only the events the store rejects are lost.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        batch_size: Optional[int] = 50,
+        flush_interval: Optional[float] = 1.0,
+    ):
+        """
+        Args:
+            backend (StorageBackend): backend the batches are saved to.
+            batch_size (Optional, int): number of queued events that triggers a write. Default 50.
+            flush_interval (Optional, float): maximum seconds an event waits in the queue before it is written. Default 1.0.
+        """
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # (planId, agentName, taskId, event) tuples waiting to be written, oldest first
+        self._pending: List[Tuple] = []
+        self._oldest_pending_at = None
+        # Sequence numbers of the last event queued and the last event written (or dropped)
+        self._queued_seq = 0
+        self._written_seq = 0
+        # Highest sequence number a flush() caller is waiting on
+        self._flush_seq = 0
+        self._failures = 0
+        self._closed = False
+        # Set if the background thread dies; queued events are then dropped and flush() callers released
+        self._error: Optional[BaseException] = None
+
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="MemoryWriter", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, planId, agentName, taskId, event):
+        """Queues an event for writing and returns immediately."""
+        with self._condition:
+            if self._error is not None:
+                raise StorageError(f"MemoryWriter stopped: {self._error}")
+            if self._closed:
+                raise RuntimeError("MemoryWriter is closed")
+            if not self._pending:
+                self._oldest_pending_at = time.monotonic()
+            self._pending.append((planId, agentName, taskId, event))
+            self._queued_seq += 1
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every event queued before the call has been written.
+        Returns False if the timeout expired first, or if the writer stopped and dropped them.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            target = self._queued_seq
+            self._flush_seq = max(self._flush_seq, target)
+            self._condition.notify_all()
+            while self._written_seq < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return self._error is None
+
+    def close(self, timeout: Optional[float] = None):
+        """Flushes any queued events and stops the background thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _run(self):
+        try:
+            self._write_loop()
+        except Exception as e:
+            print(colored(f"Error saving to memory: writer stopped, dropping {len(self._pending)} queued event(s): {e}", "red"))
+            with self._condition:
+                # Release everyone waiting in flush(); later enqueue() calls fail instead of queueing forever
+                self._error = e
+                self._written_seq = self._queued_seq
+                self._pending.clear()
+                self._oldest_pending_at = None
+                self._condition.notify_all()
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                while not self._should_write():
+                    if self._closed and not self._pending:
+                        return
+                    self._condition.wait(self._time_until_due())
+                batch = self._pending[:MAX_ROWS_PER_BATCH]
+
+            written = self._write(batch)
+
+            with self._condition:
+                if written:
+                    self._failures = 0
+                else:
+                    self._failures += 1
+                    if self._failures < MAX_RETRIES and not self._closed:
+                        # Leave the batch at the front of the queue so ordering is preserved on retry
+                        self._condition.wait(self.flush_interval)
+                        continue
+                    self._failures = 0
+
+            if not written:
+                # Only the events the store rejects on their own are lost
+                dropped = self._write_rows(batch)
+                if dropped:
+                    print(colored(f"Error saving to memory: dropping {dropped} of {len(batch)} event(s) the store rejected", "red"))
+
+            with self._condition:
+                del self._pending[:len(batch)]
+                self._written_seq += len(batch)
+                self._oldest_pending_at = time.monotonic() if self._pending else None
+                self._condition.notify_all()
+
+    def _should_write(self) -> bool:
+        if not self._pending:
+            return False
+        if self._closed or len(self._pending) >= self.batch_size or self._written_seq < self._flush_seq:
+            return True
+        return self._time_until_due() <= 0
+
+    def _time_until_due(self) -> Optional[float]:
+        if self._oldest_pending_at is None:
+            return None
+        return self._oldest_pending_at + self.flush_interval - time.monotonic()
+
+    def _write(self, batch: List[Tuple]) -> bool:
+        try:
+            self.backend.save_events(batch)
+            return True
+        except Exception as e:
+            print(f"Error saving to memory: {e}")
+            return False
+
+    def _write_rows(self, batch: List[Tuple]) -> int:
+        """Saves the events one by one, in order, and returns the number that could not be saved."""
+        dropped = 0
+        for record in batch:
+            if not self._write([record]):
+                dropped += 1
+        return dropped
+
+
+_writers: Dict[int, MemoryWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_memory_writer(backend: StorageBackend, **kwargs) -> MemoryWriter:
+    """Returns the shared writer for the given backend, starting it on first use."""
+    with _writers_lock:
+        writer = _writers.get(id(backend))
+        if writer is None:
+            writer = MemoryWriter(backend, **kwargs)
+            _writers[id(backend)] = writer
+        return writer
+
+
+def flush_memory_writers(timeout: Optional[float] = None):
+    """Makes every queued memory event durable, e.g. at the end of a chat."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush(timeout)
+
+
+def close_memory_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_memory_writers)
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from termcolor import colored
+
+from datastore.storage_backend import Row, StorageBackend
+
+# Seconds a plan's cached task rows are trusted before they are reloaded, which is how status
+# changes written by other processes sharing the plan become visible
+DEFAULT_TASK_CACHE_MAX_AGE = 30.0
+
+TaskKey = Tuple[str, str, str]
+
+
+def _task_key(taskId, agentName: str, task: str) -> TaskKey:
+    # Ids come back from the database as strings but are often passed in as ints. Names and tasks match the way
+    # SQL Server compares them (case-insensitive collation, trailing spaces ignored) and TaskHash hashes them.
+    return (str(taskId), _normalize(agentName), _normalize(task))
+
+
+def _normalize(text) -> str:
+    return str(text).rstrip(" ").upper()
+
+
+class TaskStateCache:
+    """
+    Per-plan cache of TaskTracker rows, loaded with a single RetrieveTasks call and answering task existence
+    and status locally, so adding a plan's steps no longer costs a task_exists round-trip per step.
+
+    Coherence when several processes share a plan:
+    - inserts go through the backend's idempotent upsert, so acting on a stale "missing" answer never duplicates a task;
+    - status updates are written through to the backend first and then applied to the cache;
+    - rows older than max_age are reloaded, which picks up other processes' inserts and status changes.
+    """
+
+    def __init__(self, planId, backend: StorageBackend, max_age: Optional[float] = None):
+        """
+        Args:
+            planId: plan whose tasks are cached.
+            backend (StorageBackend): backend the rows are loaded from and written through to.
+            max_age (Optional, float): seconds before the rows are reloaded. Defaults to TASK_CACHE_MAX_AGE or 30.
+        """
+        self.planId = planId
+        self.backend = backend
+        self.max_age = max_age if max_age is not None else float(os.environ.get("TASK_CACHE_MAX_AGE", DEFAULT_TASK_CACHE_MAX_AGE))
+        self._lock = threading.RLock()
+        self._rows: Dict[TaskKey, Row] = {}
+        self._loaded_at: Optional[float] = None
+
+    def is_stale(self) -> bool:
+        """True when the next read will reload the plan from the backend."""
+        return self._is_stale()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def refresh(self):
+        """Reloads every task of the plan from the backend."""
+        rows = self.backend.fetch_tasks(self.planId)
+        with self._lock:
+            self._rows = {_task_key(row["TaskId"], row["AgentName"], row["Task"]): row for row in rows}
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Forces the next read to reload the plan."""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._is_stale():
+            self.refresh()
+
+    def exists(self, taskId, agentName: str, task: str) -> bool:
+        self._ensure_loaded()
+        with self._lock:
+            return _task_key(taskId, agentName, task) in self._rows
+
+    def ensure_task(self, taskId, agentName: str, task: str) -> bool:
+        """
+        Adds the task unless it is already tracked. Costs no round-trip when the cache already has it
+        and a single upsert otherwise. Returns True if the task was inserted.
+        """
+        if self.exists(taskId, agentName, task):
+            return False
+
+        inserted = self.backend.upsert_task(self.planId, taskId, agentName, task)
+        with self._lock:
+            if inserted:
+                self._rows[_task_key(taskId, agentName, task)] = {
+                    "PlanId": self.planId,
+                    "TaskId": taskId,
+                    "AgentName": agentName,
+                    "Task": task,
+                    "Status": "NOT DONE",
+                    "Detail": "Not started",
+                    "ChatHistory": None,
+                }
+            else:
+                # Another process added it since the cache was loaded; reload to pick up its current status
+                self._loaded_at = None
+
+        return inserted
+
+    def record_rows(self, rows: List[Row]):
+        """Adds or replaces rows that were just read from or written to the backend."""
+        with self._lock:
+            for row in rows:
+                self._rows[_task_key(row["TaskId"], row["AgentName"], row["Task"])] = row
+
+    def record_update(self, taskId, agentName: str, task: str, status: str, detail: str, chat_history: str):
+        """Applies a status update that has already been written to the backend."""
+        with self._lock:
+            row = self._rows.get(_task_key(taskId, agentName, task))
+            if row is not None:
+                row.update({"Status": status, "Detail": detail, "ChatHistory": chat_history})
+
+    def changed(self, taskId, agentName: str, updates: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+        """
+        Returns the (task, status, detail) updates that would change a tracked task, dropping those that repeat its
+        cached status and detail and those for tasks the plan does not track, which are logged. A task reported twice
+        keeps its last update. The returned tasks are spelled as tracked, so every backend matches them exactly.
+        """
+        self._ensure_loaded()
+        latest = {}
+        for task, status, detail in updates:
+            latest[_task_key(taskId, agentName, task)] = (task, status, detail)
+
+        changed = []
+        unmatched = []
+        with self._lock:
+            for key, (task, status, detail) in latest.items():
+                row = self._rows.get(key)
+                if row is None:
+                    unmatched.append(task)
+                elif (row.get("Status"), row.get("Detail")) != (status, detail):
+                    changed.append((row["Task"], status, detail))
+        if unmatched:
+            print(colored(f"{len(unmatched)} status update(s) for Agent {agentName} match no tracked task: " + ", ".join(unmatched), "light_yellow"))
+        return changed
+
+    def cached_rows(self) -> List[Row]:
+        """Returns every row currently cached for the plan, without reloading."""
+        with self._lock:
+            return [dict(row) for row in self._rows.values()]
+
+    def tasks_for(self, taskId, reload: bool = True) -> List[Row]:
+        """Returns the cached rows of one task id, in the order they were added; reload=False never reads the backend."""
+        if reload:
+            self._ensure_loaded()
+        with self._lock:
+            return [dict(row) for key, row in self._rows.items() if key[0] == str(taskId)]
+
+
+# One cache per (backend, plan) so every agent of a plan in this process shares it
+_caches: "weakref.WeakKeyDictionary[StorageBackend, Dict[str, TaskStateCache]]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_task_cache(planId, backend: StorageBackend) -> TaskStateCache:
+    """Returns the process-wide task cache for the plan on the given backend."""
+    with _caches_lock:
+        plan_caches = _caches.setdefault(backend, {})
+        cache = plan_caches.get(str(planId))
+        if cache is None:
+            cache = TaskStateCache(planId, backend)
+            plan_caches[str(planId)] = cache
+        return cache
@@ -0,0 +1,53 @@
+/****** Migration V001: MemoryTable sequence column and lookup index ******/
+-- MemoryTable was a heap ordered only by InsertTimeStamp, which has ~3ms resolution and ties whenever
+-- several events are written in one batch. MemoryId gives every event a stable, strictly increasing
+-- position, and the clustered index on (PlanId, AgentName, TaskId, MemoryId) turns every procedure
+-- lookup into a range seek that already returns rows in replay order.
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+CREATE SEQUENCE [dbo].[MemoryTableSeq] AS BIGINT START WITH 1 INCREMENT BY 1 CACHE 1000
+GO
+
+ALTER TABLE [dbo].[MemoryTable] ADD [MemoryId] [bigint] NULL
+GO
+
+-- Backfill existing rows in the order they were originally inserted
+WITH ordered AS (
+    SELECT MemoryId, ROW_NUMBER() OVER (ORDER BY InsertTimeStamp ASC) AS rn
+    FROM [dbo].[MemoryTable]
+)
+UPDATE ordered SET MemoryId = rn
+GO
+
+-- Continue the sequence after the backfilled ids
+DECLARE @next BIGINT = ISNULL((SELECT MAX(MemoryId) FROM [dbo].[MemoryTable]), 0) + 1
+DECLARE @sql NVARCHAR(200) = N'ALTER SEQUENCE [dbo].[MemoryTableSeq] RESTART WITH ' + CAST(@next AS NVARCHAR(20))
+EXEC sp_executesql @sql
+GO
+
+ALTER TABLE [dbo].[MemoryTable] ALTER COLUMN [MemoryId] [bigint] NOT NULL
+GO
+
+ALTER TABLE [dbo].[MemoryTable] ADD CONSTRAINT [DF_MemoryTable_MemoryId] DEFAULT (NEXT VALUE FOR [dbo].[MemoryTableSeq]) FOR [MemoryId]
+GO
+
+ALTER TABLE [dbo].[MemoryTable] ADD CONSTRAINT [PK_MemoryTable] PRIMARY KEY NONCLUSTERED
+(
+	[MemoryId] ASC
+) ON [PRIMARY]
+GO
+
+-- Clustering on the lookup key makes the index covering for SELECT * without duplicating Message;
+-- TOP (n) ... ORDER BY MemoryId DESC is served by a backward range seek on the same index
+CREATE UNIQUE CLUSTERED INDEX [CIX_MemoryTable_Plan_Agent_Task] ON [dbo].[MemoryTable]
+(
+	[PlanId] ASC,
+	[AgentName] ASC,
+	[TaskId] ASC,
+	[MemoryId] ASC
+) ON [PRIMARY]
+GO
@@ -0,0 +1,50 @@
+/****** Migration V002: TaskTracker task hash and lookup indexes ******/
+-- Every task procedure filters on (TaskId, AgentName, Task) or (PlanId, TaskId), but TaskTracker only had
+-- its clustered primary key on id, so each lookup scanned the table. Task is NVARCHAR(500), too wide to be a
+-- useful index key, so lookups seek on a persisted SHA2-256 hash of it and re-check Task for the match.
+-- The hash is of UPPER(RTRIM(Task)), and callers hash their parameter the same way, so it matches whenever the
+-- case-insensitive, trailing-space-insensitive comparison Task = @task does.
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+SET ANSI_PADDING ON
+GO
+
+SET ARITHABORT ON
+GO
+
+SET CONCAT_NULL_YIELDS_NULL ON
+GO
+
+SET ANSI_WARNINGS ON
+GO
+
+SET NUMERIC_ROUNDABORT OFF
+GO
+
+ALTER TABLE [dbo].[TaskTracker] ADD [TaskHash] AS CAST(HASHBYTES('SHA2_256', UPPER(RTRIM([Task]))) AS BINARY(32)) PERSISTED
+GO
+
+-- Serves dbo.RetrieveTask
+CREATE NONCLUSTERED INDEX [IX_TaskTracker_TaskId_Agent_TaskHash] ON [dbo].[TaskTracker]
+(
+	[TaskId] ASC,
+	[AgentName] ASC,
+	[TaskHash] ASC
+)
+INCLUDE ([Task]) ON [PRIMARY]
+GO
+
+-- Serves dbo.RetrieveTasks (on the PlanId, TaskId prefix) and dbo.UpdateTask
+CREATE NONCLUSTERED INDEX [IX_TaskTracker_Plan_TaskId_Agent_TaskHash] ON [dbo].[TaskTracker]
+(
+	[PlanId] ASC,
+	[TaskId] ASC,
+	[AgentName] ASC,
+	[TaskHash] ASC
+)
+INCLUDE ([Task], [insert_timestamp], [Status], [Detail], [ChatHistory]) ON [PRIMARY]
+GO
@@ -0,0 +1,23 @@
+/****** Migration V003: MemoryTable message id and lookup index ******/
+-- Task updates reference the message that reported them by its content-addressed message id
+-- (models.agent_memory.message_id). Resolving a reference meant reading the agent's whole history and hashing
+-- every message; storing the id with the event and indexing it makes it a single seek.
+-- Events saved before this migration have no MessageId, so references to them are not resolved.
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+ALTER TABLE [dbo].[MemoryTable] ADD [MessageId] [nvarchar](50) NULL
+GO
+
+-- Serves dbo.RetrieveMessage; MemoryId is in every nonclustered index through the clustered key
+CREATE NONCLUSTERED INDEX [IX_MemoryTable_Plan_Agent_Task_MessageId] ON [dbo].[MemoryTable]
+(
+	[PlanId] ASC,
+	[AgentName] ASC,
+	[TaskId] ASC,
+	[MessageId] ASC
+) ON [PRIMARY]
+GO
@@ -7,7 +7,7 @@ GO
 
 
 
-CREATE PROCEDURE [dbo].[AddTask]
+CREATE OR ALTER PROCEDURE [dbo].[AddTask]
     @planId NVARCHAR(50),
 	@taskId NVARCHAR(50),
 	@agentName NVARCHAR(50),
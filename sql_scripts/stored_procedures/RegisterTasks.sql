@@ -0,0 +1,56 @@
+/****** Object:  StoredProcedure [dbo].[RegisterTasks]    Script Date: 6/12/2024 9:41:07 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Bulk UpsertTask for plan start-up: registers every task of a plan in one round-trip and one transaction.
+-- @tasks is a JSON array of {"TaskId": ..., "AgentName": ..., "Task": ...} objects.
+-- Returns the TaskTracker row of every task passed in, whether it was inserted now or already tracked.
+CREATE OR ALTER PROCEDURE [dbo].[RegisterTasks]
+    @planId NVARCHAR(50),
+	@tasks NVARCHAR(MAX)
+
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @source TABLE (
+        TaskId NVARCHAR(50) NOT NULL,
+        AgentName NVARCHAR(200) NULL,
+        Task NVARCHAR(500) NULL,
+        TaskHash BINARY(32) NULL
+    );
+
+    INSERT INTO @source (TaskId, AgentName, Task, TaskHash)
+    SELECT DISTINCT TaskId, AgentName, Task, CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(Task))) AS BINARY(32))
+    FROM OPENJSON(@tasks)
+    WITH (
+        TaskId NVARCHAR(50) '$.TaskId',
+        AgentName NVARCHAR(200) '$.AgentName',
+        Task NVARCHAR(500) '$.Task'
+    );
+
+    BEGIN TRANSACTION;
+
+    MERGE TaskTracker WITH (HOLDLOCK) AS target
+    USING @source AS source
+    ON target.PlanId = @planId AND target.TaskId = source.TaskId AND target.AgentName = source.AgentName
+        AND target.TaskHash = source.TaskHash AND target.Task = source.Task
+    WHEN NOT MATCHED THEN
+        INSERT (PlanId, TaskId, AgentName, Task, insert_timestamp, Status, Detail)
+        VALUES (@planId, source.TaskId, source.AgentName, source.Task, getdate(), 'NOT DONE', 'Not started');
+
+    COMMIT TRANSACTION;
+
+    SELECT target.id, target.PlanId, target.TaskId, target.AgentName, target.Task, target.insert_timestamp,
+           target.Status, target.Detail, target.ChatHistory
+    FROM TaskTracker AS target
+    INNER JOIN @source AS source
+        ON target.PlanId = @planId AND target.TaskId = source.TaskId AND target.AgentName = source.AgentName
+            AND target.TaskHash = source.TaskHash AND target.Task = source.Task
+    ORDER BY target.id;
+END
+GO
@@ -5,15 +5,33 @@ GO
 SET QUOTED_IDENTIFIER ON
 GO
 
-CREATE PROCEDURE [dbo].[RetrieveMemory]
+CREATE OR ALTER PROCEDURE [dbo].[RetrieveMemory]
     @planId NVARCHAR(50),
     @agentName NVARCHAR(50),
-    @taskId NVARCHAR(50)
+    @taskId NVARCHAR(50),
+    @lookback INT = -1
 AS
 BEGIN
-    SELECT * FROM MemoryTable m
-    WHERE PlanId = @planId AND AgentName = @agentName AND TaskId = @taskId
-	ORDER BY m.InsertTimeStamp ASC
+    SET NOCOUNT ON;
+
+    IF @lookback IS NULL OR @lookback < 0
+    BEGIN
+        -- Full history, oldest first
+        SELECT * FROM MemoryTable m
+        WHERE PlanId = @planId AND AgentName = @agentName AND TaskId = @taskId
+        ORDER BY m.MemoryId ASC
+    END
+    ELSE
+    BEGIN
+        -- Only the last @lookback events: read newest first so the server stops after @lookback rows,
+        -- then return them oldest first for replay
+        SELECT lastN.* FROM (
+            SELECT TOP (@lookback) * FROM MemoryTable m
+            WHERE PlanId = @planId AND AgentName = @agentName AND TaskId = @taskId
+            ORDER BY m.MemoryId DESC
+        ) lastN
+        ORDER BY lastN.MemoryId ASC
+    END
 END
 GO
 
@@ -0,0 +1,26 @@
+/****** Object:  StoredProcedure [dbo].[RetrieveMemoryPage]    Script Date: 6/6/2024 9:12:31 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+CREATE OR ALTER PROCEDURE [dbo].[RetrieveMemoryPage]
+    @planId NVARCHAR(50),
+    @agentName NVARCHAR(50),
+    @taskId NVARCHAR(50),
+    @afterMemoryId BIGINT = NULL,
+    @pageSize INT = 500
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    -- Keyset paging: resume after the last MemoryId the caller has seen (a range seek on the clustered index)
+    SELECT TOP (@pageSize) * FROM MemoryTable m
+    WHERE PlanId = @planId AND AgentName = @agentName AND TaskId = @taskId
+        AND m.MemoryId > ISNULL(@afterMemoryId, 0)
+    ORDER BY m.MemoryId ASC
+END
+GO
+
+
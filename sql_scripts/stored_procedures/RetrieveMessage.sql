@@ -0,0 +1,22 @@
+/****** Object:  StoredProcedure [dbo].[RetrieveMessage]    Script Date: 6/20/2024 10:14:52 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Returns the latest event of the agent whose message has the given message id, if any
+CREATE OR ALTER PROCEDURE [dbo].[RetrieveMessage]
+    @planId NVARCHAR(50),
+    @agentName NVARCHAR(50),
+    @taskId NVARCHAR(50),
+    @messageId NVARCHAR(50)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT TOP (1) * FROM MemoryTable
+    WHERE PlanId = @planId AND AgentName = @agentName AND TaskId = @taskId AND MessageId = @messageId
+    ORDER BY MemoryId DESC
+END
+GO
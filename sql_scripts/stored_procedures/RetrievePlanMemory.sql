@@ -0,0 +1,32 @@
+/****** Object:  StoredProcedure [dbo].[RetrievePlanMemory]    Script Date: 6/14/2024 11:20:31 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Memory of several agents of a plan in one round-trip, for rebuilding a group chat's history.
+-- @agentNames is a JSON array of agent names, or NULL for every agent of the plan.
+-- With a non-negative @lookback only the last @lookback events of each agent and task are returned.
+-- Rows come back in clustered index order (each agent's events oldest first) so the server does not sort
+-- across agents; the caller merges the per-agent runs.
+CREATE OR ALTER PROCEDURE [dbo].[RetrievePlanMemory]
+    @planId NVARCHAR(50),
+    @agentNames NVARCHAR(MAX) = NULL,
+    @lookback INT = -1
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT recent.MemoryId, recent.PlanId, recent.AgentName, recent.TaskId, recent.Role, recent.Message,
+           recent.MessageType, recent.FromAgent, recent.InsertTimeStamp
+    FROM (
+        SELECT m.*, ROW_NUMBER() OVER (PARTITION BY m.AgentName, m.TaskId ORDER BY m.MemoryId DESC) AS RowFromEnd
+        FROM MemoryTable m
+        WHERE m.PlanId = @planId
+            AND (@agentNames IS NULL OR m.AgentName IN (SELECT value FROM OPENJSON(@agentNames)))
+    ) recent
+    WHERE @lookback IS NULL OR @lookback < 0 OR recent.RowFromEnd <= @lookback
+    ORDER BY recent.AgentName, recent.TaskId, recent.MemoryId
+END
+GO
@@ -5,12 +5,16 @@ SET QUOTED_IDENTIFIER ON
 GO
 
 
-ALTER PROCEDURE [dbo].[RetrieveTask]
+CREATE OR ALTER PROCEDURE [dbo].[RetrieveTask]
 	@taskId nvarchar(50),
 	@agentName nvarchar(200),
 	@task nvarchar(500)
 
 AS
 BEGIN
-    Select Task FROM TaskTracker WHERE TaskId = @taskId and AgentName = @agentName and Task = @task
+    -- Seek on the persisted hash of Task, then confirm the text itself to rule out collisions
+    Select Task FROM TaskTracker
+    WHERE TaskId = @taskId and AgentName = @agentName
+        and TaskHash = CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(@task))) AS BINARY(32)) and Task = @task
 END
+GO
@@ -5,16 +5,15 @@ GO
 SET QUOTED_IDENTIFIER ON
 GO
 
-CREATE PROCEDURE [dbo].[RetrieveTasks]
+CREATE OR ALTER PROCEDURE [dbo].[RetrieveTasks]
     @planId NVARCHAR(50),
-    @taskId NVARCHAR(50)
+    @taskId NVARCHAR(50) = NULL
 AS
 BEGIN
+    -- Without a task id every task in the plan is returned, which is how the task cache loads a plan
     SELECT * FROM TaskTracker
-    WHERE PlanId = @planId AND TaskId = @taskId
+    WHERE PlanId = @planId AND (@taskId IS NULL OR TaskId = @taskId)
 END
-
-select * from TaskTracker
 GO
 
 
@@ -5,17 +5,18 @@ GO
 SET QUOTED_IDENTIFIER ON
 GO
 
-CREATE PROCEDURE [dbo].[SaveToMemory]
+CREATE OR ALTER PROCEDURE [dbo].[SaveToMemory]
     @planId NVARCHAR(50),
     @agentName NVARCHAR(200),
     @taskId NVARCHAR(50),
     @role NVARCHAR(50),
     @message NVARCHAR(MAX),
     @message_type NVARCHAR(50),
-	@fromAgentName NVARCHAR(200)
+	@fromAgentName NVARCHAR(200),
+    @messageId NVARCHAR(50) = NULL
 AS
 BEGIN
-    INSERT INTO MemoryTable (PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent)
-    VALUES (@planId, @agentName, @taskId, @role, @message, @message_type, @fromAgentName)
+    INSERT INTO MemoryTable (PlanId, AgentName, TaskId, Role, Message, MessageType, FromAgent, MessageId)
+    VALUES (@planId, @agentName, @taskId, @role, @message, @message_type, @fromAgentName, @messageId)
 END
 GO
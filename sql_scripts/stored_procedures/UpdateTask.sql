@@ -6,7 +6,7 @@ SET QUOTED_IDENTIFIER ON
 GO
 
 
-CREATE PROCEDURE [dbo].[UpdateTask]
+CREATE OR ALTER PROCEDURE [dbo].[UpdateTask]
     @planId NVARCHAR(50),
 	@taskId NVARCHAR(50),
 	@agentName NVARCHAR(50),
@@ -19,7 +19,8 @@ AS
 BEGIN
     UPDATE TaskTracker
 	Set Status = @status, Detail = @detail, ChatHistory = @chat_history
-    Where AgentName = @agentName and Task = @task
+    Where PlanId = @planId and TaskId = @taskId and AgentName = @agentName
+        and TaskHash = CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(@task))) AS BINARY(32)) and Task = @task
 END
 GO
 
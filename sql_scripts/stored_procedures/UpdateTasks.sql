@@ -0,0 +1,34 @@
+/****** Object:  StoredProcedure [dbo].[UpdateTasks]    Script Date: 6/14/2024 10:02:31 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Bulk UpdateTask for the status block of one agent message: every changed step in one round-trip and one statement.
+-- @updates is a JSON array of {"AgentName": ..., "Task": ..., "Status": ..., "Detail": ..., "ChatHistory": ...} objects;
+-- ChatHistory holds a reference to the message (its message id), not the message itself.
+CREATE OR ALTER PROCEDURE [dbo].[UpdateTasks]
+    @planId NVARCHAR(50),
+	@taskId NVARCHAR(50),
+	@updates NVARCHAR(MAX)
+
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    UPDATE target
+    SET Status = source.Status, Detail = source.Detail, ChatHistory = source.ChatHistory
+    FROM TaskTracker AS target
+    INNER JOIN OPENJSON(@updates)
+    WITH (
+        AgentName NVARCHAR(200) '$.AgentName',
+        Task NVARCHAR(500) '$.Task',
+        Status NVARCHAR(50) '$.Status',
+        Detail NVARCHAR(500) '$.Detail',
+        ChatHistory NVARCHAR(500) '$.ChatHistory'
+    ) AS source
+        ON target.PlanId = @planId AND target.TaskId = @taskId AND target.AgentName = source.AgentName
+            AND target.TaskHash = CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(source.Task))) AS BINARY(32)) AND target.Task = source.Task;
+END
+GO
@@ -0,0 +1,33 @@
+/****** Object:  StoredProcedure [dbo].[UpsertTask]    Script Date: 6/10/2024 10:02:15 AM ******/
+SET ANSI_NULLS ON
+GO
+
+SET QUOTED_IDENTIFIER ON
+GO
+
+-- Idempotent AddTask: inserts the task unless it is already tracked for the plan, in one round-trip.
+-- HOLDLOCK keeps two processes registering the same task from both inserting it.
+-- Returns the new row's id when the task was inserted and no rows when it already existed.
+CREATE OR ALTER PROCEDURE [dbo].[UpsertTask]
+    @planId NVARCHAR(50),
+	@taskId NVARCHAR(50),
+	@agentName NVARCHAR(200),
+	@task NVARCHAR(500)
+
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    MERGE TaskTracker WITH (HOLDLOCK) AS target
+    USING (SELECT @planId AS PlanId, @taskId AS TaskId, @agentName AS AgentName, @task AS Task,
+                  CAST(HASHBYTES('SHA2_256', UPPER(RTRIM(@task))) AS BINARY(32)) AS TaskHash) AS source
+    ON target.PlanId = source.PlanId AND target.TaskId = source.TaskId AND target.AgentName = source.AgentName
+        AND target.TaskHash = source.TaskHash AND target.Task = source.Task
+    WHEN NOT MATCHED THEN
+        INSERT (PlanId, TaskId, AgentName, Task, insert_timestamp, Status, Detail)
+        VALUES (source.PlanId, source.TaskId, source.AgentName, source.Task, getdate(), 'NOT DONE', 'Not started')
+    OUTPUT inserted.id;
+END
+GO
+
+
@@ -5,7 +5,7 @@ GO
 SET QUOTED_IDENTIFIER ON
 GO
 
-CREATE VIEW [dbo].[vAllTasks]
+CREATE OR ALTER VIEW [dbo].[vAllTasks]
 AS
 SELECT        dbo.TaskTracker.*
 FROM            dbo.TaskTracker
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict, List, Optional
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ChatCompletionsStub:
+    """
+    Local stand-in for one Azure OpenAI deployment: answers every POST with a chat completion whose content names
+    the stub and echoes the last user message, after latency seconds. Every throttle_every-th request is answered
+    with a 429 instead (every request when throttle_every is 1). The requests it got are kept for assertions.
+    """
+
+    def __init__(self, name: str, model: str = "gpt-4", latency: float = 0.0, throttle_every: int = 0):
+        """
+        Args:
+            name (str): the stub's name, also its api_key in config.
+            model (Optional, str): the deployment name in config. Default "gpt-4".
+            latency (Optional, float): seconds each completion takes. Default 0.
+            throttle_every (Optional, int): answer every n-th request with a 429. Default 0 (never).
+        """
+        self.name = name
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.requests: List[Dict[str, Any]] = []
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.config = {
+            "model": model,
+            "api_key": name,
+            "api_type": "azure",
+            "api_version": "2024-02-01",
+            "base_url": f"http://127.0.0.1:{self._server.server_port}/",
+        }
+
+    @property
+    def count(self) -> int:
+        return len(self.requests)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "api_key": self.headers.get("api-key"), "body": body})
+                    throttle = stub.throttle_every and len(stub.requests) % stub.throttle_every == 0
+                    if throttle:
+                        stub.throttled += 1
+
+                if throttle:
+                    self._send(429, {"error": {"code": "429", "message": "Rate limit exceeded"}}, {"retry-after": "30"})
+                    return
+
+                time.sleep(stub.latency)
+                self._send(200, {
+                    "id": stub.name, "object": "chat.completion", "created": 0, "model": "gpt-4",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                        "role": "assistant", "content": f"{stub.name}: {body['messages'][-1]['content']}"}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }, {"x-ratelimit-remaining-tokens": "10000"})
+
+            def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def azure_client(config: Dict[str, Any], **kwargs):
+    """An AzureOpenAI client for a stub's config; kwargs go to the client (e.g. http_client)."""
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(api_key=config["api_key"], api_version=config["api_version"], azure_endpoint=config["base_url"],
+                       max_retries=0, **kwargs)
+
+
+def ask(client, question: str, model: str = "gpt-4") -> str:
+    response = client.chat.completions.create(model=model, messages=[{"role": "user", "content": question}])
+    return response.choices[0].message.content
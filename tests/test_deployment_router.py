@@ -0,0 +1,110 @@
+import copy
+import socket
+from urllib.parse import urlsplit
+
+import openai
+import pytest
+
+from utils.deployment_router import DeploymentRouter, balanced_llm_config
+from tests.aoai_stub import ChatCompletionsStub, ask, azure_client
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(name: str, **kwargs) -> ChatCompletionsStub:
+        stub = ChatCompletionsStub(name, **kwargs)
+        started.append(stub)
+        return stub
+
+    yield start
+    for stub in started:
+        stub.close()
+
+
+def routed_client(router: DeploymentRouter, config):
+    return azure_client(config, http_client=router.http_client)
+
+
+def deployment_name(config) -> str:
+    return f"{config['model']}@{urlsplit(config['base_url']).netloc}"
+
+
+def closed_port_config(model: str = "gpt-4"):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return {"model": model, "api_key": "down", "api_version": "2024-02-01", "base_url": f"http://127.0.0.1:{port}/"}
+
+
+def test_requests_move_to_the_faster_deployment(stubs):
+    slow = stubs("slow", latency=0.2)
+    fast = stubs("fast")
+    router = DeploymentRouter([slow.config, fast.config])
+    # The client is built for the first deployment, as a plain config list would use it
+    client = routed_client(router, slow.config)
+
+    answers = [ask(client, f"question {i}") for i in range(10)]
+
+    assert all(answer.endswith(f"question {i}") for i, answer in enumerate(answers))
+    assert slow.count == 1
+    assert fast.count == 9
+    # Each deployment gets its own api-key
+    assert {request["api_key"] for request in fast.requests} == {"fast"}
+
+
+def test_throttled_deployment_fails_over_and_cools_down(stubs):
+    throttled = stubs("throttled", throttle_every=1)
+    healthy = stubs("healthy", latency=0.05)
+    router = DeploymentRouter([throttled.config, healthy.config])
+    client = routed_client(router, throttled.config)
+
+    assert ask(client, "first") == "healthy: first"
+    assert ask(client, "second") == "healthy: second"
+
+    # The 429's Retry-After keeps the throttled deployment out of the second request
+    assert throttled.count == 1
+    stats = router.stats()[deployment_name(throttled.config)]
+    assert stats["cooling_down"] and stats["failures"] == 1
+
+
+def test_last_429_is_returned_when_every_deployment_is_throttled(stubs):
+    first = stubs("first", throttle_every=1)
+    second = stubs("second", throttle_every=1)
+    router = DeploymentRouter([first.config, second.config])
+
+    with pytest.raises(openai.RateLimitError):
+        ask(routed_client(router, first.config), "question")
+    assert first.count == 1 and second.count == 1
+
+
+def test_unreachable_deployment_fails_over(stubs):
+    down = closed_port_config()
+    up = stubs("up")
+    router = DeploymentRouter([down, up.config])
+
+    assert ask(routed_client(router, down), "question") == "up: question"
+    assert up.count == 1
+
+
+def test_other_models_and_unknown_hosts_are_not_rerouted(stubs):
+    gpt4 = stubs("gpt4")
+    gpt35 = stubs("gpt35", model="gpt-35-turbo")
+    other = stubs("other")
+    router = DeploymentRouter([gpt4.config, gpt35.config])
+
+    ask(routed_client(router, gpt35.config), "question", model="gpt-35-turbo")
+    ask(routed_client(router, other.config), "question")
+
+    assert gpt35.count == 1 and other.count == 1 and gpt4.count == 0
+
+
+def test_balanced_llm_config_shares_the_router_client(stubs):
+    stub = stubs("stub")
+    llm_config = balanced_llm_config([stub.config], timeout=30)
+
+    assert llm_config["timeout"] == 30
+    assert llm_config["config_list"][0]["model"] == "gpt-4"
+    # autogen deep-copies llm_config; the copy must still go through the router
+    assert copy.deepcopy(llm_config)["config_list"][0]["http_client"] is llm_config["config_list"][0]["http_client"]
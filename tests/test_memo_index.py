@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from capabilities.memo_index import MemoIndex, NumpyMemoIndex
+
+
+def random_memos(count: int, dim: int = 32, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ids = [str(i) for i in range(count)]
+    return ids, [f"memo {i}" for i in ids], rng.normal(size=(count, dim))
+
+
+def all_distances(embeddings, queries):
+    # Every distance, in float64
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return 2.0 - 2.0 * queries @ embeddings.T
+
+
+def brute_force(embeddings, queries, k: int):
+    distances = all_distances(embeddings, queries)
+    order = np.argsort(distances, axis=1)[:, :k]
+    return order, np.take_along_axis(distances, order, axis=1)
+
+
+@pytest.mark.parametrize("k", [1, 5, 37, 300])
+def test_top_k_matches_brute_force(k):
+    ids, documents, embeddings = random_memos(300)
+    queries = np.random.default_rng(1).normal(size=(20, 32))
+    index = NumpyMemoIndex()
+    index.add(ids, documents, embeddings)
+
+    results = index.query(queries, n_results=k)
+    distances = all_distances(embeddings, queries)
+    _, expected_distances = brute_force(embeddings, queries, k)
+
+    for q in range(len(queries)):
+        rows = [int(uid) for uid in results["ids"][q]]
+        assert len(set(rows)) == k
+        assert results["documents"][q] == [documents[row] for row in rows]
+        # The k smallest distances, nearest first, each reported for the memo it belongs to; float32 may only
+        # swap memos whose distances tie
+        np.testing.assert_allclose(results["distances"][q], expected_distances[q], atol=1e-5)
+        np.testing.assert_allclose(distances[q][rows], results["distances"][q], atol=1e-5)
+
+
+def test_more_results_than_memos_returns_them_all_in_order():
+    ids, documents, embeddings = random_memos(7)
+    index = NumpyMemoIndex()
+    index.add(ids, documents, embeddings)
+
+    results = index.query(embeddings[:1], n_results=10)
+    expected, _ = brute_force(embeddings, embeddings[:1], 7)
+    # Few enough random memos that no two distances tie
+    assert results["ids"][0] == [ids[row] for row in expected[0]]
+    assert results["ids"][0][0] == "0"
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_max_distance_keeps_only_closer_memos():
+    ids, documents, embeddings = random_memos(200)
+    queries = np.random.default_rng(2).normal(size=(10, 32))
+    index = NumpyMemoIndex()
+    index.add(ids, documents, embeddings)
+
+    results = index.query(queries, n_results=50, max_distance=1.8)
+    expected, expected_distances = brute_force(embeddings, queries, 50)
+    for q in range(len(queries)):
+        closer = expected[q][expected_distances[q] < 1.8]
+        assert results["ids"][q] == [ids[row] for row in closer]
+
+
+def test_empty_index_returns_empty_results():
+    results = NumpyMemoIndex().query([[1.0, 0.0]], n_results=3)
+    assert results == {"ids": [[]], "documents": [[]], "distances": [[]]}
+
+
+def test_update_replaces_document_and_vector():
+    index = NumpyMemoIndex()
+    index.add(["a", "b"], ["first", "second"], [[1.0, 0.0], [0.0, 1.0]])
+    index.update(["a"], ["moved"], [[0.0, -1.0]])
+
+    results = index.query([[0.0, -1.0]], n_results=1)
+    assert results["ids"] == [["a"]] and results["documents"] == [["moved"]]
+
+
+def test_dimension_mismatch_is_rejected():
+    index = NumpyMemoIndex()
+    index.add(["a"], ["first"], [[1.0, 0.0]])
+    with pytest.raises(ValueError):
+        index.add(["b"], ["second"], [[1.0, 0.0, 0.0]])
+
+
+def test_saved_index_reopens_with_the_same_results(tmp_path):
+    # More memos than the initial capacity, so the vector file grows while memos are added
+    ids, documents, embeddings = random_memos(150)
+    queries = np.random.default_rng(3).normal(size=(5, 32))
+    path = str(tmp_path / "memos_index")
+    index = NumpyMemoIndex(path)
+    for start in range(0, 150, 40):
+        index.add(ids[start:start + 40], documents[start:start + 40], embeddings[start:start + 40])
+    index.save()
+    before = index.query(queries, n_results=10)
+
+    reopened = NumpyMemoIndex(path)
+    assert reopened.count() == 150
+    assert reopened.query(queries, n_results=10) == before
+
+
+def test_memo_index_uses_numpy_for_a_new_store(tmp_path):
+    ids, documents, embeddings = random_memos(20)
+    store = MemoIndex(str(tmp_path), kind="auto")
+    store.add(ids, documents, embeddings)
+    store.save()
+
+    assert store.backend == "numpy"
+    assert MemoIndex(str(tmp_path)).query(embeddings[3:4], n_results=1)["ids"] == [["3"]]
+
+    store.reset()
+    assert store.count() == 0
+    assert not NumpyMemoIndex.exists(str(tmp_path / "memos_index"))
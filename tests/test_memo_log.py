@@ -0,0 +1,143 @@
+import os
+
+import pytest
+
+from capabilities import memo_log
+from capabilities.memo_log import MemoLog
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memos")
+
+
+def reopen(log: MemoLog) -> MemoLog:
+    log.close()
+    return MemoLog(log.path)
+
+
+def test_memos_survive_reopening(path):
+    log = MemoLog(path)
+    log["1"] = ("input one", "output one")
+    log[2] = ("input two", "output ü")
+    log["1"] = ("input one", "output one, updated")
+    del log[2]
+    log["3"] = ("", "")
+    log.flush()
+
+    log = reopen(log)
+    assert sorted(log.keys()) == ["1", "3"]
+    assert log["1"] == ("input one", "output one, updated")
+    assert log[3] == ("", "")
+    assert log.get("2") is None
+    with pytest.raises(KeyError):
+        del log["2"]
+
+
+def test_compaction_keeps_only_live_memos(path):
+    log = MemoLog(path)
+    for version in range(3):
+        for uid in range(100):
+            log[uid] = (f"input {uid}", f"output {uid} v{version}")
+    for uid in range(0, 100, 2):
+        del log[uid]
+    size_before = os.path.getsize(path + ".log")
+
+    log.compact()
+
+    assert os.path.getsize(path + ".log") < size_before / 3
+    assert log._entries == len(log) == 50
+    log = reopen(log)
+    assert sorted(log.keys(), key=int) == [str(uid) for uid in range(1, 100, 2)]
+    assert all(log[uid] == (f"input {uid}", f"output {uid} v2") for uid in range(1, 100, 2))
+
+
+def test_flush_compacts_once_half_the_entries_are_dead(path):
+    log = MemoLog(path)
+    for uid in range(memo_log.MIN_DEAD):
+        log[uid] = ("input", "first")
+    log.flush()
+    assert log._entries == memo_log.MIN_DEAD
+
+    for uid in range(memo_log.MIN_DEAD):
+        log[uid] = ("input", "second")
+    log.flush()
+
+    assert log._entries == memo_log.MIN_DEAD
+    assert log[0] == ("input", "second")
+
+
+def test_cut_short_log_record_is_dropped(path):
+    log = MemoLog(path)
+    log["1"] = ("input one", "output one")
+    log["2"] = ("input two", "output two")
+    log.close()
+    # The tail of the last record never reached the disk
+    with open(path + ".log", "r+b") as f:
+        f.truncate(os.path.getsize(path + ".log") - 3)
+
+    log = MemoLog(path)
+    assert log.keys() == ["1"]
+    assert log["1"] == ("input one", "output one")
+
+    # The recovered log takes new writes
+    log["3"] = ("input three", "output three")
+    log = reopen(log)
+    assert sorted(log.keys()) == ["1", "3"]
+    assert log["3"] == ("input three", "output three")
+
+
+def test_partial_index_entry_is_dropped(path):
+    log = MemoLog(path)
+    log["1"] = ("input one", "output one")
+    log["2"] = ("input two", "output two")
+    log.close()
+    with open(path + ".idx", "r+b") as f:
+        f.truncate(os.path.getsize(path + ".idx") - 5)
+
+    log = MemoLog(path)
+    assert log.keys() == ["1"]
+    log["4"] = ("input four", "output four")
+    log = reopen(log)
+    assert sorted(log.keys()) == ["1", "4"]
+    assert log["4"] == ("input four", "output four")
+
+
+def test_missing_index_is_rebuilt_from_a_compacted_log(path):
+    log = MemoLog(path)
+    for uid in range(10):
+        log[uid] = ("input", f"output {uid}")
+    log.compact()
+    log.close()
+    # As if a compaction stopped after swapping in the log
+    os.remove(path + ".idx")
+
+    log = MemoLog(path)
+    assert len(log) == 10
+    assert log["9"] == ("input", "output 9")
+
+
+def test_index_of_another_generation_is_rebuilt(path):
+    log = MemoLog(path)
+    log["1"] = ("input", "old")
+    log.close()
+    stale_index = open(path + ".idx", "rb").read()
+
+    log = MemoLog(path)
+    log["1"] = ("input", "new")
+    log.compact()
+    log.close()
+    # The new log next to the index from before the compaction
+    with open(path + ".idx", "wb") as f:
+        f.write(stale_index)
+
+    log = MemoLog(path)
+    assert log["1"] == ("input", "new")
+
+
+def test_clear_removes_every_memo(path):
+    log = MemoLog(path)
+    log["1"] = ("input", "output")
+    log.clear()
+    assert len(log) == 0
+    assert len(reopen(log)) == 0
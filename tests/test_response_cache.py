@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from domain_knowledge import response_cache
+from domain_knowledge.response_cache import ResponseCache, cache_scope, normalize_prompt
+from tests.aoai_stub import ChatCompletionsStub, ask, azure_client
+
+
+def data_sources(strictness: int = 3, key: str = "secret"):
+    return [{"type": "azure_search", "parameters": {"index_name": "plans", "strictness": strictness,
+                                                    "authentication": {"type": "api_key", "key": key}}}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def stub():
+    stub = ChatCompletionsStub("stub")
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def embed_by_topic(text: str):
+    # Prompts about the same first word point the same way, nudged by their length
+    vector = np.zeros(8)
+    vector[sum(map(ord, text.split()[0])) % 7] = 1.0
+    vector[7] = 0.01 * len(text)
+    return vector
+
+
+def test_normalize_prompt_ignores_case_width_and_whitespace():
+    assert normalize_prompt("  What is\tthe  PLAN? ") == normalize_prompt("what is the plan?")
+    assert normalize_prompt("ＰＬＡＮ") == "plan"
+
+
+def test_scope_covers_model_and_strictness_but_not_the_key():
+    assert cache_scope("gpt-4", data_sources(key="a")) == cache_scope("gpt-4", data_sources(key="b"))
+    assert cache_scope("gpt-4", data_sources(strictness=3)) != cache_scope("gpt-4", data_sources(strictness=5))
+    assert cache_scope("gpt-4", data_sources()) != cache_scope("gpt-35-turbo", data_sources())
+
+
+def test_repeated_question_is_answered_from_the_cache(tmp_path, stub):
+    client = azure_client(stub.config)
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+    scope = cache_scope("gpt-4", data_sources())
+
+    first = cache.get_or_compute("What is the plan?", scope, lambda: ask(client, "What is the plan?"))
+    second = cache.get_or_compute("  what is THE plan? ", scope, lambda: ask(client, "what is THE plan?"))
+
+    assert first == second == "stub: What is the plan?"
+    assert stub.count == 1
+    assert cache.stats.as_dict()["hits"] == 1 and cache.stats.as_dict()["misses"] == 1
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_other_strictness_reaches_the_service(tmp_path, stub):
+    client = azure_client(stub.config)
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+
+    for strictness in (3, 5, 3):
+        cache.get_or_compute("What is the plan?", cache_scope("gpt-4", data_sources(strictness)), lambda: ask(client, "What is the plan?"))
+
+    assert stub.count == 2
+
+
+def test_cache_persists_across_instances(tmp_path, stub):
+    client = azure_client(stub.config)
+    path = str(tmp_path / "cache.db")
+    scope = cache_scope("gpt-4", data_sources())
+    ResponseCache(path=path).get_or_compute("What is the plan?", scope, lambda: ask(client, "What is the plan?"))
+
+    reopened = ResponseCache(path=path)
+    assert reopened.get_or_compute("What is the plan?", scope, lambda: ask(client, "What is the plan?")) == "stub: What is the plan?"
+    assert stub.count == 1
+    assert reopened.stats.hits == 1
+
+
+def test_failed_call_is_not_cached(tmp_path, stub):
+    stub.throttle_every = 1
+    client = azure_client(stub.config)
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+
+    with pytest.raises(Exception):
+        cache.get_or_compute("What is the plan?", "scope", lambda: ask(client, "What is the plan?"))
+    stub.throttle_every = 0
+    assert cache.get_or_compute("What is the plan?", "scope", lambda: ask(client, "What is the plan?")) == "stub: What is the plan?"
+    assert stub.count == 2
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), ttl=60)
+    cache.put("question", "scope", "answer")
+
+    clock.now += 60
+    assert cache.get("question", "scope") == "answer"
+    clock.now += 1
+    assert cache.get("question", "scope") is None
+    assert cache.stats.expired == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), max_entries=2)
+    cache.put("a", "scope", "A")
+    clock.now += 1
+    cache.put("b", "scope", "B")
+    clock.now += 1
+    # Reading a makes b the least recently used
+    assert cache.get("a", "scope") == "A"
+    clock.now += 1
+    cache.put("c", "scope", "C")
+
+    assert cache.get("a", "scope") == "A"
+    assert cache.get("b", "scope") is None
+    assert cache.get("c", "scope") == "C"
+    assert cache.stats.evictions == 1
+
+
+def test_semantic_tier_answers_similar_prompts_of_the_same_scope(tmp_path, stub):
+    client = azure_client(stub.config)
+    embedded = []
+
+    def embed(text):
+        embedded.append(text)
+        return embed_by_topic(text)
+
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), embed=embed, similarity_threshold=0.99)
+    cache.get_or_compute("budget for the launch", "scope", lambda: ask(client, "budget for the launch"))
+    # One embedding per prompt, shared by the lookup and the entry added
+    assert len(embedded) == 1
+
+    assert cache.get_or_compute("budget for the launch?", "scope", lambda: ask(client, "budget for the launch?")) == "stub: budget for the launch"
+    assert cache.stats.semantic_hits == 1
+    assert cache.get_or_compute("timeline for the launch", "scope", lambda: ask(client, "timeline for the launch")) == "stub: timeline for the launch"
+    assert cache.get("budget for the launch?", "other scope") is None
+    assert stub.count == 2
+
+
+def test_semantic_tier_skips_expired_and_evicted_entries(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), embed=embed_by_topic, similarity_threshold=0.99, ttl=60, max_entries=1)
+    cache.put("budget for the launch", "scope", "budget")
+    assert cache.get("budget for the launch?", "scope") == "budget"
+
+    clock.now += 61
+    assert cache.get("budget for the launch?", "scope") is None
+
+    cache.put("budget for the launch", "scope", "budget")
+    clock.now += 1
+    cache.put("timeline for the launch", "scope", "timeline")
+    assert cache.get("budget for the launch?", "scope") is None
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from utils.step_extractor import StepStatusError, StepStatusExtractor, extract_step_statuses, validate_step_statuses
+
+STATUS_BLOCK = '{"Steps": [{"STEP": "Collect the requirements", "STATUS": "done", "DETAIL": "Signed off"}, {"STEP": "Draft the plan", "STATUS": "IN_PROGRESS"}]}'
+EXPECTED_STEPS = [
+    {"STEP": "Collect the requirements", "STATUS": "DONE", "DETAIL": "Signed off"},
+    {"STEP": "Draft the plan", "STATUS": "IN_PROGRESS", "DETAIL": ""},
+]
+
+
+def test_block_after_prose_with_equals_signs_and_braces():
+    text = f'Budget = 5 {{approx}} and "quoted = text".\nThe plan is underway.\n=\n{STATUS_BLOCK}'
+    block = extract_step_statuses({"content": text})
+
+    assert block.steps == EXPECTED_STEPS
+    assert block.rejected == []
+    assert block.body == 'Budget = 5 {approx} and "quoted = text".\nThe plan is underway.'
+
+
+def test_json_mode_content_is_the_block():
+    block = extract_step_statuses(STATUS_BLOCK)
+    assert block.steps == EXPECTED_STEPS
+    assert block.body == ""
+
+
+def test_last_valid_block_wins():
+    earlier = '{"Steps": [{"STEP": "Collect the requirements", "STATUS": "TODO"}]}'
+    invalid = '{"Steps": "none"}'
+    block = extract_step_statuses(f"Before: {earlier}\nNow: {STATUS_BLOCK}\nIgnored: {invalid}")
+    assert block.steps == EXPECTED_STEPS
+
+
+def test_nested_object_is_not_a_block_of_its_own():
+    text = '{"Report": {"Steps": [{"STEP": "Inner", "STATUS": "DONE"}]}, "Steps": [{"STEP": "Outer", "STATUS": "TODO"}]}'
+    block = extract_step_statuses("Summary\n" + text)
+    assert [step["STEP"] for step in block.steps] == ["Outer"]
+
+
+def test_message_without_a_block():
+    assert extract_step_statuses("All done = nothing to report {really}") is None
+    assert extract_step_statuses({"content": None}) is None
+    assert extract_step_statuses('{"Steps": [{"STEP": "Draft the plan", "STATUS": "FINISHED"}]}') is None
+
+
+def test_invalid_steps_are_dropped_and_reported():
+    text = '{"Steps": [{"STEP": "Draft the plan", "STATUS": "DONE"}, {"STEP": "", "STATUS": "DONE"}, {"STEP": "Review", "STATUS": "LATER"}, "text"]}'
+    block = extract_step_statuses(text)
+
+    assert block.steps == [{"STEP": "Draft the plan", "STATUS": "DONE", "DETAIL": ""}]
+    assert len(block.rejected) == 3
+    assert "LATER" in block.rejected[1]
+
+
+def test_validate_rejects_objects_without_steps():
+    with pytest.raises(StepStatusError):
+        validate_step_statuses({"steps": []})
+    with pytest.raises(StepStatusError):
+        validate_step_statuses({"Steps": [{"STEP": "Draft the plan"}]})
+    assert validate_step_statuses({"Steps": []}) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17])
+def test_streamed_chunks_give_the_same_block(chunk_size):
+    text = f'Progress so far: {{"note": "a \\"}}\\" b"}} = ok\n{STATUS_BLOCK}\nThanks'
+    extractor = StepStatusExtractor()
+    for start in range(0, len(text), chunk_size):
+        extractor.feed(text[start:start + chunk_size])
+
+    block = extractor.result()
+    assert block.steps == EXPECTED_STEPS
+    assert json.loads(text[block.start:block.end]) == json.loads(STATUS_BLOCK)
+    assert block.body == 'Progress so far: {"note": "a \\"}\\" b"} = ok\nThanks'
+
+
+def test_result_follows_later_chunks():
+    extractor = StepStatusExtractor()
+    extractor.feed("Working on it.\n")
+    assert extractor.result() is None
+    extractor.feed(STATUS_BLOCK)
+    assert extractor.result().steps == EXPECTED_STEPS
@@ -1,8 +1,9 @@
 from typing import Annotated
-from domain_knowledge.direct_aoai import retrieve_llm_response_on_question
+from domain_knowledge.batch_query import get_domain_knowledge_queries
 
 def call_aoai(question: Annotated[str, 'Question to be asked against domain knowledge']) -> str:
-    response = retrieve_llm_response_on_question(question)
+    # Shares the concurrency and rate limits with every other agent of the process, and the answer with any agent asking the same
+    response = get_domain_knowledge_queries().ask(question)
 
     return response
     #return "you need flour and eggs"
\ No newline at end of file
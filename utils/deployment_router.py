@@ -0,0 +1,288 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+# The HTTP library openai is built on and installs, so no other HTTP client is needed
+import httpx2
+
+# Weight of the newest sample in the moving averages of latency and error rate
+DEFAULT_EWMA_ALPHA = 0.3
+# How much a fully failing deployment's score is inflated over a healthy one's
+ERROR_PENALTY = 4.0
+# Quota fraction below which a deployment's score stops improving, so it is avoided but not excluded
+MIN_QUOTA_FRACTION = 0.05
+# Latency assumed for a deployment that has not answered yet, in seconds
+UNTRIED_LATENCY = 0.001
+# Cool-down after a 429 without Retry-After, or after a connection failure, in seconds
+DEFAULT_COOLDOWN = 10.0
+
+# Same connection limits as openai's default client
+CONNECTION_LIMITS = httpx2.Limits(max_connections=1000, max_keepalive_connections=100)
+
+ROUTED_OPERATION = "chat/completions"
+
+
+class Deployment:
+    """One entry of the config list, with the live statistics it is routed on."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.model = config["model"]
+        url = urlsplit(config["base_url"])
+        self.scheme = url.scheme
+        self.host = url.netloc
+        # autogen removes the dots from Azure deployment names
+        self.path_name = self.model.replace(".", "")
+
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.remaining_tokens: Optional[float] = None
+        self.max_remaining_tokens: Optional[float] = None
+        self.cooldown_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.host}"
+
+    def quota_fraction(self) -> float:
+        if self.remaining_tokens is None or not self.max_remaining_tokens:
+            return 1.0
+        return max(MIN_QUOTA_FRACTION, self.remaining_tokens / self.max_remaining_tokens)
+
+    def score(self, now: float) -> float:
+        """Expected cost of sending one more request here; lower is better."""
+        # Untried deployments go first, so every deployment gets measured
+        latency = self.latency if self.latency is not None else UNTRIED_LATENCY
+        score = latency * (1 + self.in_flight) * (1 + ERROR_PENALTY * self.error_rate) / self.quota_fraction()
+        if now < self.cooldown_until:
+            score += 1e6 * (self.cooldown_until - now)
+        return score
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "remaining_tokens": self.remaining_tokens,
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+class DeploymentRouter:
+    """
+    Spreads chat completions over every deployment of the config list that serves the requested model
+    (the same "model" on several resources or regions), by live latency, in-flight requests, error rate and the
+    remaining token quota the service reports. A 429 puts the deployment in cool-down for its Retry-After and
+    the request is sent to the next best deployment; when they are all throttled, the last 429 is returned so
+    the caller's own backoff applies.
+
+    The routing happens in the HTTP transport, so every client built on http_client is balanced: the autogen
+    agents (balanced_llm_config) and direct_aoai (the client registry) alike.
+    """
+
+    def __init__(self, config_list: Optional[List[Dict[str, Any]]] = None, ewma_alpha: float = DEFAULT_EWMA_ALPHA,
+                 transport=None):
+        """
+        Args:
+            config_list (Optional, List[Dict]): the deployments. More can be added with add_deployments.
+            ewma_alpha (Optional, float): weight of the newest sample in the latency and error averages. Default 0.3.
+            transport (Optional, httpx2.BaseTransport): transport the requests are sent on. Defaults to a pooled HTTPTransport.
+        """
+        self.ewma_alpha = ewma_alpha
+        self.deployments: List[Deployment] = []
+        self._lock = threading.Lock()
+        self.transport = RoutingTransport(self, transport or httpx2.HTTPTransport(limits=CONNECTION_LIMITS))
+        self.http_client = RoutedHttpClient(transport=self.transport)
+        self.add_deployments(config_list or [])
+
+    def add_deployments(self, config_list: List[Dict[str, Any]]):
+        with self._lock:
+            known = {(deployment.host, deployment.model) for deployment in self.deployments}
+            for config in config_list:
+                if "base_url" in config and (urlsplit(config["base_url"]).netloc, config["model"]) not in known:
+                    self.deployments.append(Deployment(config))
+                    known.add((urlsplit(config["base_url"]).netloc, config["model"]))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {deployment.name: deployment.as_dict() for deployment in self.deployments}
+
+    def find(self, host: str, path_name: str) -> Optional[Deployment]:
+        for deployment in self.deployments:
+            if deployment.host == host and deployment.path_name == path_name:
+                return deployment
+        return None
+
+    def acquire(self, requested: Deployment, exclude: List[Deployment]) -> Optional[Deployment]:
+        """Picks the best deployment of the requested one's model, other than those already tried, and counts it in flight."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [d for d in self.deployments if d.path_name == requested.path_name and d not in exclude]
+            if not candidates:
+                return None
+            deployment = min(candidates, key=lambda d: d.score(now))
+            deployment.in_flight += 1
+            deployment.requests += 1
+            return deployment
+
+    def release(self, deployment: Deployment, latency: Optional[float], response=None):
+        """Records the outcome of a request: its latency, whether it failed and the quota left."""
+        with self._lock:
+            deployment.in_flight -= 1
+            failed = response is None or response.status_code == 429 or response.status_code >= 500
+            deployment.error_rate += self.ewma_alpha * ((1.0 if failed else 0.0) - deployment.error_rate)
+            if failed:
+                deployment.failures += 1
+
+            if response is None:
+                deployment.cooldown_until = time.monotonic() + DEFAULT_COOLDOWN
+                return
+
+            if not failed and latency is not None:
+                deployment.latency = latency if deployment.latency is None else deployment.latency + self.ewma_alpha * (latency - deployment.latency)
+
+            remaining = _header_float(response, "x-ratelimit-remaining-tokens")
+            if remaining is not None:
+                deployment.remaining_tokens = remaining
+                deployment.max_remaining_tokens = max(remaining, deployment.max_remaining_tokens or 0)
+
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                deployment.cooldown_until = time.monotonic() + (retry_after if retry_after is not None else DEFAULT_COOLDOWN)
+                deployment.remaining_tokens = 0
+
+
+class RoutingTransport(httpx2.BaseTransport):
+    """HTTP transport that sends chat completions of known deployments to the deployment the router picks."""
+
+    def __init__(self, router: DeploymentRouter, transport):
+        self.router = router
+        self.transport = transport
+
+    def handle_request(self, request):
+        requested = self._requested_deployment(request)
+        if requested is None:
+            return self.transport.handle_request(request)
+
+        # The body is sent again on failover, so it is read up front
+        request.read()
+        tried: List[Deployment] = []
+        throttled = None
+        error = None
+        while True:
+            deployment = self.router.acquire(requested, tried)
+            if deployment is None:
+                # Every deployment of the model was tried
+                if throttled is not None:
+                    return throttled
+                raise error
+            tried.append(deployment)
+
+            start = time.monotonic()
+            try:
+                response = self.transport.handle_request(self._rewrite(request, requested, deployment))
+            except httpx2.TransportError as e:
+                self.router.release(deployment, None)
+                error = e
+                continue
+            self.router.release(deployment, time.monotonic() - start, response)
+
+            if throttled is not None:
+                # Reading the short error body first lets its connection go back to the pool
+                throttled.read()
+                throttled.close()
+            if response.status_code != 429:
+                return response
+            throttled = response
+
+    def close(self):
+        self.transport.close()
+
+    def _requested_deployment(self, request) -> Optional[Deployment]:
+        path = request.url.path
+        if not path.endswith("/" + ROUTED_OPERATION):
+            return None
+        # /openai/deployments/<deployment>/chat/completions
+        parts = path.split("/")
+        if "deployments" not in parts[:-1]:
+            return None
+        path_name = parts[parts.index("deployments") + 1]
+        return self.router.find(_netloc(request.url), path_name)
+
+    def _rewrite(self, request, requested: Deployment, deployment: Deployment):
+        if deployment is requested:
+            return request
+
+        params = request.url.params
+        if "api_version" in deployment.config:
+            params = params.set("api-version", deployment.config["api_version"])
+        url = httpx2.URL(f"{deployment.scheme}://{deployment.host}{request.url.path}", params=params)
+
+        headers = request.headers.copy()
+        # The Host header is set again from the new URL
+        del headers["host"]
+        if "api-key" in headers and deployment.config.get("api_key"):
+            headers["api-key"] = deployment.config["api_key"]
+
+        return httpx2.Request(request.method, url, headers=headers, content=request.content, extensions=request.extensions)
+
+
+class RoutedHttpClient(httpx2.Client):
+    """HTTP client on the routing transport. autogen deep-copies llm_config, so copies share this client."""
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _netloc(url) -> str:
+    netloc = url.netloc
+    return netloc.decode("ascii") if isinstance(netloc, bytes) else netloc
+
+
+def _header_float(response, name: str) -> Optional[float]:
+    try:
+        value = response.headers.get(name)
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(response) -> Optional[float]:
+    retry_after_ms = _header_float(response, "retry-after-ms")
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000.0
+    return _header_float(response, "retry-after")
+
+
+_router: Optional[DeploymentRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_deployment_router() -> DeploymentRouter:
+    """Returns the process-wide router, shared by every balanced client."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = DeploymentRouter()
+    return _router
+
+
+def balanced_llm_config(config_list: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+    """
+    Returns an autogen llm_config whose requests go through the process-wide router, so chat completions are
+    spread over every deployment of the config list instead of always going to the first one.
+
+    Args:
+        config_list (List[Dict]): the deployments, e.g. from autogen.config_list_from_json.
+        **kwargs: other llm_config settings, such as timeout or cache_seed.
+    """
+    router = get_deployment_router()
+    router.add_deployments(config_list)
+    return {"config_list": [dict(config, http_client=router.http_client) for config in config_list], **kwargs}
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from termcolor import colored
+
+# Runs a node given its name and the results of its prerequisites, keyed by prerequisite name
+NodeRunner = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class PlanScheduler:
+    """
+    Runs the nodes of a plan (e.g. its group chats) as a DAG: a node starts as soon as all of its prerequisites
+    have finished, independent nodes run concurrently up to max_concurrency, and each node only sees the
+    results of its own prerequisites.
+    """
+
+    def __init__(self, prerequisites: Dict[str, List[str]], max_concurrency: Optional[int] = None):
+        """
+        Args:
+            prerequisites (Dict[str, List[str]]): the names of the nodes each node depends on, for every node of the plan.
+            max_concurrency (Optional, int): maximum number of nodes running at once. Unlimited by default.
+        """
+        self.prerequisites = {name: list(deps or []) for name, deps in prerequisites.items()}
+        self.max_concurrency = max_concurrency
+        self.order = self._topological_order()
+        self.durations: Dict[str, float] = {}
+        self.wall_clock: Optional[float] = None
+
+    def _topological_order(self) -> List[str]:
+        for name, deps in self.prerequisites.items():
+            unknown = [dep for dep in deps if dep not in self.prerequisites]
+            if unknown:
+                raise ValueError(f"'{name}' depends on unknown plan node(s): {', '.join(map(str, unknown))}")
+
+        remaining = {name: set(deps) for name, deps in self.prerequisites.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Plan has a dependency cycle between: {', '.join(map(str, remaining))}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    async def run(self, run_node: NodeRunner) -> Dict[str, Any]:
+        """Runs every node and returns their results keyed by name."""
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_when_ready(name: str):
+            deps = self.prerequisites[name]
+            results = await asyncio.gather(*[tasks[dep] for dep in deps])
+            prerequisite_results = dict(zip(deps, results))
+
+            if semaphore is not None:
+                await semaphore.acquire()
+            try:
+                start = time.perf_counter()
+                result = await run_node(name, prerequisite_results)
+                self.durations[name] = time.perf_counter() - start
+                print(colored(f"{name} finished in {self.durations[name]:.1f}s", "light_green"))
+                return result
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+
+        start = time.perf_counter()
+        # Topological order guarantees every prerequisite's task exists before its dependents are created
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(run_when_ready(name))
+
+        results = await asyncio.gather(*tasks.values())
+        self.wall_clock = time.perf_counter() - start
+
+        print(colored(f"Plan finished in {self.wall_clock:.1f}s wall-clock "
+                      f"({sum(self.durations.values()):.1f}s of node time)", "light_green"))
+        return dict(zip(tasks.keys(), results))
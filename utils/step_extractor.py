@@ -0,0 +1,185 @@
+import json
+from typing import Any, Dict, List, Optional, Union
+
+# Statuses an agent may report for a step
+VALID_STATUSES = ("DONE", "IN_PROGRESS", "BLOCKED", "TODO")
+
+
+class StepStatusError(ValueError):
+    """Raised when a status block does not match the {"Steps": [...]} schema."""
+
+
+def validate_step_statuses(value: Any, rejected: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """
+    Validates a decoded {"Steps": [{"STEP", "STATUS", "DETAIL"}]} object and returns its valid steps, with the status
+    upper-cased and a missing DETAIL as "". A step that does not match is left out, and why is appended to rejected.
+    Raises StepStatusError when the object has no "Steps" array, or when it has steps and none of them is valid.
+
+    Args:
+        value (Any): the decoded object.
+        rejected (Optional, List[str]): collects a description of each step left out.
+    """
+    if not isinstance(value, dict) or not isinstance(value.get("Steps"), list):
+        raise StepStatusError('Expected an object with a "Steps" array')
+
+    steps = []
+    errors = []
+    for i, step in enumerate(value["Steps"]):
+        if not isinstance(step, dict):
+            errors.append(f"Step {i} is not an object")
+            continue
+        if not isinstance(step.get("STEP"), str) or not step["STEP"].strip():
+            errors.append(f'Step {i} has no "STEP"')
+            continue
+        status = str(step.get("STATUS", "")).strip().upper()
+        if status not in VALID_STATUSES:
+            errors.append(f"Step {i} ({step['STEP']}) has an invalid status: {step.get('STATUS')}")
+            continue
+        detail = step.get("DETAIL")
+        steps.append({"STEP": step["STEP"], "STATUS": status, "DETAIL": "" if detail is None else str(detail)})
+
+    if errors and not steps:
+        raise StepStatusError("; ".join(errors))
+    if rejected is not None:
+        rejected.extend(errors)
+    return steps
+
+
+class StepStatusBlock:
+    """A validated status block and where it was found in the message text."""
+
+    def __init__(self, steps: List[Dict[str, str]], text: str, start: int, end: int, rejected: Optional[List[str]] = None):
+        """
+        Args:
+            steps (List[Dict]): the validated steps.
+            text (str): the message text.
+            start (int), end (int): offsets of the block in text.
+            rejected (Optional, List[str]): why each step of the block that did not validate was left out.
+        """
+        self.steps = steps
+        self.rejected = rejected or []
+        self.start = start
+        self.end = end
+        self._text = text
+
+    @property
+    def body(self) -> str:
+        """The message without the status block and its = delimiter."""
+        return (self._text[:self.start].rstrip().rstrip("=").rstrip() + self._text[self.end:]).rstrip()
+
+
+class StepStatusExtractor:
+    """
+    Finds the last balanced JSON object with a "Steps" array in text fed to it chunk by chunk, as the tokens of a
+    streamed reply arrive. Every character is scanned once, tracking brace depth and JSON strings, so "=" or braces
+    in the prose around the block do not matter; only the complete objects that mention "Steps" are decoded,
+    last first, and the first one matching the schema is the result.
+    """
+
+    # Completed objects kept as candidates; a reply seldom has more than a couple
+    MAX_CANDIDATES = 8
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._offset = 0
+        self._starts: List[int] = []
+        self._in_string = False
+        self._escaped = False
+        self._candidates: List[tuple] = []
+        self._result = None
+        self._done = False
+
+    def feed(self, chunk: str):
+        starts = self._starts
+        offset = self._offset
+        for i, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"' or char == "\n":
+                    # JSON strings cannot span lines, so a newline means the quote was prose
+                    self._in_string = False
+            elif char == "{":
+                starts.append(offset + i)
+            elif char == "}":
+                if starts:
+                    start = starts.pop()
+                    # Objects this one encloses are no longer candidates on their own
+                    while self._candidates and self._candidates[-1][0] > start:
+                        self._candidates.pop()
+                    self._candidates.append((start, offset + i + 1))
+                    del self._candidates[:-self.MAX_CANDIDATES]
+            elif char == '"' and starts:
+                # Quotes only delimit strings inside an object; in the prose they are just text
+                self._in_string = True
+
+        self._chunks.append(chunk)
+        self._offset += len(chunk)
+        self._done = False
+
+    def result(self) -> Optional[StepStatusBlock]:
+        """The last valid status block fed so far, or None."""
+        if self._done:
+            return self._result
+
+        text = "".join(self._chunks)
+        self._chunks = [text]
+        self._result = None
+        for start, end in reversed(self._candidates):
+            candidate = text[start:end]
+            if '"Steps"' not in candidate:
+                continue
+            rejected = []
+            try:
+                steps = validate_step_statuses(json.loads(candidate), rejected)
+            except (ValueError, StepStatusError):
+                continue
+            self._result = StepStatusBlock(steps, text, start, end, rejected)
+            break
+
+        if self._result is None:
+            self._result = _decode_from_steps_key(text)
+
+        self._done = True
+        return self._result
+
+
+def _decode_from_steps_key(text: str) -> Optional[StepStatusBlock]:
+    # Fallback for prose that confused the scan (e.g. an unmatched quote inside stray braces): decode from each
+    # {"Steps" from the last one back
+    decoder = json.JSONDecoder()
+    start = text.rfind('{"Steps"')
+    while start != -1:
+        rejected = []
+        try:
+            value, end = decoder.raw_decode(text, start)
+            return StepStatusBlock(validate_step_statuses(value, rejected), text, start, end, rejected)
+        except (ValueError, StepStatusError):
+            start = text.rfind('{"Steps"', 0, start)
+    return None
+
+
+def extract_step_statuses(message: Union[Dict, str]) -> Optional[StepStatusBlock]:
+    """
+    Returns the status block of a message, or None when it has no valid one. A content that is the JSON object itself
+    (JSON mode) is used as it is; otherwise the last {"Steps": [...]} object of the text is used.
+    """
+    if isinstance(message, str):
+        message = {"content": message}
+    content = message.get("content")
+    text = content if isinstance(content, str) else ""
+
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        rejected = []
+        try:
+            steps = validate_step_statuses(json.loads(stripped), rejected)
+            return StepStatusBlock(steps, text, text.index("{"), text.rindex("}") + 1, rejected)
+        except (ValueError, StepStatusError):
+            pass
+
+    extractor = StepStatusExtractor()
+    extractor.feed(text)
+    return extractor.result()